@@ -1,13 +1,21 @@
+from datetime import timedelta
 from functools import lru_cache
 
 from app.core.config import settings
 from app.services.chains.chat_chain import ChatChain
+from app.services.llm.prompts import PromptBudget
 from app.services.llm.ollama_client import OllamaClient
 from app.services.llm.openai_client import OpenAIClient
 from app.services.llm.router import LLMRouter
+from app.services.llm.tokens import get_token_counter
+from app.services.memory.embedders import build_embedder
+from app.services.memory.embedding_cache import CachedEmbedder, SQLiteEmbeddingStore
 from app.services.memory.memori_client import MemoriClient
-from app.services.memory.memory_service import MemoryService, build_default_embedder
+from app.services.memory.memory_service import MemoryService
 from app.services.memory.milvus_client import MilvusClient
+from app.services.vision.gemini_client import GeminiClient
+from app.services.vision.sd_client import StableDiffusionClient
+from app.utils.http import HTTPPoolConfig
 
 
 @lru_cache
@@ -18,6 +26,9 @@ def get_memori_client() -> MemoriClient:
         endpoint=settings.memori_endpoint,
         storage_url=settings.memori_storage_url,
         openai_api_key=settings.openai_api_key,
+        cache_size=settings.memori_cache_size,
+        cache_ttl=settings.memori_cache_ttl,
+        cache_stale_ttl=settings.memori_cache_stale_ttl,
     )
 
 
@@ -31,6 +42,49 @@ def get_milvus_client() -> MilvusClient:
         database=settings.milvus_database,
         collection=settings.milvus_collection,
         use_tls=settings.milvus_tls,
+        dim=settings.embedding_dim,
+        num_partitions=settings.milvus_num_partitions,
+        insert_batch_size=settings.milvus_insert_batch_size,
+        flush_interval=settings.milvus_flush_interval,
+        max_pending=settings.milvus_max_pending,
+        search_batch_window_ms=settings.milvus_search_batch_window_ms,
+        search_batch_max=settings.milvus_search_batch_max,
+        pool_size=settings.milvus_pool_size,
+        nlist=settings.milvus_nlist,
+        nprobe=settings.milvus_nprobe,
+        local_store_path=settings.milvus_local_store_path,
+        local_nlist=settings.milvus_local_nlist,
+        local_nprobe=settings.milvus_local_nprobe,
+        local_vector_dtype=settings.milvus_local_vector_dtype,
+        local_rerank=settings.milvus_local_rerank,
+        local_max_bytes=int(settings.milvus_local_max_mb * 1024 * 1024),
+        local_max_user_bytes=int(settings.milvus_local_max_user_mb * 1024 * 1024),
+        local_spill_path=settings.milvus_local_spill_path,
+    )
+
+
+@lru_cache
+def get_embedder() -> CachedEmbedder:
+    disk = SQLiteEmbeddingStore(settings.embedding_cache_path) if settings.embedding_cache_path else None
+    embedder = build_embedder(
+        provider=settings.embedding_provider,
+        model=settings.embedding_model,
+        dim=settings.embedding_dim,
+        openai_api_key=settings.openai_api_key,
+        openai_base_url=settings.embedding_base_url,
+        ollama_base_url=settings.ollama_base_url,
+        ollama_model=settings.ollama_embedding_model,
+        batch_size=settings.embedding_batch_size,
+        max_retries=settings.embedding_max_retries,
+        timeout=settings.embedding_timeout,
+    )
+    return CachedEmbedder(
+        embedder,
+        # Keyed by the embedder actually built (not the configured provider), so hashing vectors
+        # from an offline fallback are never served once a real provider is configured.
+        model_name=f"{getattr(embedder, '__name__', type(embedder).__name__)}:{settings.embedding_dim}",
+        maxsize=settings.embedding_cache_size,
+        disk=disk,
     )
 
 
@@ -39,7 +93,28 @@ def get_memory_service() -> MemoryService:
     return MemoryService(
         memori_client=get_memori_client(),
         milvus_client=get_milvus_client(),
-        embedder=build_default_embedder(settings.embedding_model),
+        embedder=get_embedder(),
+        max_workers=settings.memory_max_workers,
+        concurrent_retrieval=settings.memory_concurrent_retrieval,
+        embed_batch_window_ms=settings.embedding_batch_window_ms,
+        embed_batch_max=settings.embedding_micro_batch_max,
+        top_k=settings.memory_top_k,
+        recent_window=(
+            timedelta(hours=settings.memory_recent_window_hours) if settings.memory_recent_window_hours > 0 else None
+        ),
+        recent_min_score=settings.memory_recent_min_score,
+        min_score=settings.memory_min_score if settings.memory_min_score > 0 else None,
+        relative_score=settings.memory_relative_score,
+        dedup_mode=settings.memory_dedup_mode,
+        dedup_window=settings.memory_dedup_window,
+        dedup_max_hamming=settings.memory_dedup_max_hamming,
+        dedup_cosine=settings.memory_dedup_cosine,
+        hybrid_search=settings.memory_hybrid_search,
+        bm25_max_docs=settings.memory_bm25_max_docs,
+        bm25_max_users=settings.memory_bm25_max_users,
+        rrf_k=settings.memory_rrf_k,
+        mmr_lambda=settings.memory_mmr_lambda,
+        mmr_fetch=settings.memory_mmr_fetch,
     )
 
 
@@ -51,23 +126,85 @@ def get_llm_router() -> LLMRouter:
             api_key=settings.openai_api_key, model=settings.llm_model
         ),
         ollama_client=OllamaClient(
-            base_url=settings.ollama_base_url, model=settings.llm_model
+            base_url=settings.ollama_base_url, model=settings.llm_model, pool=_http_pool(settings.ollama_timeout)
         ),
     )
 
 
+def _http_pool(timeout: float) -> HTTPPoolConfig:
+    return HTTPPoolConfig(
+        timeout=timeout,
+        connect_timeout=settings.http_connect_timeout,
+        max_connections=settings.http_max_connections,
+        max_keepalive_connections=settings.http_max_keepalive,
+        keepalive_expiry=settings.http_keepalive_expiry,
+    )
+
+
+@lru_cache
+def get_sd_client() -> StableDiffusionClient:
+    return StableDiffusionClient(
+        base_url=settings.sd_base_url, model=settings.sd_model, pool=_http_pool(settings.sd_timeout)
+    )
+
+
+@lru_cache
+def get_gemini_client() -> GeminiClient:
+    return GeminiClient(
+        base_url=settings.gemini_base_url,
+        api_key=settings.gemini_api_key,
+        model=settings.gemini_model,
+        pool=_http_pool(settings.gemini_timeout),
+    )
+
+
 @lru_cache
 def get_chat_chain() -> ChatChain:
     return ChatChain(
         memory_service=get_memory_service(),
         llm_router=get_llm_router(),
+        prompt_budget=PromptBudget(
+            total=settings.prompt_max_tokens,
+            system=settings.prompt_system_tokens,
+            memori=settings.prompt_memori_tokens,
+            milvus=settings.prompt_milvus_tokens,
+            user=settings.prompt_user_tokens,
+        ),
+        token_counter=get_token_counter(settings.llm_model, heuristic=settings.prompt_tokenizer == "heuristic"),
     )
 
 
+def close_resources() -> None:
+    """Release cached clients on shutdown; only touches the ones that were actually built."""
+    if get_memory_service.cache_info().currsize:
+        get_memory_service().close()
+    if get_milvus_client.cache_info().currsize:
+        get_milvus_client().close()
+    if get_memori_client.cache_info().currsize:
+        get_memori_client().close()
+    if get_embedder.cache_info().currsize:
+        get_embedder().close()
+
+
+async def aclose_resources() -> None:
+    """Close the pooled async HTTP clients; must run on the event loop that used them."""
+    if get_llm_router.cache_info().currsize:
+        await get_llm_router().ollama.aclose()
+    if get_sd_client.cache_info().currsize:
+        await get_sd_client().aclose()
+    if get_gemini_client.cache_info().currsize:
+        await get_gemini_client().aclose()
+
+
 __all__ = [
+    "aclose_resources",
+    "close_resources",
     "get_chat_chain",
+    "get_embedder",
+    "get_gemini_client",
     "get_llm_router",
     "get_memori_client",
     "get_memory_service",
     "get_milvus_client",
+    "get_sd_client",
 ]
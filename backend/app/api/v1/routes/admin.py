@@ -13,7 +13,7 @@ async def reset_user(
     memory_service: MemoryService = Depends(deps.get_memory_service),
     _: str | None = Depends(verify_api_key),
 ) -> dict:
-    memory_service.reset_user(user_id)
+    await memory_service.areset_user(user_id)
     return {"status": "reset", "user_id": user_id}
 
 
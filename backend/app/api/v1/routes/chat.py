@@ -1,9 +1,10 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException
 
 from app.api.v1 import deps
 from app.core.security import verify_api_key
 from app.models.chat import ChatRequest, ChatResponse
 from app.services.chains.chat_chain import ChatChain
+from app.services.llm.prompts import PromptTooLongError
 
 router = APIRouter()
 
@@ -24,14 +25,18 @@ async def chat(
     chain: ChatChain = Depends(deps.get_chat_chain),
     _: str | None = Depends(verify_api_key),
 ) -> ChatResponse:
-    result = await chain.run(
-        user_id=payload.user_id,
-        message=payload.message,
-        images=payload.images,
-    )
+    try:
+        result = await chain.run(
+            user_id=payload.user_id,
+            message=payload.message,
+            images=payload.images,
+        )
+    except PromptTooLongError as exc:
+        raise HTTPException(status_code=413, detail=str(exc)) from exc
     return ChatResponse(
         reply=result.reply,
         memori_context=result.memori_context,
         milvus_chunks=result.milvus_chunks,
         trace_id=result.trace_id,
+        prompt_tokens=result.prompt_tokens,
     )
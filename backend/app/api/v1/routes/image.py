@@ -4,6 +4,7 @@ from pathlib import Path
 
 from fastapi import APIRouter, Depends, HTTPException
 
+from app.api.v1 import deps
 from app.core.config import settings
 from app.core.security import verify_api_key
 from app.models.image import ImageRequest, ImageResponse
@@ -15,22 +16,10 @@ router = APIRouter()
 logger = logging.getLogger(__name__)
 
 
-def get_sd_client() -> StableDiffusionClient:
-    return StableDiffusionClient(base_url=settings.sd_base_url, model=settings.sd_model)
-
-
-def get_gemini_client() -> GeminiClient:
-    return GeminiClient(
-        base_url=settings.gemini_base_url,
-        api_key=settings.gemini_api_key,
-        model=settings.gemini_model,
-    )
-
-
 @router.get("/image/health")
 async def image_health(
-    sd_client: StableDiffusionClient = Depends(get_sd_client),
-    gemini_client: GeminiClient = Depends(get_gemini_client),
+    sd_client: StableDiffusionClient = Depends(deps.get_sd_client),
+    gemini_client: GeminiClient = Depends(deps.get_gemini_client),
 ) -> dict:
     sd_ok = settings.sd_enabled and await sd_client.health()
     gemini_ok = settings.gemini_enabled and await gemini_client.health()
@@ -62,8 +51,8 @@ async def try_gemini(gemini_client: GeminiClient, payload: ImageRequest) -> str:
 @router.post("/image", response_model=ImageResponse)
 async def generate_image(
     payload: ImageRequest,
-    sd_client: StableDiffusionClient = Depends(get_sd_client),
-    gemini_client: GeminiClient = Depends(get_gemini_client),
+    sd_client: StableDiffusionClient = Depends(deps.get_sd_client),
+    gemini_client: GeminiClient = Depends(deps.get_gemini_client),
     _: str | None = Depends(verify_api_key),
 ) -> ImageResponse:
     trace_id = new_trace_id()
@@ -1,10 +1,14 @@
+from datetime import datetime
+
 from fastapi import APIRouter, Depends, Query
 
 from app.api.v1 import deps
 from app.core.security import verify_api_key
 from app.models.memory import (
+    MemoryBatchWriteRequest,
     MemoryDebugResponse,
     MemoryHealthResponse,
+    MemoryHit,
     MemoryQuery,
     MemoryWriteRequest,
 )
@@ -16,6 +20,7 @@ router = APIRouter()
 @router.get(
     "/memory/health",
     response_model=MemoryHealthResponse,
+    response_model_exclude_none=True,
     summary="Check Memori and Milvus health",
     response_description="Connectivity status for Memori/Milvus and embedder metadata.",
 )
@@ -31,14 +36,24 @@ async def memory_health(
 async def get_memory_snapshot(
     user_id: str,
     q: str | None = Query(None, alias="query"),
+    since: datetime | None = Query(None, description="Only consider memories written at or after this time"),
+    until: datetime | None = Query(None, description="Only consider memories written at or before this time"),
+    top_k: int | None = Query(None, ge=1, le=50, description="Maximum number of vector hits"),
+    min_score: float | None = Query(None, ge=-1.0, le=1.0, description="Drop vector hits scoring below this"),
     memory_service: MemoryService = Depends(deps.get_memory_service),
     _: str | None = Depends(verify_api_key),
 ) -> MemoryDebugResponse:
-    context = memory_service.retrieve_context(user_id=user_id, query=q or "")
+    context = await memory_service.aretrieve_context(
+        user_id=user_id, query=q or "", since=since, until=until, top_k=top_k, min_score=min_score
+    )
     return MemoryDebugResponse(
         user_id=user_id,
         memori=context.memori_context,
         milvus=context.milvus_chunks,
+        hits=[
+            MemoryHit(id=hit.id, score=hit.score, content=hit.content, created_at=hit.created_at, source=hit.source)
+            for hit in context.hits
+        ],
         stats=context.stats,
     )
 
@@ -50,15 +65,29 @@ async def write_memory(
     memory_service: MemoryService = Depends(deps.get_memory_service),
     _: str | None = Depends(verify_api_key),
 ) -> dict:
-    memory_service.record_user_message(
+    await memory_service.arecord_user_message(
         user_id=user_id, content=payload.content, metadata=payload.metadata
     )
     return {"status": "ok"}
 
 
+@router.post("/memory/{user_id}/batch", summary="Bulk import chat history for a user")
+async def write_memory_batch(
+    user_id: str,
+    payload: MemoryBatchWriteRequest,
+    memory_service: MemoryService = Depends(deps.get_memory_service),
+    _: str | None = Depends(verify_api_key),
+) -> dict:
+    count = await memory_service.arecord_user_messages(
+        user_id=user_id, items=[(item.content, item.metadata) for item in payload.items]
+    )
+    return {"status": "ok", "count": count}
+
+
 @router.get(
     "/memory/health",
     response_model=MemoryHealthResponse,
+    response_model_exclude_none=True,
     summary="Check Memori and Milvus health",
     response_description="Connectivity status for Memori/Milvus and embedder metadata.",
 )
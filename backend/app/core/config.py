@@ -20,8 +20,25 @@ class Settings:
     openai_api_key: str = os.getenv("OPENAI_API_KEY", "")
     llm_model: str = os.getenv("LLM_MODEL", "gpt-4.1")
     embedding_model: str = os.getenv("EMBEDDING_MODEL", "text-embedding-3-large")
+    embedding_provider: str = os.getenv("EMBEDDING_PROVIDER", "hash")  # hash | openai | ollama
+    ollama_embedding_model: str = os.getenv("OLLAMA_EMBEDDING_MODEL", "nomic-embed-text")  # used when provider=ollama
+    embedding_base_url: str = os.getenv("EMBEDDING_BASE_URL", "https://api.openai.com/v1")  # OpenAI-compatible API
+    embedding_batch_size: int = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+    embedding_max_retries: int = int(os.getenv("EMBEDDING_MAX_RETRIES", "3"))
+    embedding_timeout: float = float(os.getenv("EMBEDDING_TIMEOUT", "30"))
+    embedding_batch_window_ms: float = float(os.getenv("EMBEDDING_BATCH_WINDOW_MS", "0"))  # 0 disables coalescing
+    embedding_micro_batch_max: int = int(os.getenv("EMBEDDING_MICRO_BATCH_MAX", "64"))
+    embedding_dim: int = int(os.getenv("EMBEDDING_DIM", "1536"))  # must match the Milvus vector field
+    embedding_cache_size: int = int(os.getenv("EMBEDDING_CACHE_SIZE", "4096"))  # in-process LRU entries
+    embedding_cache_path: str = os.getenv("EMBEDDING_CACHE_PATH", "")  # optional SQLite file for a persistent tier
     ollama_base_url: str = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
     llm_provider: str = os.getenv("LLM_PROVIDER", "openai")  # openai | ollama | mock
+    prompt_tokenizer: str = os.getenv("PROMPT_TOKENIZER", "auto")  # auto (tiktoken if available) | heuristic
+    prompt_max_tokens: int = int(os.getenv("PROMPT_MAX_TOKENS", "3000"))  # whole prompt
+    prompt_system_tokens: int = int(os.getenv("PROMPT_SYSTEM_TOKENS", "400"))
+    prompt_memori_tokens: int = int(os.getenv("PROMPT_MEMORI_TOKENS", "800"))
+    prompt_milvus_tokens: int = int(os.getenv("PROMPT_MILVUS_TOKENS", "1200"))
+    prompt_user_tokens: int = int(os.getenv("PROMPT_USER_TOKENS", "1000"))
 
     sd_enabled: bool = os.getenv("SD_ENABLED", "false").lower() == "true"
     sd_base_url: str = os.getenv("SD_BASE_URL", "http://localhost:7860")
@@ -31,6 +48,14 @@ class Settings:
     gemini_base_url: str = os.getenv("GEMINI_BASE_URL", "")
     gemini_api_key: str = os.getenv("GEMINI_API_KEY", "")
     gemini_model: str = os.getenv("GEMINI_MODEL", "")
+    # Shared keep-alive pools for Ollama / Stable Diffusion / Gemini (one AsyncClient per upstream).
+    http_max_connections: int = int(os.getenv("HTTP_MAX_CONNECTIONS", "20"))
+    http_max_keepalive: int = int(os.getenv("HTTP_MAX_KEEPALIVE", "10"))
+    http_keepalive_expiry: float = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))  # seconds
+    http_connect_timeout: float = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+    ollama_timeout: float = float(os.getenv("OLLAMA_TIMEOUT", "30"))
+    sd_timeout: float = float(os.getenv("SD_TIMEOUT", "60"))
+    gemini_timeout: float = float(os.getenv("GEMINI_TIMEOUT", "60"))
     image_provider: str = os.getenv("IMAGE_PROVIDER", "auto")  # local | cloud | auto
     image_save_dir: str = os.getenv("IMAGE_SAVE_DIR", "./data/images")
 
@@ -38,6 +63,27 @@ class Settings:
     memori_api_key: str = os.getenv("MEMORI_API_KEY", "")
     memori_endpoint: str = os.getenv("MEMORI_ENDPOINT", "https://api.memori.local")
     memori_storage_url: str = os.getenv("MEMORI_STORAGE_URL", "")  # optional; set for local dev only
+    memori_cache_size: int = int(os.getenv("MEMORI_CACHE_SIZE", "1024"))  # 0 disables the query cache
+    memori_cache_ttl: float = float(os.getenv("MEMORI_CACHE_TTL", "60"))
+    memori_cache_stale_ttl: float = float(os.getenv("MEMORI_CACHE_STALE_TTL", "300"))
+
+    memory_max_workers: int = int(os.getenv("MEMORY_MAX_WORKERS", "8"))  # threads for blocking Memori/Milvus calls
+    memory_top_k: int = int(os.getenv("MEMORY_TOP_K", "5"))
+    memory_recent_window_hours: float = float(os.getenv("MEMORY_RECENT_WINDOW_HOURS", "0"))  # 0 = always full history
+    memory_recent_min_score: float = float(os.getenv("MEMORY_RECENT_MIN_SCORE", "0.35"))
+    memory_min_score: float = float(os.getenv("MEMORY_MIN_SCORE", "0"))  # cosine floor for prompt hits; 0 = off
+    memory_relative_score: float = float(os.getenv("MEMORY_RELATIVE_SCORE", "0"))  # fraction of best hit; 0 = off
+    memory_dedup_mode: str = os.getenv("MEMORY_DEDUP_MODE", "off")  # off | skip | merge
+    memory_dedup_window: int = int(os.getenv("MEMORY_DEDUP_WINDOW", "32"))  # recent messages compared per user
+    memory_dedup_max_hamming: int = int(os.getenv("MEMORY_DEDUP_MAX_HAMMING", "3"))  # SimHash bits for a near-duplicate
+    memory_dedup_cosine: float = float(os.getenv("MEMORY_DEDUP_COSINE", "0.995"))  # embedding similarity for a near-duplicate
+    memory_hybrid_search: bool = os.getenv("MEMORY_HYBRID_SEARCH", "false").lower() == "true"  # BM25 + vector fusion
+    memory_bm25_max_docs: int = int(os.getenv("MEMORY_BM25_MAX_DOCS", "20000"))  # per-user cap; 0 = unbounded
+    memory_bm25_max_users: int = int(os.getenv("MEMORY_BM25_MAX_USERS", "1024"))  # LRU cap on loaded users; 0 = unbounded
+    memory_rrf_k: int = int(os.getenv("MEMORY_RRF_K", "60"))  # reciprocal rank fusion constant
+    memory_mmr_lambda: float = float(os.getenv("MEMORY_MMR_LAMBDA", "1.0"))  # 1.0 disables diversity re-ranking
+    memory_mmr_fetch: int = int(os.getenv("MEMORY_MMR_FETCH", "4"))  # candidates fetched per kept hit for MMR
+    memory_concurrent_retrieval: bool = os.getenv("MEMORY_CONCURRENT_RETRIEVAL", "true").lower() == "true"
 
     milvus_host: str = os.getenv("MILVUS_HOST", "localhost")
     milvus_port: int = int(os.getenv("MILVUS_PORT", "19530"))
@@ -46,6 +92,23 @@ class Settings:
     milvus_collection: str = os.getenv("MILVUS_COLLECTION", "chat_history")
     milvus_database: str = os.getenv("MILVUS_DATABASE", "default")
     milvus_tls: bool = os.getenv("MILVUS_TLS", "false").lower() == "true"
+    milvus_num_partitions: int = int(os.getenv("MILVUS_NUM_PARTITIONS", "64"))  # partition-key buckets
+    milvus_insert_batch_size: int = int(os.getenv("MILVUS_INSERT_BATCH_SIZE", "256"))
+    milvus_flush_interval: float = float(os.getenv("MILVUS_FLUSH_INTERVAL", "1.0"))  # seconds; 0 disables timer
+    milvus_max_pending: int = int(os.getenv("MILVUS_MAX_PENDING", "8192"))
+    milvus_search_batch_window_ms: float = float(os.getenv("MILVUS_SEARCH_BATCH_WINDOW_MS", "0"))  # 0 disables
+    milvus_search_batch_max: int = int(os.getenv("MILVUS_SEARCH_BATCH_MAX", "32"))
+    milvus_pool_size: int = int(os.getenv("MILVUS_POOL_SIZE", "4"))  # connection aliases (gRPC channels)
+    milvus_nlist: int = int(os.getenv("MILVUS_NLIST", "1024"))  # IVF_FLAT lists, used at index creation
+    milvus_nprobe: int = int(os.getenv("MILVUS_NPROBE", "10"))  # lists scanned per search
+    milvus_local_store_path: str = os.getenv("MILVUS_LOCAL_STORE_PATH", "")  # optional dir for a persistent fallback
+    milvus_local_nlist: int = int(os.getenv("MILVUS_LOCAL_NLIST", "0"))  # IVF lists per user in memory; 0 = exact
+    milvus_local_nprobe: int = int(os.getenv("MILVUS_LOCAL_NPROBE", "8"))
+    milvus_local_vector_dtype: str = os.getenv("MILVUS_LOCAL_VECTOR_DTYPE", "float32")  # float32 | float16 | int8
+    milvus_local_rerank: int = int(os.getenv("MILVUS_LOCAL_RERANK", "4"))  # float32 re-rank shortlist = top_k x this
+    milvus_local_max_mb: float = float(os.getenv("MILVUS_LOCAL_MAX_MB", "0"))  # in-memory fallback budget; 0 = unbounded
+    milvus_local_max_user_mb: float = float(os.getenv("MILVUS_LOCAL_MAX_USER_MB", "0"))
+    milvus_local_spill_path: str = os.getenv("MILVUS_LOCAL_SPILL_PATH", "")  # evicted rows go here; empty = drop them
 
     database_url: str = os.getenv("DATABASE_URL", "sqlite:///./data/app.db")
     cors_origins: List[str] = field(
@@ -1,12 +1,24 @@
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
+from app.api.v1 import deps
 from app.api.v1.routes import admin, chat, health, image, memory
 from app.core.config import settings
 from app.core.logging import configure_logging
 from app.services.persistence.db import init_db
 
 
+@asynccontextmanager
+async def lifespan(_: FastAPI) -> AsyncIterator[None]:
+    yield
+    # Close pooled upstream HTTP clients, then flush buffered vector writes so pending rows are not lost.
+    await deps.aclose_resources()
+    deps.close_resources()
+
+
 def create_app() -> FastAPI:
     """Create FastAPI app with core middleware and v1 routes."""
     configure_logging(settings.log_level)
@@ -17,6 +29,7 @@ def create_app() -> FastAPI:
         title=settings.project_name,
         version=settings.version,
         openapi_url=f"{settings.api_prefix}/openapi.json",
+        lifespan=lifespan,
     )
 
     app.add_middleware(
@@ -1,4 +1,4 @@
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 from pydantic import BaseModel, Field, field_validator
 
@@ -54,3 +54,7 @@ class ChatResponse(BaseModel):
     trace_id: Optional[str] = Field(
         default=None, description="Trace identifier for correlating backend logs"
     )
+    prompt_tokens: Dict[str, int] = Field(
+        default_factory=dict,
+        description="Prompt token counts per section (system, memori, milvus, user, total) and dropped chunks",
+    )
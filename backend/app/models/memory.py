@@ -8,15 +8,28 @@ class MemoryWriteRequest(BaseModel):
     metadata: Optional[Dict[str, Any]] = None
 
 
+class MemoryBatchWriteRequest(BaseModel):
+    items: List[MemoryWriteRequest] = Field(..., min_length=1, max_length=1000)
+
+
 class MemoryQuery(BaseModel):
     query: str
     top_k: int = 5
 
 
+class MemoryHit(BaseModel):
+    id: Any = Field(None, description="Milvus auto-id (or local row id) of the stored message")
+    score: float = Field(..., description="Cosine similarity to the query (BM25 score for lexical-only hits)")
+    content: str
+    created_at: Optional[int] = Field(None, description="Write time in epoch milliseconds")
+    source: str = Field("vector", description="Retriever that found the hit: vector, bm25 or hybrid")
+
+
 class MemoryDebugResponse(BaseModel):
     user_id: str
     memori: str
     milvus: List[str]
+    hits: List[MemoryHit] = Field(default_factory=list)
     stats: Dict[str, Any]
 
 
@@ -24,3 +37,11 @@ class MemoryHealthResponse(BaseModel):
     memori: bool = Field(..., description="Whether Memori client is available")
     milvus: bool = Field(..., description="Whether Milvus client is reachable or fallback is active")
     embedder: str = Field(..., description="Identifier for the embedder in use")
+    memori_cache: Optional[Dict[str, Any]] = Field(None, description="Memori profile/facts cache counters")
+    milvus_search_batching: Optional[Dict[str, Any]] = Field(None, description="Coalesced search batch counters")
+    milvus_pool: Optional[Dict[str, Any]] = Field(None, description="Milvus connection pool state")
+    local_store: Optional[Dict[str, Any]] = Field(None, description="In-memory/persistent fallback store stats")
+    embedding_cache: Optional[Dict[str, Any]] = Field(None, description="Embedding LRU/SQLite cache counters")
+    embedding_batcher: Optional[Dict[str, Any]] = Field(None, description="Embed micro-batching counters")
+    bm25_index: Optional[Dict[str, Any]] = Field(None, description="Per-user BM25 index size")
+    write_dedup: Optional[Dict[str, Any]] = Field(None, description="Write-time dedup counters")
@@ -1,11 +1,15 @@
-from dataclasses import dataclass
-from typing import List, Optional
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
 
-from app.services.llm.prompts import SYSTEM_PROMPT, build_chat_prompt
+from app.services.llm.prompts import SYSTEM_PROMPT, PromptBudget, assemble_chat_prompt
 from app.services.llm.router import LLMRouter
+from app.services.llm.tokens import TokenCounter
 from app.services.memory.memory_service import MemoryService
 from app.utils.id_generator import new_trace_id
 
+logger = logging.getLogger(__name__)
+
 
 @dataclass
 class ChatResult:
@@ -13,27 +17,55 @@ class ChatResult:
     memori_context: str
     milvus_chunks: List[str]
     trace_id: str
+    prompt_tokens: Dict[str, int] = field(default_factory=dict)
 
 
 class ChatChain:
     """Main chat orchestration chain."""
 
-    def __init__(self, memory_service: MemoryService, llm_router: LLMRouter) -> None:
+    def __init__(
+        self,
+        memory_service: MemoryService,
+        llm_router: LLMRouter,
+        prompt_budget: Optional[PromptBudget] = None,
+        token_counter: Optional[TokenCounter] = None,
+    ) -> None:
         self.memory_service = memory_service
         self.llm_router = llm_router
+        self.prompt_budget = prompt_budget or PromptBudget()
+        self.token_counter = token_counter
 
     async def run(self, user_id: str, message: str, images: Optional[List[str]] = None) -> ChatResult:
-        context = self.memory_service.retrieve_context(user_id=user_id, query=message)
-        prompt = build_chat_prompt(
+        context = await self.memory_service.aretrieve_context(user_id=user_id, query=message)
+        # Keep the slowly-changing profile apart from per-turn facts so it stays in the cached prefix.
+        if context.memori_profile or context.memori_facts:
+            stable, recent = f"Profile:\n{context.memori_profile}", f"Recent facts:\n{context.memori_facts}"
+        else:
+            stable, recent = context.memori_context, ""
+        # Hits arrive in final retrieval rank (fused, MMR-ordered), so the budget drops the last-ranked.
+        prompt = assemble_chat_prompt(
             system_prompt=SYSTEM_PROMPT,
-            memori_context=context.memori_context,
+            memori_context=stable,
             milvus_chunks=context.milvus_chunks,
             user_message=message,
+            budget=self.prompt_budget,
+            counter=self.token_counter,
+            recent_context=recent,
         )
-        reply = await self.llm_router.generate(prompt)
+        trace_id = new_trace_id()
+        logger.debug(
+            "Prompt trace=%s tokens=%s dropped_chunks=%s truncated=%s (%s)",
+            trace_id,
+            prompt.tokens,
+            prompt.dropped_chunks,
+            prompt.truncated,
+            prompt.tokenizer,
+        )
+        reply = await self.llm_router.generate(prompt.messages)
         return ChatResult(
             reply=reply,
             memori_context=context.memori_context,
-            milvus_chunks=context.milvus_chunks,
-            trace_id=new_trace_id(),
+            milvus_chunks=prompt.milvus_chunks,
+            trace_id=trace_id,
+            prompt_tokens={**prompt.tokens, "dropped_chunks": prompt.dropped_chunks},
         )
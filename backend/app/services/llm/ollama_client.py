@@ -1,33 +1,46 @@
 import logging
-from typing import Optional
+from typing import Any, Dict, Optional
 
 import httpx
 
+from app.services.llm.openai_client import Prompt
+from app.utils.http import HTTPPoolConfig, PooledAsyncClient
+
 logger = logging.getLogger(__name__)
 
 
 class OllamaClient:
     """Simple Ollama HTTP wrapper."""
 
-    def __init__(self, base_url: str, model: str) -> None:
+    def __init__(
+        self,
+        base_url: str,
+        model: str,
+        pool: Optional[HTTPPoolConfig] = None,
+        client: Optional[httpx.AsyncClient] = None,
+    ) -> None:
         self.base_url = base_url.rstrip("/")
         self.model = model
+        # One keep-alive pool for the process instead of a new connection per request.
+        self._http = PooledAsyncClient(pool, client)
+
+    async def aclose(self) -> None:
+        await self._http.aclose()
 
-    async def generate(self, prompt: str) -> str:
+    async def generate(self, prompt: Prompt) -> str:
+        # Message lists go to /api/chat so Ollama can reuse the KV cache of the shared prefix.
+        chat = not isinstance(prompt, str)
+        payload: Dict[str, Any] = {"model": self.model, "stream": False}  # return a single JSON object
+        if chat:
+            payload["messages"] = list(prompt)
+        else:
+            payload["prompt"] = prompt
         try:
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                resp = await client.post(
-                    f"{self.base_url}/api/generate",
-                    json={
-                        "model": self.model,
-                        "prompt": prompt,
-                        "stream": False,  # return a single JSON object
-                    },
-                )
-                resp.raise_for_status()
-                data = resp.json()
-                content: Optional[str] = data.get("response")
-                return content or ""
+            resp = await self._http.client.post(f"{self.base_url}/api/{'chat' if chat else 'generate'}", json=payload)
+            resp.raise_for_status()
+            data = resp.json()
+            content: Optional[str] = (data.get("message") or {}).get("content") if chat else data.get("response")
+            return content or ""
         except Exception as exc:  # pragma: no cover - depends on running Ollama
             logger.warning("Ollama request failed: %s", exc)
             return "[ollama placeholder reply]"
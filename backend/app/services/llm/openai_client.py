@@ -1,8 +1,10 @@
 import logging
-from typing import Optional
+from typing import Dict, List, Optional, Union
 
 logger = logging.getLogger(__name__)
 
+Prompt = Union[str, List[Dict[str, str]]]
+
 try:
     from openai import OpenAI
 except Exception:  # pragma: no cover - optional dependency
@@ -16,7 +18,11 @@ class OpenAIClient:
         self.api_key = api_key
         self.model = model
 
-    async def generate(self, prompt: str) -> str:
+    @staticmethod
+    def as_messages(prompt: Prompt) -> List[Dict[str, str]]:
+        return [{"role": "user", "content": prompt}] if isinstance(prompt, str) else list(prompt)
+
+    async def generate(self, prompt: Prompt) -> str:
         if not self.api_key:
             logger.warning("OPENAI_API_KEY not set; returning placeholder answer")
             return "[openai placeholder reply]"
@@ -28,7 +34,7 @@ class OpenAIClient:
         client = OpenAI(api_key=self.api_key)
         resp = client.chat.completions.create(
             model=self.model,
-            messages=[{"role": "user", "content": prompt}],
+            messages=self.as_messages(prompt),
         )
         content: Optional[str] = resp.choices[0].message.content
         return content or ""
@@ -1,4 +1,45 @@
-from typing import List
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence
+
+from app.services.llm.tokens import TokenCounter, get_token_counter
+
+Message = Dict[str, str]
+
+MEMORI_HEADER = "Structured memory (Memori):\n"
+MILVUS_HEADER = "Similar chat snippets (Milvus):\n"
+USER_HEADER = "User:\n"
+NO_HITS = "No similar history."
+
+
+class PromptTooLongError(ValueError):
+    """The user message alone does not fit the prompt budget; it is rejected, never cut."""
+
+
+@dataclass
+class PromptBudget:
+    """Token caps per prompt section; ``total`` bounds the whole prompt.
+
+    ``user`` is the largest user message accepted. The message is always sent whole: its full
+    size is deducted from ``total`` first, then the system prompt, Memori and Milvus sections
+    share what is left, so retrieved chunks are the first thing to give way.
+    """
+
+    total: int = 3000
+    system: int = 400
+    memori: int = 800
+    milvus: int = 1200
+    user: int = 1000
+
+
+@dataclass
+class ChatPrompt:
+    text: str  # single-string form for completion-style endpoints
+    tokens: Dict[str, int]  # per section plus "total"
+    milvus_chunks: List[str]  # chunks that made it into the prompt
+    dropped_chunks: int = 0
+    truncated: List[str] = field(default_factory=list)  # sections cut to fit their budget
+    tokenizer: str = ""
+    messages: List[Message] = field(default_factory=list)  # role-separated form, see ``build_messages``
 
 
 def build_chat_prompt(
@@ -6,15 +47,139 @@ def build_chat_prompt(
     memori_context: str,
     milvus_chunks: List[str],
     user_message: str,
+    budget: Optional[PromptBudget] = None,
+    counter: Optional[TokenCounter] = None,
+) -> str:
+    if budget is None:
+        return _render(system_prompt, memori_context, milvus_chunks, user_message)
+    return assemble_chat_prompt(system_prompt, memori_context, milvus_chunks, user_message, budget, counter).text
+
+
+def assemble_chat_prompt(
+    system_prompt: str,
+    memori_context: str,
+    milvus_chunks: Sequence[str],
+    user_message: str,
+    budget: Optional[PromptBudget] = None,
+    counter: Optional[TokenCounter] = None,
+    chunk_scores: Optional[Sequence[float]] = None,
+    recent_context: str = "",
+) -> ChatPrompt:
+    """Fit the prompt into ``budget`` and report its token counts.
+
+    ``memori_context`` should hold only slowly-changing memory (the profile) and
+    ``recent_context`` the per-turn part (recent facts/turns); both share the Memori cap,
+    the profile first, so the profile text stays stable from turn to turn.
+
+    The user message is never truncated: raises ``PromptTooLongError`` when it exceeds
+    ``budget.user`` or leaves no room in ``budget.total``. The system prompt and Memori text
+    are truncated to their cap and to what the message leaves. Milvus chunks are never cut
+    mid-way: they are admitted in rank order and the last-ranked ones are dropped once the
+    Milvus budget is spent; kept chunks retain their original order. The rank is
+    ``chunk_scores`` (higher first) when given, otherwise the order of ``milvus_chunks``, which
+    for ``MemoryService`` context is the final retrieval rank (after RRF fusion and MMR).
+    """
+    budget = budget or PromptBudget()
+    counter = counter or get_token_counter()
+    truncated: List[str] = []
+    # Headers and separators (plus the one after ``recent_context``) count against the total.
+    remaining = budget.total - counter.count(_render("", "", [], "")) - (counter.count("\n\n") if recent_context else 0)
+
+    user_tokens = counter.count(user_message)
+    if user_tokens > min(budget.user, remaining):
+        raise PromptTooLongError(
+            f"Message is {user_tokens} tokens; at most {max(0, min(budget.user, remaining))} are accepted"
+        )
+    remaining -= user_tokens
+
+    def fit(name: str, text: str, cap: int) -> str:
+        nonlocal remaining
+        limit = max(0, min(cap, remaining))
+        if counter.count(text) > limit:
+            text = counter.truncate(text, limit)
+            truncated.append(name)
+        remaining -= counter.count(text)
+        return text
+
+    system_prompt = fit("system", system_prompt, budget.system)
+    memori_context = fit("memori", memori_context, budget.memori)
+    recent_context = fit("recent", recent_context, budget.memori - counter.count(memori_context))
+
+    limit = max(0, min(budget.milvus, remaining))
+    order = range(len(milvus_chunks))
+    if chunk_scores is not None:
+        order = sorted(order, key=lambda i: chunk_scores[i], reverse=True)
+    kept, used = set(), 0
+    for i in order:
+        cost = counter.count(f"- {milvus_chunks[i]}\n")
+        if used + cost <= limit:
+            kept.add(i)
+            used += cost
+    chunks = [chunk for i, chunk in enumerate(milvus_chunks) if i in kept]
+
+    text = _render(system_prompt, memori_context, chunks, user_message, recent_context)
+    hits = "\n".join(f"- {chunk}" for chunk in chunks) or NO_HITS
+    tokens = {
+        "system": counter.count(system_prompt),
+        "memori": counter.count(memori_context) + counter.count(recent_context),
+        "milvus": counter.count(hits),
+        "user": counter.count(user_message),
+        "total": counter.count(text),
+    }
+    return ChatPrompt(
+        text=text,
+        tokens=tokens,
+        milvus_chunks=chunks,
+        dropped_chunks=len(milvus_chunks) - len(chunks),
+        truncated=truncated,
+        tokenizer=counter.name,
+        messages=build_messages(system_prompt, memori_context, chunks, user_message, recent_context),
+    )
+
+
+def build_messages(
+    system_prompt: str,
+    memori_context: str,
+    milvus_chunks: Sequence[str],
+    user_message: str,
+    recent_context: str = "",
+) -> List[Message]:
+    """Role-separated chat messages, ordered from most to least stable.
+
+    The static system prompt comes first, then the Memori profile, then the per-turn
+    context (recent facts and similar snippets), then the user message. Consecutive turns
+    of one user therefore share a byte-identical prefix, which provider-side prompt caching
+    and Ollama's KV-cache reuse can skip re-processing.
+    """
+    hits = "\n".join(f"- {chunk}" for chunk in milvus_chunks) or NO_HITS
+    volatile = f"{MILVUS_HEADER}{hits}"
+    if recent_context:
+        volatile = f"{recent_context}\n\n{volatile}"
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "system", "content": f"{MEMORI_HEADER}{memori_context}"},
+        {"role": "system", "content": volatile},
+        {"role": "user", "content": user_message},
+    ]
+
+
+def _render(
+    system_prompt: str,
+    memori_context: str,
+    milvus_chunks: Sequence[str],
+    user_message: str,
+    recent_context: str = "",
 ) -> str:
-    hits = "\n".join(f"- {chunk}" for chunk in milvus_chunks) or "No similar history."
+    hits = "\n".join(f"- {chunk}" for chunk in milvus_chunks) or NO_HITS
+    recent = f"{recent_context}\n\n" if recent_context else ""
     return (
         f"{system_prompt}\n\n"
-        "Structured memory (Memori):\n"
+        f"{MEMORI_HEADER}"
         f"{memori_context}\n\n"
-        "Similar chat snippets (Milvus):\n"
+        f"{recent}"
+        f"{MILVUS_HEADER}"
         f"{hits}\n\n"
-        "User:\n"
+        f"{USER_HEADER}"
         f"{user_message}"
     )
 
@@ -1,7 +1,7 @@
 from typing import Optional
 
 from app.services.llm.ollama_client import OllamaClient
-from app.services.llm.openai_client import OpenAIClient
+from app.services.llm.openai_client import OpenAIClient, Prompt
 
 
 class LLMRouter:
@@ -17,7 +17,8 @@ class LLMRouter:
         self.openai = openai_client
         self.ollama = ollama_client
 
-    async def generate(self, prompt: str, provider: Optional[str] = None) -> str:
+    async def generate(self, prompt: Prompt, provider: Optional[str] = None) -> str:
+        """``prompt`` is a plain string or a list of role/content chat messages."""
         choice = (provider or self.default_provider).lower()
         if choice == "ollama":
             return await self.ollama.generate(prompt)
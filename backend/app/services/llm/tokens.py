@@ -0,0 +1,86 @@
+import logging
+import math
+import re
+from functools import lru_cache
+from typing import Any, Optional
+
+logger = logging.getLogger(__name__)
+
+try:
+    import tiktoken
+except Exception:  # pragma: no cover - optional dependency
+    tiktoken = None  # type: ignore
+
+_PIECES = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+_COUNT_CACHE = 4096  # distinct texts memoized per counter (system prompt, profile blocks, chunks)
+
+
+class TokenCounter:
+    """Count and truncate text in model tokens.
+
+    Uses the model's tiktoken encoding when the package (and its BPE file) is available;
+    otherwise, or with ``heuristic=True``, a fast offline estimate: the larger of one token per
+    word/punctuation piece and one per ~4 ASCII characters plus one per non-ASCII character
+    (CJK and most non-Latin scripts take about a token per character). The estimate errs high,
+    so budgets stay safe. Counts are memoized because the same texts recur every turn.
+    """
+
+    def __init__(self, model: str = "", heuristic: bool = False) -> None:
+        self.model = model
+        self._encoding: Optional[Any] = None if heuristic else _load_encoding(model)
+        self.name = f"tiktoken:{self._encoding.name}" if self._encoding is not None else "heuristic"
+        self.count = lru_cache(maxsize=_COUNT_CACHE)(self._count)
+
+    def _count(self, text: str) -> int:
+        if not text:
+            return 0
+        if self._encoding is not None:
+            return len(self._encoding.encode(text, disallowed_special=()))
+        ascii_len = len(text.encode("ascii", "ignore"))
+        return max(math.ceil(ascii_len / 4) + len(text) - ascii_len, len(_PIECES.findall(text)))
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """Longest prefix of ``text`` within ``max_tokens`` (cut on a word boundary offline)."""
+        if max_tokens <= 0:
+            return ""
+        if self.count(text) <= max_tokens:
+            return text
+        if self._encoding is not None:
+            return self._encoding.decode(self._encoding.encode(text, disallowed_special=())[:max_tokens])
+        # Binary search on whitespace boundaries keeps the heuristic's result within budget.
+        cuts = [match.start() for match in re.finditer(r"\s+", text)] + [len(text)]
+        lo, hi = 0, len(cuts) - 1
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            if self._count(text[: cuts[mid]]) <= max_tokens:
+                lo = mid
+            else:
+                hi = mid - 1
+        prefix = text[: cuts[lo]]
+        return prefix if self._count(prefix) <= max_tokens else text[:max_tokens]
+
+
+def _load_encoding(model: str) -> Optional[Any]:
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        pass
+    except Exception as exc:  # pragma: no cover - BPE download fails offline
+        logger.warning("tiktoken encoding unavailable (%s); using heuristic token counts", exc)
+        return None
+    try:
+        return tiktoken.get_encoding("o200k_base")
+    except Exception as exc:  # pragma: no cover - BPE download fails offline
+        logger.warning("tiktoken encoding unavailable (%s); using heuristic token counts", exc)
+        return None
+
+
+@lru_cache(maxsize=8)
+def get_token_counter(model: str = "", heuristic: bool = False) -> TokenCounter:
+    """Process-wide counter per model, so the encoding is loaded once."""
+    return TokenCounter(model, heuristic=heuristic)
+
+
+__all__ = ["TokenCounter", "get_token_counter"]
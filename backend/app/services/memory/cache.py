@@ -0,0 +1,142 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class TTLCache:
+    """Thread-safe LRU cache with TTL expiry and stale-while-revalidate refresh.
+
+    Entries younger than ``ttl`` are served as hits. Entries within ``stale_ttl`` past
+    that are still served, but a background refresh is scheduled. Anything older is a miss.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 1024,
+        ttl: float = 60.0,
+        stale_ttl: float = 300.0,
+        executor: Optional[Executor] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.stale_ttl = max(0.0, stale_ttl)
+        self._clock = clock
+        self._executor = executor
+        self._entries: "OrderedDict[Hashable, Tuple[Any, float]]" = OrderedDict()
+        self._refreshing: Set[Hashable] = set()
+        # Loads remember the tick they started at and are dropped if their key was invalidated
+        # later, so a write for one user never discards in-flight loads of other users.
+        self._tick = 0
+        self._invalidated: "OrderedDict[Hashable, int]" = OrderedDict()  # key -> tick of last invalidation
+        self._floor = 0  # loads started before this tick are dropped (``clear`` / pruned stamps)
+        self._owns_executor = executor is None
+        self._lock = threading.Lock()
+        self._counters: Dict[str, int] = {
+            "hits": 0,
+            "stale_hits": 0,
+            "misses": 0,
+            "refreshes": 0,
+            "evictions": 0,
+            "invalidations": 0,
+        }
+
+    @property
+    def enabled(self) -> bool:
+        return self.maxsize > 0 and self.ttl > 0
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        if not self.enabled:
+            return loader()
+
+        now = self._clock()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, stored_at = entry
+                age = now - stored_at
+                if age < self.ttl:
+                    self._entries.move_to_end(key)
+                    self._counters["hits"] += 1
+                    return value
+                if age < self.ttl + self.stale_ttl:
+                    self._entries.move_to_end(key)
+                    self._counters["stale_hits"] += 1
+                    if key not in self._refreshing:
+                        self._refreshing.add(key)
+                        self._get_executor().submit(self._refresh, key, loader, self._tick)
+                    return value
+                del self._entries[key]
+            self._counters["misses"] += 1
+            version = self._tick
+
+        value = loader()
+        self._store(key, value, version)
+        return value
+
+    def invalidate(self, *keys: Hashable) -> None:
+        with self._lock:
+            self._tick += 1
+            for key in keys:
+                self._invalidated[key] = self._tick
+                self._invalidated.move_to_end(key)
+                if self._entries.pop(key, None) is not None:
+                    self._counters["invalidations"] += 1
+            # Bound the stamps; forgetting one conservatively drops every load older than it.
+            while len(self._invalidated) > max(self.maxsize, 1) * 4:
+                _, stamp = self._invalidated.popitem(last=False)
+                self._floor = max(self._floor, stamp)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._tick += 1
+            self._floor = self._tick
+            self._invalidated.clear()
+            self._entries.clear()
+
+    def close(self) -> None:
+        """Stop the background refresh pool if this cache created it."""
+        with self._lock:
+            executor, self._executor = (self._executor, None) if self._owns_executor else (None, self._executor)
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {**self._counters, "size": len(self._entries)}
+
+    def _refresh(self, key: Hashable, loader: Callable[[], Any], version: int) -> None:
+        try:
+            value = loader()
+        except Exception as exc:
+            logger.warning("Cache refresh failed for %s: %s", key, exc)
+            with self._lock:
+                self._refreshing.discard(key)
+            return
+        with self._lock:
+            self._refreshing.discard(key)
+            self._counters["refreshes"] += 1
+        self._store(key, value, version)
+
+    def _store(self, key: Hashable, value: Any, version: int) -> None:
+        with self._lock:
+            if version < self._floor or self._invalidated.get(key, 0) > version:
+                return
+            self._entries[key] = (value, self._clock())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self._counters["evictions"] += 1
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="cache-refresh")
+        return self._executor
+
+
+__all__ = ["TTLCache"]
@@ -0,0 +1,179 @@
+import hashlib
+import re
+import threading
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from typing import Deque, Dict, FrozenSet, Optional, Sequence
+
+import numpy as np
+
+from app.services.memory.local_index import now_ms
+
+DEDUP_MODES = ("off", "skip", "merge")
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+
+def normalize_text(text: str) -> str:
+    """Case-, whitespace- and punctuation-insensitive form used for exact matching."""
+    return " ".join(_TOKEN.findall(text.lower()))
+
+
+def simhash64(text: str) -> int:
+    """64-bit SimHash over word unigrams and bigrams of the normalized text."""
+    tokens = normalize_text(text).split()
+    features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+    if not features:
+        return 0
+    digests = np.array(
+        [int.from_bytes(hashlib.blake2b(f.encode("utf-8"), digest_size=8).digest(), "little") for f in features],
+        dtype=np.uint64,
+    )
+    bits = (digests[:, None] >> np.arange(64, dtype=np.uint64)) & np.uint64(1)
+    votes = bits.sum(axis=0, dtype=np.int64) * 2 - len(features)
+    return int(sum(1 << i for i in np.flatnonzero(votes > 0)))
+
+
+@dataclass
+class RecentWrite:
+    content: str
+    key: str
+    simhash: int
+    vector: Optional[np.ndarray]
+    words: FrozenSet[str] = frozenset()
+    repeats: int = 1
+    last_seen: int = 0
+
+
+@dataclass
+class DuplicateMatch:
+    original: RecentWrite
+    reason: str  # exact | near
+
+
+class WriteDeduplicator:
+    """Detect repeated writes against each user's ``window`` most recent messages.
+
+    A write is a repeat when its normalized text hashes equal to a recent one (checked before
+    embedding, so exact repeats cost no embedding call), or when it is a near-duplicate: same
+    set of words, SimHash within ``max_hamming`` bits *and* embedding cosine at least
+    ``cosine_threshold``. Any added, removed or changed word therefore keeps the message, so a
+    corrected fact ("at 9" -> "at 10") is never merged away. A match bumps the original's
+    ``repeats``/``last_seen`` instead of storing a new row. ``mode`` is ``skip`` (drop the
+    repeat) or ``merge`` (also ask the store to refresh the original row's timestamp and counter).
+
+    ``check`` never records anything; call ``remember`` once the write has been stored, so a
+    failed write does not suppress its retry.
+    """
+
+    def __init__(
+        self,
+        mode: str = "merge",
+        window: int = 32,
+        max_hamming: int = 3,
+        cosine_threshold: float = 0.995,
+        max_users: int = 10_000,
+    ) -> None:
+        if mode not in DEDUP_MODES:
+            raise ValueError(f"Unsupported dedup mode: {mode} (expected one of {', '.join(DEDUP_MODES)})")
+        self.mode = mode
+        self.window = max(1, window)
+        self.max_hamming = max_hamming
+        self.cosine_threshold = cosine_threshold
+        self.max_users = max_users
+        self._recent: "OrderedDict[str, Deque[RecentWrite]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters: Dict[str, int] = {"checked": 0, "stored": 0, "exact": 0, "near": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != "off"
+
+    def check(
+        self,
+        user_id: str,
+        content: str,
+        vector: Optional[Sequence[float]] = None,
+        pending: Sequence[RecentWrite] = (),
+    ) -> Optional[DuplicateMatch]:
+        """Return the match when ``content`` repeats a recent write (or one of ``pending``).
+
+        Without ``vector`` only the exact check runs; near-duplicates need the embedding.
+        ``pending`` holds writes of the same batch that are not stored yet (see ``entry``).
+        """
+        write = self.entry(content, vector)
+        with self._lock:
+            recent = self._recent.get(user_id)
+            if recent is not None:
+                self._recent.move_to_end(user_id)
+            candidates = [*(recent or ()), *pending]
+            match = self._match(candidates, write) if candidates else None
+            if vector is not None or match is not None:
+                self._counters["checked"] += 1
+            if match is None:
+                return None
+            match.original.repeats += 1
+            match.original.last_seen = now_ms()
+            self._counters[match.reason] += 1
+            return match
+
+    def entry(self, content: str, vector: Optional[Sequence[float]] = None) -> RecentWrite:
+        """Fingerprint of one write, as compared by ``check`` and stored by ``remember``."""
+        normalized = normalize_text(content)
+        unit = None
+        if vector is not None:
+            unit = np.asarray(vector, dtype=np.float32).ravel()
+            norm = float(np.linalg.norm(unit))
+            unit = unit / norm if norm else None
+        return RecentWrite(
+            content,
+            hashlib.blake2b(normalized.encode("utf-8"), digest_size=16).hexdigest(),
+            simhash64(content),
+            unit,
+            frozenset(normalized.split()),
+            last_seen=now_ms(),
+        )
+
+    def remember(self, user_id: str, writes: Sequence[RecentWrite]) -> None:
+        """Record stored writes so later repeats of them are suppressed."""
+        if not writes:
+            return
+        with self._lock:
+            recent = self._recent.get(user_id)
+            if recent is None:
+                recent = deque(maxlen=self.window)
+                self._recent[user_id] = recent
+                while len(self._recent) > self.max_users:
+                    self._recent.popitem(last=False)
+            else:
+                self._recent.move_to_end(user_id)
+            recent.extend(writes)
+            self._counters["stored"] += len(writes)
+
+    def forget(self, user_id: str) -> None:
+        with self._lock:
+            self._recent.pop(user_id, None)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"mode": self.mode, "users": len(self._recent), **self._counters}  # type: ignore[dict-item]
+
+    def _match(self, candidates: Sequence[RecentWrite], write: RecentWrite) -> Optional[DuplicateMatch]:
+        for other in reversed(candidates):
+            if other.key == write.key:
+                return DuplicateMatch(other, "exact")
+        unit = write.vector
+        if unit is None or not write.simhash:
+            return None
+        for other in reversed(candidates):
+            if (
+                other.words == write.words
+                and other.vector is not None
+                and other.vector.size == unit.size
+                and bin(other.simhash ^ write.simhash).count("1") <= self.max_hamming
+                and float(other.vector @ unit) >= self.cosine_threshold
+            ):
+                return DuplicateMatch(other, "near")
+        return None
+
+
+__all__ = ["DEDUP_MODES", "DuplicateMatch", "RecentWrite", "WriteDeduplicator", "normalize_text", "simhash64"]
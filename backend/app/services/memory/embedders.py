@@ -0,0 +1,251 @@
+import abc
+import hashlib
+import logging
+import re
+import time
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, Protocol, Sequence, Tuple, runtime_checkable
+
+import httpx
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+@runtime_checkable
+class BatchEmbedder(Protocol):
+    """Embedder that can also vectorize many texts in one call (rows align with inputs)."""
+
+    def __call__(self, text: str) -> List[float]:
+        ...
+
+    def embed_many(self, texts: Sequence[str]) -> np.ndarray:
+        ...
+
+
+def stack_vectors(vectors: Sequence[Sequence[float]]) -> np.ndarray:
+    """Stack vectors into one float32 matrix, zero-padding ragged rows to the widest."""
+    if not vectors:
+        return np.zeros((0, 0), dtype=np.float32)
+    width = max(len(vec) for vec in vectors)
+    matrix = np.zeros((len(vectors), width), dtype=np.float32)
+    for row, vec in enumerate(vectors):
+        matrix[row, : len(vec)] = vec
+    return matrix
+
+
+def embed_many(embedder: Callable[[str], List[float]], texts: Sequence[str]) -> np.ndarray:
+    """Embed ``texts`` in one batch when the embedder supports it, else one call per text."""
+    if not texts:
+        return np.zeros((0, 0), dtype=np.float32)
+    if isinstance(embedder, BatchEmbedder):
+        return np.asarray(embedder.embed_many(list(texts)), dtype=np.float32)
+    return stack_vectors([embedder(text) for text in texts])
+
+
+@lru_cache(maxsize=1 << 17)
+def _feature_slot(feature: str, dim: int) -> Tuple[int, float]:
+    # blake2b instead of hash(): Python salts str hashes per process, which made vectors drift across workers.
+    digest = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+    return digest % dim, 1.0 if digest >> 63 else -1.0
+
+
+class HashingEmbedder:
+    """Deterministic feature-hashing embedder over word and character n-grams.
+
+    Vectors are fixed-size, L2-normalized and identical across processes, so they can be
+    stored in the Milvus collection (same ``dim``) without any model download.
+    """
+
+    def __init__(
+        self,
+        dim: int = 1536,
+        word_ngrams: Tuple[int, int] = (1, 2),
+        char_ngrams: Tuple[int, int] = (3, 4),
+        name: str = "hashing_embedder",
+    ) -> None:
+        self.dim = dim
+        self.word_ngrams = word_ngrams
+        self.char_ngrams = char_ngrams
+        self.__name__ = name
+
+    def __call__(self, text: str) -> List[float]:
+        return self.embed_many([text])[0].tolist()
+
+    def embed_many(self, texts: Sequence[str]) -> np.ndarray:
+        rows: List[int] = []
+        cols: List[int] = []
+        signs: List[float] = []
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                col, sign = _feature_slot(feature, self.dim)
+                rows.append(row)
+                cols.append(col)
+                signs.append(sign)
+
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        if rows:
+            np.add.at(matrix, (np.asarray(rows), np.asarray(cols)), np.asarray(signs, dtype=np.float32))
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return matrix / np.where(norms == 0.0, 1.0, norms)
+
+    def _features(self, text: str) -> List[str]:
+        words = _WORD_RE.findall(text.lower())
+        features: List[str] = []
+        low, high = self.word_ngrams
+        for n in range(low, high + 1):
+            features.extend("w:" + " ".join(words[i : i + n]) for i in range(len(words) - n + 1))
+        low, high = self.char_ngrams
+        for word in words:
+            padded = f"<{word}>"
+            for n in range(low, high + 1):
+                features.extend("c:" + padded[i : i + n] for i in range(len(padded) - n + 1))
+        return features
+
+
+class HTTPEmbedder(abc.ABC):
+    """Base for remote embedding APIs: pooled connections, batched inputs, retries with backoff.
+
+    Responses are validated: a batch must return one vector per input, all of one width and
+    at least ``dim`` wide, so malformed rows raise instead of being zero-padded into the index.
+    """
+
+    def __init__(
+        self,
+        model: str,
+        base_url: str,
+        dim: Optional[int] = None,
+        batch_size: int = 64,
+        max_retries: int = 3,
+        backoff: float = 0.5,
+        timeout: float = 30.0,
+        client: Optional[httpx.Client] = None,
+    ) -> None:
+        self.model = model
+        self.base_url = base_url.rstrip("/")
+        self.dim = dim
+        self.batch_size = max(1, batch_size)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        # One keep-alive pool per embedder; httpx.Client is safe to share across executor threads.
+        self._client = client or httpx.Client(
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=16, max_keepalive_connections=8),
+        )
+        self.__name__ = f"{type(self).__name__.lower()}_{model}"
+
+    def __call__(self, text: str) -> List[float]:
+        return self.embed_many([text])[0].tolist()
+
+    def embed_many(self, texts: Sequence[str]) -> np.ndarray:
+        vectors: List[List[float]] = []
+        for start in range(0, len(texts), self.batch_size):
+            batch = list(texts[start : start + self.batch_size])
+            vectors.extend(self._check_batch(batch, self._embed_batch(batch)))
+        matrix = stack_vectors(vectors)
+        if self.dim and matrix.shape[1] > self.dim:
+            # Matryoshka-style truncation: keep the leading dims and re-normalize.
+            matrix = matrix[:, : self.dim]
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            matrix = matrix / np.where(norms == 0.0, 1.0, norms)
+        return matrix
+
+    def close(self) -> None:
+        self._client.close()
+
+    @abc.abstractmethod
+    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        """Embed one request's worth of ``texts``; rows align with inputs."""
+
+    def _check_batch(self, texts: List[str], vectors: List[List[float]]) -> List[List[float]]:
+        if len(vectors) != len(texts):
+            raise ValueError(f"{self.__name__} returned {len(vectors)} embeddings for {len(texts)} inputs")
+        widths = {len(vec) for vec in vectors}
+        if len(widths) > 1:
+            raise ValueError(f"{self.__name__} returned embeddings of mixed widths {sorted(widths)}")
+        width = widths.pop() if widths else 0
+        if texts and (width == 0 or (self.dim and width < self.dim)):
+            raise ValueError(f"{self.__name__} returned {width}-dim embeddings; EMBEDDING_DIM is {self.dim}")
+        return vectors
+
+    def _post(self, path: str, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None) -> Any:
+        attempt = 0
+        while True:
+            try:
+                resp = self._client.post(f"{self.base_url}{path}", json=payload, headers=headers)
+                if resp.status_code not in RETRYABLE_STATUS or attempt >= self.max_retries:
+                    resp.raise_for_status()
+                    return resp.json()
+                reason: Any = f"HTTP {resp.status_code}"
+            except httpx.TransportError as exc:
+                if attempt >= self.max_retries:
+                    raise
+                reason = exc
+            delay = self.backoff * (2**attempt)
+            logger.warning("Embedding request to %s failed (%s); retrying in %.2fs", path, reason, delay)
+            time.sleep(delay)
+            attempt += 1
+
+
+class OpenAIEmbedder(HTTPEmbedder):
+    """OpenAI ``/embeddings`` client; v3 models shorten vectors server-side via ``dimensions``."""
+
+    def __init__(self, api_key: str, model: str, base_url: str = "https://api.openai.com/v1", **kwargs: Any) -> None:
+        super().__init__(model=model, base_url=base_url, **kwargs)
+        self.api_key = api_key
+
+    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        payload: Dict[str, Any] = {"model": self.model, "input": texts}
+        if self.dim and self.model.startswith("text-embedding-3"):
+            payload["dimensions"] = self.dim
+        data = self._post("/embeddings", payload, headers={"Authorization": f"Bearer {self.api_key}"})
+        items = sorted(data.get("data") or [], key=lambda item: item.get("index", 0))
+        return [item["embedding"] for item in items]
+
+
+class OllamaEmbedder(HTTPEmbedder):
+    """Ollama ``/api/embed`` client (batched ``input`` list)."""
+
+    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        data = self._post("/api/embed", {"model": self.model, "input": texts})
+        return data.get("embeddings") or []
+
+
+def build_embedder(
+    provider: str,
+    model: str,
+    dim: int,
+    openai_api_key: str = "",
+    openai_base_url: str = "https://api.openai.com/v1",
+    ollama_base_url: str = "http://localhost:11434",
+    ollama_model: str = "nomic-embed-text",
+    **kwargs: Any,
+) -> Callable[[str], List[float]]:
+    """Pick an embedder for ``provider`` (hash | openai | ollama), falling back to hashing offline.
+
+    ``model`` names the OpenAI-compatible model; Ollama uses its own ``ollama_model``.
+    """
+    choice = (provider or "hash").lower()
+    if choice == "openai":
+        if openai_api_key:
+            return OpenAIEmbedder(api_key=openai_api_key, model=model, base_url=openai_base_url, dim=dim, **kwargs)
+        logger.warning("OPENAI_API_KEY not set; falling back to the hashing embedder")
+    elif choice == "ollama":
+        return OllamaEmbedder(model=ollama_model, base_url=ollama_base_url, dim=dim, **kwargs)
+    return HashingEmbedder(dim=dim, name=f"hashing_embedder_{model}")
+
+
+__all__ = [
+    "BatchEmbedder",
+    "HTTPEmbedder",
+    "HashingEmbedder",
+    "OllamaEmbedder",
+    "OpenAIEmbedder",
+    "build_embedder",
+    "embed_many",
+    "stack_vectors",
+]
@@ -0,0 +1,165 @@
+import hashlib
+import logging
+import sqlite3
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.services.memory.embedders import embed_many, stack_vectors
+
+logger = logging.getLogger(__name__)
+
+
+def embedding_key(model_name: str, text: str) -> str:
+    """Stable content hash; unlike ``hash()`` it is identical across processes and restarts."""
+    return hashlib.sha256(f"{model_name}\0{text}".encode("utf-8")).hexdigest()
+
+
+class SQLiteEmbeddingStore:
+    """On-disk embedding tier: one SQLite table of float32 blobs keyed by content hash."""
+
+    def __init__(self, path: str) -> None:
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        with self._lock:
+            row = self._conn.execute("SELECT vector FROM embeddings WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        return np.frombuffer(row[0], dtype=np.float32)
+
+    def put(self, key: str, vector: np.ndarray) -> None:
+        self.put_many([(key, vector)])
+
+    def put_many(self, items: Sequence[Tuple[str, np.ndarray]]) -> None:
+        """Write many rows in one transaction (one commit/fsync instead of one per row)."""
+        rows = [(key, np.asarray(vector, dtype=np.float32).tobytes()) for key, vector in items]
+        if not rows:
+            return
+        with self._lock:
+            with self._conn:
+                self._conn.executemany("INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)", rows)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class CachedEmbedder:
+    """Wrap an ``Embedder`` with an in-process LRU and an optional persistent tier."""
+
+    def __init__(
+        self,
+        embedder: Callable[[str], List[float]],
+        model_name: str,
+        maxsize: int = 4096,
+        disk: Optional[SQLiteEmbeddingStore] = None,
+    ) -> None:
+        self.embedder = embedder
+        self.model_name = model_name
+        self.maxsize = maxsize
+        self.disk = disk
+        self.__name__ = f"cached_{getattr(embedder, '__name__', 'embedder')}"
+        self._entries: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters: Dict[str, int] = {"hits": 0, "disk_hits": 0, "misses": 0}
+
+    def __call__(self, text: str) -> List[float]:
+        key = embedding_key(self.model_name, text)
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is not None:
+                self._entries.move_to_end(key)
+                self._counters["hits"] += 1
+                return vector.tolist()
+
+        vector = self.disk.get(key) if self.disk is not None else None
+        if vector is not None:
+            with self._lock:
+                self._counters["disk_hits"] += 1
+        else:
+            vector = np.asarray(self.embedder(text), dtype=np.float32)
+            with self._lock:
+                self._counters["misses"] += 1
+            if self.disk is not None:
+                try:
+                    self.disk.put(key, vector)
+                except sqlite3.Error as exc:  # pragma: no cover - disk tier is best effort
+                    logger.warning("Embedding disk cache write failed: %s", exc)
+        self._remember(key, vector)
+        return vector.tolist()
+
+    def embed_many(self, texts: Sequence[str]) -> np.ndarray:
+        """Serve cached rows and embed only the misses, in a single batch call."""
+        keys = [embedding_key(self.model_name, text) for text in texts]
+        found: Dict[str, np.ndarray] = {}
+        with self._lock:
+            for key in keys:
+                vector = self._entries.get(key)
+                if vector is not None:
+                    self._entries.move_to_end(key)
+                    found[key] = vector
+                    self._counters["hits"] += 1
+
+        missing = [(key, text) for key, text in dict(zip(keys, texts)).items() if key not in found]
+        if missing and self.disk is not None:
+            still_missing = []
+            for key, text in missing:
+                vector = self.disk.get(key)
+                if vector is None:
+                    still_missing.append((key, text))
+                    continue
+                found[key] = vector
+                self._remember(key, vector)
+                with self._lock:
+                    self._counters["disk_hits"] += 1
+            missing = still_missing
+
+        if missing:
+            matrix = embed_many(self.embedder, [text for _, text in missing])
+            with self._lock:
+                self._counters["misses"] += len(missing)
+            computed = []
+            for (key, _), vector in zip(missing, matrix):
+                vector = np.ascontiguousarray(vector, dtype=np.float32)
+                found[key] = vector
+                self._remember(key, vector)
+                computed.append((key, vector))
+            if self.disk is not None:
+                try:
+                    self.disk.put_many(computed)
+                except sqlite3.Error as exc:  # pragma: no cover - disk tier is best effort
+                    logger.warning("Embedding disk cache write failed: %s", exc)
+        return stack_vectors([found[key] for key in keys])
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {**self._counters, "size": len(self._entries)}
+
+    def close(self) -> None:
+        close_inner = getattr(self.embedder, "close", None)
+        if callable(close_inner):
+            close_inner()
+        if self.disk is not None:
+            self.disk.close()
+
+    def _remember(self, key: str, vector: np.ndarray) -> None:
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = vector
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+
+__all__ = ["CachedEmbedder", "SQLiteEmbeddingStore", "embedding_key"]
@@ -0,0 +1,64 @@
+from dataclasses import dataclass, field, replace
+from typing import Any, Dict, List, Optional, Sequence
+
+
+@dataclass(frozen=True)
+class SearchHit:
+    """One search result. For vector hits ``score`` is the inner product of normalized vectors (cosine)."""
+
+    id: Any
+    score: float
+    content: str
+    created_at: Optional[int] = None  # epoch milliseconds
+    source: str = "vector"  # vector | bm25 | hybrid (found by both, after fusion)
+    # Stored (normalized) embedding, when the store returned it; used for diversity re-ranking.
+    vector: Optional[Any] = field(default=None, compare=False, repr=False)
+
+
+def select_hits(
+    hits: Sequence[SearchHit],
+    top_k: int,
+    min_score: Optional[float] = None,
+    relative_score: float = 0.0,
+) -> List[SearchHit]:
+    """Adaptive top-k: keep at most ``top_k`` hits that clear both relevance floors.
+
+    ``min_score`` is an absolute cosine floor; ``relative_score`` drops hits scoring below
+    that fraction of the best hit, so a single strong match is not padded with noise.
+    ``hits`` must be sorted by descending score.
+    """
+    if not hits or top_k <= 0:
+        return []
+    floor = min_score if min_score is not None else float("-inf")
+    best = hits[0].score
+    if relative_score > 0 and best > 0:
+        floor = max(floor, best * relative_score)
+    selected: List[SearchHit] = []
+    for hit in hits[:top_k]:
+        if hit.score < floor:
+            break
+        selected.append(hit)
+    return selected
+
+
+def fuse_hits(rankings: Sequence[Sequence[SearchHit]], top_k: int, k: int = 60) -> List[SearchHit]:
+    """Reciprocal rank fusion: order by ``sum(1 / (k + rank))`` over the ranked lists.
+
+    Hits are matched by content because each retriever has its own ids. The first list's
+    hit object is kept (so vector hits retain their cosine score); hits found by more than
+    one list are marked ``hybrid``.
+    """
+    fused: Dict[str, float] = {}
+    first: Dict[str, SearchHit] = {}
+    for ranking in rankings:
+        for rank, hit in enumerate(ranking, start=1):
+            if hit.content in fused:
+                first[hit.content] = replace(first[hit.content], source="hybrid")
+            else:
+                first[hit.content] = hit
+            fused[hit.content] = fused.get(hit.content, 0.0) + 1.0 / (k + rank)
+    order = sorted(fused, key=fused.__getitem__, reverse=True)
+    return [first[content] for content in order[:top_k]]
+
+
+__all__ = ["SearchHit", "fuse_hits", "select_hits"]
@@ -0,0 +1,162 @@
+import logging
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+ASSIGN_CHUNK = 65536
+MAX_POINTS_PER_CENTROID = 256  # training sample cap, as in Faiss
+
+
+def assign(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Nearest centroid (max inner product) for each row, chunked to bound the score matrix."""
+    out = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), ASSIGN_CHUNK):
+        chunk = vectors[start : start + ASSIGN_CHUNK]
+        out[start : start + len(chunk)] = np.argmax(chunk @ centroids.T, axis=1)
+    return out
+
+
+def train_centroids(
+    vectors: np.ndarray,
+    nlist: int,
+    iterations: int = 10,
+    seed: int = 0,
+    init: Optional[np.ndarray] = None,
+) -> np.ndarray:
+    """Spherical k-means on L2-normalized rows; ``init`` warm-starts a retrain."""
+    rng = np.random.default_rng(seed)
+    n = len(vectors)
+    nlist = max(1, min(nlist, n))
+    if n > nlist * MAX_POINTS_PER_CENTROID:
+        vectors = vectors[rng.choice(n, nlist * MAX_POINTS_PER_CENTROID, replace=False)]
+        n = len(vectors)
+    if init is not None and len(init) == nlist:
+        centroids = np.array(init, dtype=np.float32)
+    else:
+        centroids = np.array(vectors[rng.choice(n, nlist, replace=False)], dtype=np.float32)
+    for _ in range(iterations):
+        labels = assign(vectors, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, vectors)
+        counts = np.bincount(labels, minlength=nlist)
+        empty = counts == 0
+        if empty.any():
+            # Re-seed empty lists from random points so every list stays useful.
+            sums[empty] = vectors[rng.choice(n, int(empty.sum()), replace=False)]
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        centroids = sums / np.where(norms == 0.0, 1.0, norms)
+    return centroids.astype(np.float32)
+
+
+class IVFIndex:
+    """Inverted-file coarse quantizer over rows stored elsewhere (IVF_FLAT, in NumPy).
+
+    The index never copies vectors: lists hold row positions into the owner's matrix, and the
+    full matrix is only requested (via ``load_all``) when training. ``nlist``/``nprobe`` mean
+    the same as Milvus IVF_FLAT.
+    Training happens once ``min_train_rows`` rows exist; the index retrains (warm-started)
+    when the row count doubles or the largest list exceeds ``imbalance`` x the mean.
+    """
+
+    def __init__(
+        self,
+        nlist: int = 64,
+        nprobe: int = 8,
+        min_train_rows: Optional[int] = None,
+        imbalance: float = 4.0,
+        iterations: int = 10,
+        seed: int = 0,
+    ) -> None:
+        self.nlist = max(1, nlist)
+        self.nprobe = max(1, nprobe)
+        self.min_train_rows = min_train_rows if min_train_rows is not None else self.nlist * 39
+        self.imbalance = imbalance
+        self.iterations = iterations
+        self.seed = seed
+        self.centroids: Optional[np.ndarray] = None
+        self.retrains = 0
+        self._lists: List[np.ndarray] = []
+        self._sizes = np.zeros(0, dtype=np.int64)
+        self._size = 0
+        self._trained_size = 0
+
+    @property
+    def trained(self) -> bool:
+        return self.centroids is not None
+
+    def add(self, vectors: np.ndarray, start: int, load_all: Callable[[], np.ndarray]) -> None:
+        """Index ``vectors`` stored at positions ``start..``; ``load_all`` returns every row so far."""
+        end = start + len(vectors)
+        if not self.trained:
+            if end >= self.min_train_rows:
+                self.train(load_all())
+            return
+        self._append(np.arange(start, end), assign(vectors, self.centroids))
+        self._size = end
+        if self._needs_retrain():
+            self.train(load_all())
+
+    def train(self, matrix: np.ndarray) -> None:
+        self.centroids = train_centroids(
+            matrix, self.nlist, iterations=self.iterations, seed=self.seed + self.retrains, init=self.centroids
+        )
+        self.retrains += 1
+        nlist = len(self.centroids)
+        self._lists = [np.empty(16, dtype=np.int64) for _ in range(nlist)]
+        self._sizes = np.zeros(nlist, dtype=np.int64)
+        self._append(np.arange(len(matrix)), assign(matrix, self.centroids))
+        self._size = self._trained_size = len(matrix)
+        logger.debug("Trained IVF index: %s rows into %s lists", len(matrix), nlist)
+
+    def candidates(self, query: np.ndarray, nprobe: Optional[int] = None) -> Optional[np.ndarray]:
+        """Row positions in the ``nprobe`` lists closest to ``query``; ``None`` until trained."""
+        if self.centroids is None:
+            return None
+        probe = min(nprobe or self.nprobe, len(self.centroids))
+        scores = self.centroids @ query
+        nearest = np.argpartition(-scores, probe - 1)[:probe] if probe < len(scores) else np.arange(len(scores))
+        return np.concatenate([self._lists[i][: self._sizes[i]] for i in nearest])
+
+    def stats(self) -> Dict[str, Any]:
+        if self.centroids is None:
+            return {"trained": False, "rows": self._size}
+        mean = self._size / len(self._sizes) if len(self._sizes) else 0.0
+        return {
+            "trained": True,
+            "rows": self._size,
+            "nlist": len(self._sizes),
+            "retrains": self.retrains,
+            "max_list": int(self._sizes.max()),
+            "mean_list": round(mean, 2),
+        }
+
+    def _append(self, positions: np.ndarray, labels: np.ndarray) -> None:
+        order = np.argsort(labels, kind="stable")
+        labels, positions = labels[order], positions[order]
+        bounds = np.flatnonzero(np.diff(labels)) + 1
+        for group in np.split(np.arange(len(labels)), bounds):
+            if not group.size:
+                continue
+            label = int(labels[group[0]])
+            size = int(self._sizes[label])
+            needed = size + group.size
+            if needed > len(self._lists[label]):
+                grown = np.empty(max(needed, 2 * len(self._lists[label])), dtype=np.int64)
+                grown[:size] = self._lists[label][:size]
+                self._lists[label] = grown
+            self._lists[label][size:needed] = positions[group]
+            self._sizes[label] = needed
+
+    def _needs_retrain(self) -> bool:
+        if self._size >= 2 * self._trained_size:
+            return True
+        # Only re-check balance after 10% growth so a skewed corpus does not retrain every write.
+        if self._size < 1.1 * self._trained_size:
+            return False
+        mean = self._size / len(self._sizes)
+        return bool(self._sizes.max() > self.imbalance * mean)
+
+
+__all__ = ["IVFIndex", "assign", "train_centroids"]
@@ -0,0 +1,157 @@
+import heapq
+import itertools
+import math
+import re
+import threading
+from collections import Counter, OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from app.services.memory.hits import SearchHit
+from app.services.memory.local_index import now_ms
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+# Function words carry no lexical signal for memory recall and would match nearly every message.
+STOPWORDS = frozenset(
+    "a an and are as at be but by did do does for from had has have i if in is it its me my of on or so "
+    "that the their then there they this to was we were what when where which who will with you your".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    return [token for token in _TOKEN.findall(text.lower()) if token not in STOPWORDS]
+
+
+class _UserPostings:
+    """One user's inverted index: ``term -> {doc_id: tf}`` plus per-doc lengths/terms."""
+
+    __slots__ = ("postings", "docs", "total_len")
+
+    def __init__(self) -> None:
+        self.postings: Dict[str, Dict[int, int]] = {}
+        # doc_id -> (content, created_at, term counts, length); insertion order doubles as age order.
+        self.docs: "OrderedDict[int, tuple]" = OrderedDict()
+        self.total_len = 0
+
+    def add(self, doc_id: int, content: str, created_at: int) -> None:
+        counts = Counter(tokenize(content))
+        length = sum(counts.values())
+        self.docs[doc_id] = (content, created_at, counts, length)
+        self.total_len += length
+        for term, tf in counts.items():
+            self.postings.setdefault(term, {})[doc_id] = tf
+
+    def remove(self, doc_id: int) -> bool:
+        doc = self.docs.pop(doc_id, None)
+        if doc is None:
+            return False
+        self.total_len -= doc[3]
+        for term in doc[2]:
+            docs = self.postings[term]
+            del docs[doc_id]
+            if not docs:
+                del self.postings[term]
+        return True
+
+
+class BM25Index:
+    """Incremental per-user BM25 (Okapi) index over stored message content.
+
+    Appends and deletes cost O(terms in the message) — no global rebuild — and dropping a
+    user is one dict pop. ``max_docs_per_user`` (0 = unbounded) evicts a user's oldest
+    messages first, mirroring the in-memory vector store's budget.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75, max_docs_per_user: int = 0) -> None:
+        self.k1 = k1
+        self.b = b
+        self.max_docs_per_user = max_docs_per_user
+        self._users: Dict[str, _UserPostings] = {}
+        self._next_id = itertools.count()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return sum(len(user.docs) for user in self._users.values())
+
+    def add(self, user_id: str, content: str, created_at: Optional[int] = None) -> int:
+        return self.add_many(user_id, [content], created_at)[0]
+
+    def add_many(self, user_id: str, contents: Sequence[str], created_at: Optional[int] = None) -> List[int]:
+        stamp = created_at if created_at is not None else now_ms()
+        with self._lock:
+            user = self._users.setdefault(user_id, _UserPostings())
+            doc_ids = []
+            for content in contents:
+                doc_id = next(self._next_id)
+                user.add(doc_id, content, stamp)
+                doc_ids.append(doc_id)
+            if self.max_docs_per_user:
+                while len(user.docs) > self.max_docs_per_user:
+                    user.remove(next(iter(user.docs)))
+            return doc_ids
+
+    def replace_user(self, user_id: str, docs: Sequence[Tuple[str, int]]) -> None:
+        """Rebuild one user's postings from ``(content, created_at)`` pairs, oldest first."""
+        user = _UserPostings()
+        for content, created_at in docs[-self.max_docs_per_user :] if self.max_docs_per_user else docs:
+            user.add(next(self._next_id), content, created_at)
+        with self._lock:
+            self._users[user_id] = user
+
+    def remove(self, user_id: str, doc_id: int) -> bool:
+        with self._lock:
+            user = self._users.get(user_id)
+            return user.remove(doc_id) if user is not None else False
+
+    def drop_user(self, user_id: str) -> None:
+        with self._lock:
+            self._users.pop(user_id, None)
+
+    def search(
+        self,
+        user_id: str,
+        query: str,
+        top_k: int = 5,
+        since_ms: Optional[int] = None,
+        until_ms: Optional[int] = None,
+    ) -> List[SearchHit]:
+        """Best ``top_k`` messages sharing at least one query term; ``score`` is the BM25 score."""
+        terms = set(tokenize(query))
+        with self._lock:
+            user = self._users.get(user_id)
+            if user is None or not terms or not user.docs:
+                return []
+            n_docs = len(user.docs)
+            avg_len = user.total_len / n_docs or 1.0
+            scores: Dict[int, float] = {}
+            for term in terms:
+                docs = user.postings.get(term)
+                if not docs:
+                    continue
+                idf = math.log(1.0 + (n_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+                for doc_id, tf in docs.items():
+                    norm = self.k1 * (1.0 - self.b + self.b * user.docs[doc_id][3] / avg_len)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1.0) / (tf + norm)
+            if since_ms is not None or until_ms is not None:
+                scores = {
+                    doc_id: score
+                    for doc_id, score in scores.items()
+                    if (since_ms is None or user.docs[doc_id][1] >= since_ms)
+                    and (until_ms is None or user.docs[doc_id][1] <= until_ms)
+                }
+            best = heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
+            return [
+                SearchHit(doc_id, score, user.docs[doc_id][0], created_at=user.docs[doc_id][1], source="bm25")
+                for doc_id, score in best
+            ]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "users": len(self._users),
+                "docs": sum(len(user.docs) for user in self._users.values()),
+                "terms": sum(len(user.postings) for user in self._users.values()),
+                "postings": sum(len(docs) for user in self._users.values() for docs in user.postings.values()),
+            }
+
+
+__all__ = ["BM25Index", "STOPWORDS", "tokenize"]
@@ -0,0 +1,443 @@
+import itertools
+import logging
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.services.memory.hits import SearchHit
+from app.services.memory.ivf import IVFIndex
+from app.services.memory.quantization import QuantizedRows, VectorCodec
+
+if TYPE_CHECKING:  # pragma: no cover - import cycle: the persistent store builds on this module
+    from app.services.memory.local_store import PersistentVectorStore
+
+logger = logging.getLogger(__name__)
+
+INITIAL_CAPACITY = 16
+
+
+def now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+def fit_dim(vector: np.ndarray, dim: int) -> np.ndarray:
+    """Pad/truncate to ``dim`` so mixed-size embeddings stay comparable."""
+    if vector.size == dim:
+        return vector
+    if vector.size > dim:
+        return vector[:dim]
+    padded = np.zeros(dim, dtype=np.float32)
+    padded[: vector.size] = vector
+    return padded
+
+
+def top_k_order(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the ``k`` largest scores, best first (O(n) selection + O(k log k) sort)."""
+    candidates = np.argpartition(-scores, k - 1)[:k] if k < scores.size else np.arange(scores.size)
+    return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+
+def normalize(vector: np.ndarray) -> np.ndarray:
+    norm = float(np.linalg.norm(vector))
+    if norm == 0.0:
+        return vector
+    return vector / norm
+
+
+class _UserRows:
+    """Contiguous, L2-normalized rows for a single user, stored in the index's codec."""
+
+    __slots__ = ("dim", "vectors", "created_at", "ids", "size", "contents", "metadata", "ivf", "content_bytes")
+
+    def __init__(
+        self,
+        dim: int,
+        codec: VectorCodec,
+        capacity: int = INITIAL_CAPACITY,
+        ivf: Optional[IVFIndex] = None,
+    ) -> None:
+        self.dim = dim
+        self.vectors = QuantizedRows(dim, codec, capacity)
+        self.created_at = np.zeros(capacity, dtype=np.int64)  # epoch milliseconds
+        self.ids = np.zeros(capacity, dtype=np.int64)
+        self.size = 0
+        self.contents: List[str] = []
+        self.metadata: List[Dict[str, Any]] = []
+        self.ivf = ivf
+        self.content_bytes = 0
+
+    @property
+    def nbytes(self) -> int:
+        """Resident bytes: allocated arrays plus content strings (metadata dicts are not counted)."""
+        return self.vectors.allocated_bytes + self.created_at.nbytes + self.ids.nbytes + self.content_bytes
+
+    def extend(
+        self,
+        row_ids: np.ndarray,
+        vectors: np.ndarray,
+        contents: List[str],
+        metadata: List[Dict[str, Any]],
+        created_at: int,
+    ) -> None:
+        start = self.size
+        self._reserve(start + len(contents))
+        self.vectors.extend(vectors)
+        self.created_at[start : start + len(contents)] = created_at
+        self.ids[start : start + len(contents)] = row_ids
+        self.size += len(contents)
+        self.contents.extend(contents)
+        self.metadata.extend(metadata)
+        self.content_bytes += sum(sys.getsizeof(content) for content in contents)
+        if self.ivf is not None:
+            self.ivf.add(vectors, start, self.vectors.decode)
+
+    def drop_oldest(self, count: int) -> "_UserRows":
+        """Remove the ``count`` oldest rows and return them as a detached ``_UserRows``."""
+        evicted = _UserRows(self.dim, self.vectors.codec, capacity=max(count, 1))
+        evicted.vectors.extend(self.vectors.decode(np.arange(count)))
+        evicted.created_at[:count] = self.created_at[:count]
+        evicted.ids[:count] = self.ids[:count]
+        evicted.size = count
+        evicted.contents, self.contents = self.contents[:count], self.contents[count:]
+        evicted.metadata, self.metadata = self.metadata[:count], self.metadata[count:]
+        evicted.content_bytes = sum(sys.getsizeof(content) for content in evicted.contents)
+
+        self.vectors.drop_front(count)
+        remaining = self.size - count
+        capacity = max(remaining, INITIAL_CAPACITY)
+        for name in ("created_at", "ids"):
+            kept = np.zeros(capacity, dtype=np.int64)
+            kept[:remaining] = getattr(self, name)[count : self.size]
+            setattr(self, name, kept)
+        self.size = remaining
+        self.content_bytes -= evicted.content_bytes
+        if self.ivf is not None and self.ivf.trained:
+            self.ivf.train(self.vectors.decode())  # positions shifted; rebuild the lists
+        return evicted
+
+    def _reserve(self, needed: int) -> None:
+        capacity = len(self.created_at)
+        if needed <= capacity:
+            return
+        # Amortized doubling keeps appends O(1); vectors grow the same way inside QuantizedRows.
+        while capacity < needed:
+            capacity *= 2
+        stamps = np.zeros(capacity, dtype=np.int64)
+        stamps[: self.size] = self.created_at[: self.size]
+        self.created_at = stamps
+        ids = np.zeros(capacity, dtype=np.int64)
+        ids[: self.size] = self.ids[: self.size]
+        self.ids = ids
+
+
+class LocalVectorIndex:
+    """In-process cosine index used when Milvus is unavailable (one matrix per user).
+
+    Search is exact by default. With ``nlist > 0`` each user gets an IVF coarse index once
+    they have ``ivf_min_rows`` rows, and queries only scan the ``nprobe`` closest lists.
+    ``vector_dtype`` (``float32`` | ``float16`` | ``int8``) sets how rows are held in memory;
+    quantized rows are scored directly, there is no float32 copy to re-rank against.
+
+    ``max_bytes`` bounds resident memory across users: the least recently accessed users are
+    evicted first. ``max_user_bytes`` caps one user by evicting their oldest rows. Evicted rows
+    move to ``spill`` (a disk-backed store that is searched alongside memory) or are dropped.
+    Both budgets trim to 90% of the limit so eviction is not triggered on every write.
+    """
+
+    def __init__(
+        self,
+        nlist: int = 0,
+        nprobe: int = 8,
+        ivf_min_rows: Optional[int] = None,
+        vector_dtype: str = "float32",
+        max_bytes: int = 0,
+        max_user_bytes: int = 0,
+        spill: Optional["PersistentVectorStore"] = None,
+    ) -> None:
+        self._users: "OrderedDict[str, _UserRows]" = OrderedDict()  # least recently accessed first
+        self._next_id = itertools.count(1)  # row ids, unique across users like Milvus auto-ids
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.ivf_min_rows = ivf_min_rows
+        self.codec = VectorCodec(vector_dtype)
+        self.max_bytes = max_bytes
+        self.max_user_bytes = max_user_bytes
+        self.spill = spill
+        self._lock = threading.RLock()
+        self._resident = 0
+        self._counters: Dict[str, int] = {"evicted_users": 0, "evicted_rows": 0, "spilled_rows": 0, "dropped_rows": 0}
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes held by stored vectors (excluding content strings)."""
+        return sum(rows.vectors.nbytes for rows in list(self._users.values()))
+
+    @property
+    def resident_bytes(self) -> int:
+        return self._resident
+
+    def _new_rows(self, user_id: str, dim: int) -> _UserRows:
+        ivf = IVFIndex(self.nlist, self.nprobe, min_train_rows=self.ivf_min_rows) if self.nlist > 0 else None
+        rows = _UserRows(dim=max(dim, 1), codec=self.codec, ivf=ivf)
+        self._users[user_id] = rows
+        self._resident += rows.nbytes
+        return rows
+
+    def __len__(self) -> int:
+        return sum(rows.size for rows in self._users.values())
+
+    def count(self, user_id: str) -> int:
+        rows = self._users.get(user_id)
+        return rows.size if rows else 0
+
+    def add(
+        self,
+        user_id: str,
+        content: str,
+        embedding: Sequence[float],
+        metadata: Optional[Dict[str, Any]] = None,
+        created_at: Optional[int] = None,
+    ) -> None:
+        vector = np.asarray(embedding, dtype=np.float32).ravel()
+        with self._lock:
+            rows = self._touch(user_id) or self._new_rows(user_id, vector.size)
+            stamp = created_at if created_at is not None else now_ms()
+            row_ids = np.array([next(self._next_id)], dtype=np.int64)
+            before = rows.nbytes
+            rows.extend(row_ids, normalize(self._fit(vector, rows.dim))[None, :], [content], [metadata or {}], stamp)
+            self._resident += rows.nbytes - before
+            self._enforce_budget(user_id, rows)
+
+    def add_many(
+        self,
+        user_id: str,
+        contents: Sequence[str],
+        embeddings: np.ndarray,
+        metadata: Optional[Sequence[Optional[Dict[str, Any]]]] = None,
+        created_at: Optional[int] = None,
+    ) -> None:
+        if not len(contents):
+            return
+        matrix = np.asarray(embeddings, dtype=np.float32).reshape(len(contents), -1)
+        with self._lock:
+            rows = self._touch(user_id) or self._new_rows(user_id, matrix.shape[1])
+            matrix = self._fit_rows(matrix, rows.dim)
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            matrix = matrix / np.where(norms == 0.0, 1.0, norms)
+            metas = [dict(meta or {}) for meta in (metadata or [None] * len(contents))]
+            row_ids = np.fromiter((next(self._next_id) for _ in contents), dtype=np.int64, count=len(contents))
+            before = rows.nbytes
+            rows.extend(row_ids, matrix, list(contents), metas, created_at if created_at is not None else now_ms())
+            self._resident += rows.nbytes - before
+            self._enforce_budget(user_id, rows)
+
+    def refresh(self, user_id: str, content: str, created_at: int, metadata: Dict[str, Any]) -> bool:
+        """Restamp the newest resident row with exactly ``content`` and merge ``metadata`` into it."""
+        with self._lock:
+            rows = self._users.get(user_id)
+            if rows is None:
+                return False
+            for row in range(rows.size - 1, -1, -1):
+                if rows.contents[row] == content:
+                    rows.created_at[row] = created_at
+                    rows.metadata[row] = {**rows.metadata[row], **metadata}
+                    return True
+        return False
+
+    def search(
+        self,
+        user_id: str,
+        embedding: Sequence[float],
+        top_k: int = 5,
+        since_ms: Optional[int] = None,
+        until_ms: Optional[int] = None,
+    ) -> List[str]:
+        return [hit.content for hit in self.search_hits(user_id, embedding, top_k, since_ms, until_ms)]
+
+    def search_hits(
+        self,
+        user_id: str,
+        embedding: Sequence[float],
+        top_k: int = 5,
+        since_ms: Optional[int] = None,
+        until_ms: Optional[int] = None,
+    ) -> List[SearchHit]:
+        """Top-k hits by cosine, optionally bounded to ``since_ms <= created_at <= until_ms``."""
+        # Writers shift rows in place (appends, budget eviction, IVF retrains), so the resident
+        # scan runs under the lock; the spill store does its own locking.
+        with self._lock:
+            rows = self._touch(user_id)
+            hits = self._search_resident(rows, embedding, top_k, since_ms, until_ms) if rows is not None else []
+        if self.spill is not None and self.spill.count(user_id):
+            spilled = self.spill.search_hits(user_id, embedding, top_k, since_ms, until_ms)
+            hits = sorted(hits + spilled, key=lambda hit: -hit.score)[:top_k]
+        return hits
+
+    def _search_resident(
+        self,
+        rows: _UserRows,
+        embedding: Sequence[float],
+        top_k: int,
+        since_ms: Optional[int],
+        until_ms: Optional[int],
+    ) -> List[SearchHit]:
+        if rows.size == 0 or top_k <= 0:
+            return []
+        eligible = self._time_mask(rows, since_ms, until_ms)
+        available = rows.size if eligible is None else int(eligible.sum())
+        k = min(top_k, available)
+        if k == 0:
+            return []
+        query = normalize(self._fit(np.asarray(embedding, dtype=np.float32).ravel(), rows.dim))
+        if not query.any():
+            # No usable query signal: behave like a recency window.
+            recent = np.arange(rows.size) if eligible is None else np.flatnonzero(eligible)
+            return [self._hit(rows, i, 0.0) for i in recent[-k:]]
+
+        positions = rows.ivf.candidates(query, self.nprobe) if rows.ivf is not None else None
+        if positions is not None:
+            if eligible is not None:
+                positions = positions[eligible[positions]]
+            if positions.size >= k:
+                scores = rows.vectors.scores(query, positions)
+                return [self._hit(rows, int(positions[i]), float(scores[i])) for i in top_k_order(scores, k)]
+            # Probed lists hold too few eligible rows (e.g. narrow time bounds): fall back to exact.
+
+        scores = rows.vectors.scores(query)
+        if eligible is not None:
+            scores = np.where(eligible, scores, -np.inf)
+        return [self._hit(rows, int(i), float(scores[i])) for i in top_k_order(scores, k)]
+
+    @staticmethod
+    def _hit(rows: _UserRows, row: int, score: float) -> SearchHit:
+        return SearchHit(
+            id=int(rows.ids[row]),
+            score=score,
+            content=rows.contents[row],
+            created_at=int(rows.created_at[row]),
+            vector=rows.vectors.decode(np.array([row]))[0],
+        )
+
+    @staticmethod
+    def _time_mask(rows: _UserRows, since_ms: Optional[int], until_ms: Optional[int]) -> Optional[np.ndarray]:
+        if since_ms is None and until_ms is None:
+            return None
+        stamps = rows.created_at[: rows.size]
+        mask = np.ones(rows.size, dtype=bool)
+        if since_ms is not None:
+            mask &= stamps >= since_ms
+        if until_ms is not None:
+            mask &= stamps <= until_ms
+        return mask
+
+    def documents(self, user_id: str, limit: int = 0) -> List[Tuple[str, int]]:
+        """The user's newest ``limit`` rows (0 = all) as ``(content, created_at)``, oldest first.
+
+        Spilled rows are older than resident ones, so they come first.
+        """
+        with self._lock:
+            rows = self._users.get(user_id)
+            start = max(0, rows.size - limit) if rows is not None and limit else 0
+            resident = (
+                list(zip(rows.contents[start : rows.size], rows.created_at[start : rows.size].tolist()))
+                if rows is not None
+                else []
+            )
+        if self.spill is not None and (not limit or len(resident) < limit):
+            resident = self.spill.documents(user_id, limit - len(resident) if limit else 0) + resident
+        return resident
+
+    def drop_user(self, user_id: str) -> None:
+        with self._lock:
+            rows = self._users.pop(user_id, None)
+            if rows is not None:
+                self._resident -= rows.nbytes
+        if self.spill is not None:
+            self.spill.drop_user(user_id)
+
+    def budget_stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "resident_bytes": self._resident,
+                "max_bytes": self.max_bytes,
+                "max_user_bytes": self.max_user_bytes,
+                "resident_users": len(self._users),
+                **self._counters,
+            }
+
+    def _touch(self, user_id: str) -> Optional[_UserRows]:
+        rows = self._users.get(user_id)
+        if rows is not None:
+            self._users.move_to_end(user_id)
+        return rows
+
+    def _enforce_budget(self, user_id: str, rows: _UserRows) -> None:
+        """Evict after a write: the writer's oldest rows first, then least recently used users."""
+        if self.max_user_bytes and rows.nbytes > self.max_user_bytes:
+            self._trim_user(user_id, rows, int(self.max_user_bytes * 0.9))
+        if not self.max_bytes or self._resident <= self.max_bytes:
+            return
+        target = int(self.max_bytes * 0.9)
+        for victim in list(self._users):
+            if self._resident <= target:
+                return
+            if victim != user_id:
+                self._evict(victim, self._users.pop(victim))
+                self._counters["evicted_users"] += 1
+        if self._resident > target:
+            # Only the writer is left: fall back to trimming its own history.
+            self._trim_user(user_id, rows, rows.nbytes - (self._resident - target))
+
+    def _trim_user(self, user_id: str, rows: _UserRows, target: int) -> None:
+        per_row = max(1, rows.nbytes // max(rows.size, 1))
+        count = min(rows.size - 1, max(1, (rows.nbytes - target + per_row - 1) // per_row))
+        if count <= 0:
+            return
+        before = rows.nbytes
+        evicted = rows.drop_oldest(count)
+        self._resident += rows.nbytes - before + evicted.nbytes
+        self._evict(user_id, evicted)
+
+    def _evict(self, user_id: str, rows: _UserRows) -> None:
+        """Account for rows leaving memory and hand them to the spill store, if any."""
+        self._resident -= rows.nbytes
+        self._counters["evicted_rows"] += rows.size
+        if self.spill is None or rows.size == 0:
+            self._counters["dropped_rows"] += rows.size
+            return
+        self.spill.add_many(
+            user_id, rows.contents, rows.vectors.decode(), rows.metadata, created_at=rows.created_at[: rows.size]
+        )
+        self._counters["spilled_rows"] += rows.size
+
+    def ivf_stats(self) -> Dict[str, Any]:
+        indexes = [rows.ivf for rows in self._users.values() if rows.ivf is not None]
+        trained = [ivf for ivf in indexes if ivf.trained]
+        return {
+            "nlist": self.nlist,
+            "nprobe": self.nprobe,
+            "users": len(indexes),
+            "trained_users": len(trained),
+            "retrains": sum(ivf.retrains for ivf in trained),
+        }
+
+    @staticmethod
+    def _fit(vector: np.ndarray, dim: int) -> np.ndarray:
+        return fit_dim(vector, dim)
+
+    @staticmethod
+    def _fit_rows(matrix: np.ndarray, dim: int) -> np.ndarray:
+        if matrix.shape[1] == dim:
+            return matrix
+        if matrix.shape[1] > dim:
+            return matrix[:, :dim]
+        padded = np.zeros((matrix.shape[0], dim), dtype=np.float32)
+        padded[:, : matrix.shape[1]] = matrix
+        return padded
+
+
+__all__ = ["LocalVectorIndex", "fit_dim", "normalize", "now_ms", "top_k_order"]
@@ -0,0 +1,337 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from app.services.memory.hits import SearchHit
+from app.services.memory.local_index import fit_dim, normalize, now_ms, top_k_order
+from app.services.memory.quantization import QuantizedRows, VectorCodec
+
+logger = logging.getLogger(__name__)
+
+INITIAL_ROWS = 1024
+# One fixed-width record per row: where its content lives in the log and when it was written.
+RECORD_DTYPE = np.dtype([("offset", "<i8"), ("length", "<i4"), ("created_at", "<i8")])
+ROW_ID_DTYPE = np.dtype("<i8")
+
+
+class _RowIds:
+    """Growable int64 array of one user's row ids (amortized doubling, like ``_UserRows``).
+
+    ``codes`` is the user's in-memory quantized copy, built on first search when the store
+    uses a compact ``vector_dtype``.
+    """
+
+    __slots__ = ("ids", "size", "codes")
+
+    def __init__(self, ids: np.ndarray) -> None:
+        self.ids = ids
+        self.size = len(ids)
+        self.codes: Optional[QuantizedRows] = None
+
+    def extend(self, new_ids: np.ndarray) -> None:
+        needed = self.size + len(new_ids)
+        if needed > len(self.ids):
+            grown = np.empty(max(needed, 2 * len(self.ids), 16), dtype=ROW_ID_DTYPE)
+            grown[: self.size] = self.ids[: self.size]
+            self.ids = grown
+        self.ids[self.size : needed] = new_ids
+        self.size = needed
+
+    def view(self) -> np.ndarray:
+        return self.ids[: self.size]
+
+
+class PersistentVectorStore:
+    """Disk-backed replacement for ``LocalVectorIndex`` that survives restarts.
+
+    Layout under ``path``:
+
+    - ``meta.json``: the vector dimension.
+    - ``vectors.f32``: float32 rows (L2-normalized), read through ``numpy.memmap``.
+    - ``content.log``: append-only JSON lines with each row's user, content and metadata.
+    - ``records.bin``: one ``RECORD_DTYPE`` entry per row (log offset/length, created_at).
+      A row exists once its record is written, so a crash mid-append leaves no partial row.
+    - ``users/<digest>.i8``: append-only row ids per user.
+
+    Opening only reads ``meta.json`` and maps the files, so startup cost does not grow with
+    the amount of stored memory; a user's row ids are read the first time that user is searched
+    and vectors are paged in by the OS on demand.
+
+    With ``vector_dtype`` ``float16``/``int8`` searches scan a per-user quantized copy held in
+    memory and re-score the best ``top_k * rerank`` candidates from the float32 file
+    (``rerank=0`` returns the quantized scores as-is).
+    """
+
+    def __init__(
+        self,
+        path: str,
+        dim: int = 1536,
+        initial_rows: int = INITIAL_ROWS,
+        vector_dtype: str = "float32",
+        rerank: int = 4,
+    ) -> None:
+        self.codec = VectorCodec(vector_dtype)
+        self.rerank = rerank
+        self.path = Path(path)
+        (self.path / "users").mkdir(parents=True, exist_ok=True)
+        meta_path = self.path / "meta.json"
+        if meta_path.exists():
+            stored_dim = int(json.loads(meta_path.read_text())["dim"])
+            if stored_dim != dim:
+                logger.warning("Local vector store %s keeps its dim %s (configured %s)", path, stored_dim, dim)
+            dim = stored_dim
+        else:
+            meta_path.write_text(json.dumps({"dim": dim}))
+        self.dim = dim
+        self._lock = threading.Lock()
+        self._users: Dict[str, _RowIds] = {}
+
+        records_path = self.path / "records.bin"
+        records_path.touch()
+        self._count = os.path.getsize(records_path) // RECORD_DTYPE.itemsize
+        if os.path.getsize(records_path) != self._count * RECORD_DTYPE.itemsize:
+            os.truncate(records_path, self._count * RECORD_DTYPE.itemsize)  # drop a torn trailing record
+        self._records_file = open(records_path, "ab")
+        self._log_file = open(self.path / "content.log", "ab")
+        self._log_fd = os.open(self.path / "content.log", os.O_RDWR)
+        self._records: np.ndarray = np.empty(0, dtype=RECORD_DTYPE)
+
+        vectors_path = self.path / "vectors.f32"
+        if not vectors_path.exists() or os.path.getsize(vectors_path) == 0:
+            with open(vectors_path, "wb") as handle:
+                handle.truncate(max(initial_rows, 1) * dim * 4)
+        self._vectors = self._map_vectors()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def count(self, user_id: str) -> int:
+        return self._user_rows(user_id).size
+
+    def add(
+        self,
+        user_id: str,
+        content: str,
+        embedding: Sequence[float],
+        metadata: Optional[Dict[str, Any]] = None,
+        created_at: Optional[int] = None,
+    ) -> None:
+        self.add_many(user_id, [content], [embedding], [metadata], created_at)
+
+    def add_many(
+        self,
+        user_id: str,
+        contents: Sequence[str],
+        embeddings: Any,
+        metadata: Optional[Sequence[Optional[Dict[str, Any]]]] = None,
+        created_at: Union[int, Sequence[int], np.ndarray, None] = None,
+    ) -> None:
+        """Append rows; ``created_at`` is one epoch-ms stamp for all rows or one per row."""
+        if not len(contents):
+            return
+        vectors = [np.asarray(vec, dtype=np.float32).ravel() for vec in embeddings]
+        matrix = np.stack([normalize(fit_dim(vec, self.dim)) for vec in vectors])
+        stamp = created_at if created_at is not None else now_ms()
+        stamps = np.broadcast_to(np.asarray(stamp, dtype=np.int64), (len(contents),))
+        metas = metadata or [None] * len(contents)
+        lines = [
+            json.dumps({"user_id": user_id, "content": content, "metadata": meta or {}}, ensure_ascii=False).encode()
+            + b"\n"
+            for content, meta in zip(contents, metas)
+        ]
+        rows = self._user_rows(user_id)
+        with self._lock:
+            start = self._count
+            end = start + len(contents)
+            self._reserve(end)
+            self._vectors[start:end] = matrix
+
+            offset = self._log_file.seek(0, os.SEEK_END)
+            records = np.empty(len(lines), dtype=RECORD_DTYPE)
+            for i, line in enumerate(lines):
+                records[i] = (offset, len(line), stamps[i])
+                offset += len(line)
+            self._log_file.write(b"".join(lines))
+            self._log_file.flush()
+            # Records are the commit point: rows without one are ignored on reopen.
+            self._records_file.write(records.tobytes())
+            self._records_file.flush()
+            new_ids = np.arange(start, end, dtype=ROW_ID_DTYPE)
+            with open(self._user_path(user_id), "ab") as handle:
+                handle.write(new_ids.tobytes())
+            if rows.codes is not None:
+                rows.codes.extend(matrix)  # before the ids, so readers never see ids without codes
+            rows.extend(new_ids)
+            self._count = end
+
+    def search(
+        self,
+        user_id: str,
+        embedding: Sequence[float],
+        top_k: int = 5,
+        since_ms: Optional[int] = None,
+        until_ms: Optional[int] = None,
+    ) -> List[str]:
+        return [hit.content for hit in self.search_hits(user_id, embedding, top_k, since_ms, until_ms)]
+
+    def search_hits(
+        self,
+        user_id: str,
+        embedding: Sequence[float],
+        top_k: int = 5,
+        since_ms: Optional[int] = None,
+        until_ms: Optional[int] = None,
+    ) -> List[SearchHit]:
+        """Same contract as ``LocalVectorIndex.search_hits``; hit ids are global row numbers."""
+        rows = self._user_rows(user_id)
+        ids = rows.view()
+        if ids.size == 0 or top_k <= 0:
+            return []
+        records = self._record_view(int(ids[-1]) + 1)
+        positions: Optional[np.ndarray] = None
+        if since_ms is not None or until_ms is not None:
+            stamps = records["created_at"][ids]
+            mask = np.ones(ids.size, dtype=bool)
+            if since_ms is not None:
+                mask &= stamps >= since_ms
+            if until_ms is not None:
+                mask &= stamps <= until_ms
+            positions = np.flatnonzero(mask)
+            ids = ids[positions]
+        k = min(top_k, ids.size)
+        if k == 0:
+            return []
+        query = normalize(fit_dim(np.asarray(embedding, dtype=np.float32).ravel(), self.dim))
+        if not query.any():
+            return [self._hit(records, int(row), 0.0) for row in ids[-k:]]
+
+        if self.codec.exact:
+            scores = self._user_matrix(ids) @ query
+            return [self._hit(records, int(ids[i]), float(scores[i])) for i in top_k_order(scores, k)]
+
+        scores = self._user_codes(rows).scores(query, positions)[: ids.size]
+        if self.rerank <= 0:
+            return [self._hit(records, int(ids[i]), float(scores[i])) for i in top_k_order(scores, k)]
+        # Re-score the quantized shortlist against the exact float32 rows on disk.
+        shortlist = top_k_order(scores, min(ids.size, k * self.rerank))
+        exact = self._vectors[ids[shortlist]] @ query
+        return [self._hit(records, int(ids[shortlist[i]]), float(exact[i])) for i in top_k_order(exact, k)]
+
+    def documents(self, user_id: str, limit: int = 0) -> List[Tuple[str, int]]:
+        """The user's newest ``limit`` rows (0 = all) as ``(content, created_at)``, oldest first."""
+        ids = self._user_rows(user_id).view()
+        if limit:
+            ids = ids[-limit:]
+        if ids.size == 0:
+            return []
+        records = self._record_view(int(ids[-1]) + 1)
+        docs = []
+        for row in ids:
+            offset, length, created_at = records[int(row)]
+            payload = json.loads(os.pread(self._log_fd, int(length), int(offset)).decode("utf-8"))
+            docs.append((payload["content"], int(created_at)))
+        return docs
+
+    def drop_user(self, user_id: str) -> None:
+        """Forget a user: their content bytes and vectors are blanked in place, then the id file is removed.
+
+        The log is append-only, so space is not reclaimed; the erased rows simply stop existing.
+        """
+        rows = self._user_rows(user_id)
+        with self._lock:
+            ids = rows.view()
+            if ids.size:
+                records = self._record_view(int(ids[-1]) + 1)
+                for row in ids:
+                    offset, length, _ = records[int(row)]
+                    os.pwrite(self._log_fd, b" " * (int(length) - 1) + b"\n", int(offset))
+                self._vectors[ids] = 0.0
+            self._users.pop(user_id, None)
+            try:
+                os.remove(self._user_path(user_id))
+            except FileNotFoundError:
+                pass
+
+    def flush(self) -> None:
+        with self._lock:
+            self._vectors.flush()
+            for handle in (self._log_file, self._records_file):
+                handle.flush()
+                os.fsync(handle.fileno())
+
+    def close(self) -> None:
+        self.flush()
+        with self._lock:
+            self._log_file.close()
+            self._records_file.close()
+            os.close(self._log_fd)
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes of quantized vectors held in memory (the float32 file is served by the page cache)."""
+        return sum(rows.codes.nbytes for rows in list(self._users.values()) if rows.codes is not None)
+
+    def _user_codes(self, rows: _RowIds) -> QuantizedRows:
+        if rows.codes is None:
+            with self._lock:
+                if rows.codes is None:
+                    ids = rows.view()
+                    codes = QuantizedRows(self.dim, self.codec, capacity=max(ids.size, 16))
+                    codes.extend(self._user_matrix(ids))
+                    rows.codes = codes
+        return rows.codes
+
+    def _user_matrix(self, ids: np.ndarray) -> np.ndarray:
+        if int(ids[-1]) - int(ids[0]) + 1 == ids.size:
+            # Rows written together are contiguous: score them straight from the mapped pages.
+            return self._vectors[int(ids[0]) : int(ids[-1]) + 1]
+        return self._vectors[ids]
+
+    def _hit(self, records: np.ndarray, row: int, score: float) -> SearchHit:
+        offset, length, created_at = records[row]
+        payload = json.loads(os.pread(self._log_fd, int(length), int(offset)).decode("utf-8"))
+        return SearchHit(
+            id=row, score=score, content=payload["content"], created_at=int(created_at), vector=np.array(self._vectors[row])
+        )
+
+    def _user_rows(self, user_id: str) -> _RowIds:
+        rows = self._users.get(user_id)
+        if rows is None:
+            path = self._user_path(user_id)
+            ids = np.fromfile(path, dtype=ROW_ID_DTYPE) if path.exists() else np.empty(0, dtype=ROW_ID_DTYPE)
+            # Ignore ids past the committed record count (torn write before a crash).
+            rows = self._users.setdefault(user_id, _RowIds(ids[ids < self._count].copy()))
+        return rows
+
+    def _user_path(self, user_id: str) -> Path:
+        digest = hashlib.blake2b(user_id.encode("utf-8"), digest_size=16).hexdigest()
+        return self.path / "users" / f"{digest}.i8"
+
+    def _record_view(self, needed: int) -> np.ndarray:
+        if len(self._records) < needed:
+            self._records = np.memmap(self.path / "records.bin", dtype=RECORD_DTYPE, mode="r", shape=(self._count,))
+        return self._records
+
+    def _map_vectors(self) -> np.ndarray:
+        rows = os.path.getsize(self.path / "vectors.f32") // (self.dim * 4)
+        return np.memmap(self.path / "vectors.f32", dtype=np.float32, mode="r+", shape=(rows, self.dim))
+
+    def _reserve(self, needed: int) -> None:
+        capacity = self._vectors.shape[0]
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        self._vectors.flush()
+        with open(self.path / "vectors.f32", "r+b") as handle:
+            handle.truncate(capacity * self.dim * 4)
+        self._vectors = self._map_vectors()
+
+
+__all__ = ["PersistentVectorStore"]
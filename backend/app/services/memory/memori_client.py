@@ -4,6 +4,8 @@ from typing import Any, Dict, Optional
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 
+from app.services.memory.cache import TTLCache
+
 try:  # pragma: no cover - import guarded for environments without SDK
     from memori import Memori
 except ImportError:  # pragma: no cover
@@ -14,6 +16,8 @@ logger = logging.getLogger(__name__)
 
 FALLBACK_PROFILE = "No profile stored yet."
 FALLBACK_FACTS = "No recent facts."
+PROFILE_QUERY = "basic profile and long-term preferences"
+FACTS_QUERY = "recent important events"
 
 
 class MemoriClient:
@@ -26,6 +30,9 @@ class MemoriClient:
         endpoint: str,
         storage_url: Optional[str] = None,
         openai_api_key: Optional[str] = None,
+        cache_size: int = 1024,
+        cache_ttl: float = 60.0,
+        cache_stale_ttl: float = 300.0,
     ) -> None:
         self.project_id = project_id
         self.api_key = api_key
@@ -33,6 +40,8 @@ class MemoriClient:
         self.storage_url = storage_url
         self.openai_api_key = openai_api_key
         self._client = self._build_client()
+        # Profile/facts only change on save_note, so cache them per (user_id, kind) and invalidate on writes.
+        self._cache = TTLCache(maxsize=cache_size, ttl=cache_ttl, stale_ttl=cache_stale_ttl)
 
     def _build_client(self) -> Optional["Memori"]:
         if Memori is None:
@@ -85,14 +94,15 @@ class MemoriClient:
             self._client.save(user_id, content, metadata=metadata or {})
         except Exception as exc:  # pragma: no cover - network/SDK failure
             logger.warning("Memori save_note failed: %s", exc)
+        finally:
+            self._invalidate(user_id)
 
     def query_profile(self, user_id: str) -> str:
         logger.debug("Memori query_profile user=%s", user_id)
         if not self._client:
             return FALLBACK_PROFILE
         try:
-            result = self._client.query(user_id, "basic profile and long-term preferences")
-            return self._stringify(result, fallback=FALLBACK_PROFILE)
+            return self._cached_query(user_id, "profile", PROFILE_QUERY, FALLBACK_PROFILE)
         except Exception as exc:  # pragma: no cover
             logger.warning("Memori query_profile failed: %s", exc)
             return FALLBACK_PROFILE
@@ -102,8 +112,7 @@ class MemoriClient:
         if not self._client:
             return FALLBACK_FACTS
         try:
-            result = self._client.query(user_id, "recent important events")
-            return self._stringify(result, fallback=FALLBACK_FACTS)
+            return self._cached_query(user_id, "facts", FACTS_QUERY, FALLBACK_FACTS)
         except Exception as exc:  # pragma: no cover
             logger.warning("Memori query_recent_facts failed: %s", exc)
             return FALLBACK_FACTS
@@ -117,6 +126,26 @@ class MemoriClient:
                 self._client.reset(user_id)
         except Exception as exc:  # pragma: no cover
             logger.warning("Memori reset_user failed: %s", exc)
+        finally:
+            self._invalidate(user_id)
+
+    def cache_stats(self) -> Dict[str, int]:
+        return self._cache.stats()
+
+    def close(self) -> None:
+        self._cache.close()
+
+    def _cached_query(self, user_id: str, kind: str, prompt: str, fallback: str) -> str:
+        client = self._client
+
+        def _load() -> str:
+            # Exceptions propagate so failed lookups are never cached.
+            return self._stringify(client.query(user_id, prompt), fallback=fallback)
+
+        return self._cache.get_or_load((user_id, kind), _load)
+
+    def _invalidate(self, user_id: str) -> None:
+        self._cache.invalidate((user_id, "profile"), (user_id, "facts"))
 
     @staticmethod
     def _stringify(result: Any, fallback: str) -> str:
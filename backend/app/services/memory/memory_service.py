@@ -1,13 +1,29 @@
+import asyncio
 import logging
-from dataclasses import dataclass
-from typing import Any, Callable, Dict, List, Optional
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from functools import partial
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, TypeVar
 
+from app.services.memory.dedup import RecentWrite, WriteDeduplicator
+from app.services.memory.embedders import HashingEmbedder, embed_many
+from app.services.memory.hits import SearchHit, fuse_hits, select_hits
+from app.services.memory.lexical import BM25Index
 from app.services.memory.memori_client import MemoriClient
+from app.services.memory.micro_batch import MicroBatchEmbedder
 from app.services.memory.milvus_client import MilvusClient
+from app.services.memory.rerank import mmr_rerank
+from app.utils.time import to_epoch_ms, utc_now
 
 logger = logging.getLogger(__name__)
 
 Embedder = Callable[[str], List[float]]
+MessageItem = Tuple[str, Optional[Dict[str, Any]]]
+T = TypeVar("T")
 
 
 @dataclass
@@ -15,17 +31,15 @@ class MemoryContext:
     memori_context: str
     milvus_chunks: List[str]
     stats: Dict[str, Any]
+    hits: List[SearchHit] = field(default_factory=list)
+    # Raw Memori parts of ``memori_context``: the profile changes slowly, recent facts every few turns.
+    memori_profile: str = ""
+    memori_facts: str = ""
 
 
-def build_default_embedder(model_name: str) -> Embedder:
-    """Simple deterministic embedder placeholder."""
-
-    def _embed(text: str) -> List[float]:
-        tokens = text.split()
-        return [float((hash(tok) % 1000) / 1000.0) for tok in tokens][:64] or [0.0]
-
-    _embed.__name__ = f"placeholder_embedder_{model_name}"
-    return _embed
+def build_default_embedder(model_name: str, dim: int = 1536) -> Embedder:
+    """Offline feature-hashing embedder sized to match the Milvus collection."""
+    return HashingEmbedder(dim=dim, name=f"hashing_embedder_{model_name}")
 
 
 class MemoryService:
@@ -36,10 +50,67 @@ class MemoryService:
         memori_client: MemoriClient,
         milvus_client: MilvusClient,
         embedder: Optional[Embedder] = None,
+        max_workers: int = 8,
+        concurrent_retrieval: bool = True,
+        embed_batch_window_ms: float = 0.0,
+        embed_batch_max: int = 64,
+        top_k: int = 5,
+        recent_window: Optional[timedelta] = None,
+        recent_min_score: float = 0.35,
+        min_score: Optional[float] = None,
+        relative_score: float = 0.0,
+        dedup_mode: str = "off",
+        dedup_window: int = 32,
+        dedup_max_hamming: int = 3,
+        dedup_cosine: float = 0.995,
+        hybrid_search: bool = False,
+        bm25_max_docs: int = 0,
+        bm25_max_users: int = 0,
+        rrf_k: int = 60,
+        mmr_lambda: float = 1.0,
+        mmr_fetch: int = 4,
     ) -> None:
         self.memori = memori_client
         self.milvus = milvus_client
         self.embed = embedder or build_default_embedder("default")
+        # Memori SDK and pymilvus are blocking; async callers offload to this bounded pool.
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="memory-io")
+        self.concurrent_retrieval = concurrent_retrieval
+        self.top_k = top_k
+        # Two-tier retrieval: search the recent window first, widen to full history only on weak hits.
+        self.recent_window = recent_window
+        self.recent_min_score = recent_min_score
+        # Relevance floors applied after search so weak matches never reach the prompt.
+        self.min_score = min_score
+        self.relative_score = relative_score
+        # MMR diversity re-ranking over ``top_k * mmr_fetch`` candidates; lambda 1.0 = relevance only.
+        self.mmr_lambda = mmr_lambda
+        self.mmr_fetch = max(1, mmr_fetch)
+        # Write-time suppression of repeats against each user's recent messages.
+        self.dedup: Optional[WriteDeduplicator] = None
+        if dedup_mode != "off":
+            self.dedup = WriteDeduplicator(
+                dedup_mode, window=dedup_window, max_hamming=dedup_max_hamming, cosine_threshold=dedup_cosine
+            )
+        # Hybrid retrieval: an in-process BM25 index over written messages, fused with vector hits.
+        # Each user's postings are rebuilt from the vector store on their first lexical search in
+        # this process, so restarts and other workers see the full history. Loaded users are kept
+        # in LRU order and the least recently searched are evicted past ``bm25_max_users``.
+        self.lexical: Optional[BM25Index] = BM25Index(max_docs_per_user=bm25_max_docs) if hybrid_search else None
+        self.bm25_max_docs = bm25_max_docs
+        self.bm25_max_users = bm25_max_users
+        self._lexical_users: "OrderedDict[str, None]" = OrderedDict()
+        # In-flight rebuilds (single flight per user) and the writes that arrived during them.
+        self._lexical_loads: Dict[str, Future] = {}
+        self._lexical_backlog: Dict[str, List[str]] = {}
+        self._lexical_lock = threading.Lock()
+        self.rrf_k = rrf_k
+        # Optional coalescing of concurrent async embed calls into one batched request.
+        self.batcher: Optional[MicroBatchEmbedder] = None
+        if embed_batch_window_ms > 0:
+            self.batcher = MicroBatchEmbedder(
+                self.embed, window_ms=embed_batch_window_ms, max_batch=embed_batch_max, executor=self._executor
+            )
         try:
             self.milvus.connect()
         except Exception as exc:  # pragma: no cover - connection best effort
@@ -47,37 +118,373 @@ class MemoryService:
 
     def record_user_message(
         self, user_id: str, content: str, metadata: Optional[Dict[str, Any]] = None
-    ) -> None:
+    ) -> bool:
+        """Store one message; returns ``False`` when it was suppressed as a repeat."""
         logger.debug("Recording message for user=%s", user_id)
+        if self._is_duplicate(user_id, content):
+            return False
+        return self._store_message(user_id, content, metadata, self.embed(content))
+
+    def _store_message(
+        self, user_id: str, content: str, metadata: Optional[Dict[str, Any]], embedding: List[float]
+    ) -> bool:
+        if self._is_duplicate(user_id, content, embedding):
+            return False
         self.memori.save_note(user_id=user_id, content=content, metadata=metadata)
-        embedding = self.embed(content)
         self.milvus.upsert(user_id=user_id, content=content, embedding=embedding, metadata=metadata)
+        self._index_lexical(user_id, [content])
+        if self.dedup is not None:
+            # Recorded only once stored, so a failed write does not suppress its retry.
+            self.dedup.remember(user_id, [self.dedup.entry(content, embedding)])
+        return True
 
-    def retrieve_context(self, user_id: str, query: str) -> MemoryContext:
-        memori_profile = self.memori.query_profile(user_id)
-        memori_facts = self.memori.query_recent_facts(user_id)
-        memori_block = f"Profile:\n{memori_profile}\n\nRecent facts:\n{memori_facts}"
+    def _is_duplicate(
+        self,
+        user_id: str,
+        content: str,
+        embedding: Optional[Sequence[float]] = None,
+        pending: Sequence[RecentWrite] = (),
+    ) -> bool:
+        """Exact check before embedding, or the full near-duplicate check after."""
+        if self.dedup is None:
+            return False
+        match = self.dedup.check(user_id, content, embedding, pending)
+        if match is None:
+            return False
+        original = match.original
+        logger.debug("Suppressed %s duplicate for user=%s (repeats=%s)", match.reason, user_id, original.repeats)
+        if self.dedup.mode == "merge" and not any(original is write for write in pending):
+            self.milvus.refresh(
+                user_id, original.content, {"repeats": original.repeats, "last_seen": original.last_seen}
+            )
+        return True
+
+    def record_user_messages(self, user_id: str, items: Sequence[MessageItem]) -> int:
+        """Bulk import: one batched embedding call and one column-wise Milvus write.
+
+        Returns the number of messages stored (repeats suppressed by dedup are not counted).
+        """
+        if self.dedup is not None:
+            items = [item for item in items if not self._is_duplicate(user_id, item[0])]
+        if not items:
+            return 0
+        logger.debug("Recording %s messages for user=%s", len(items), user_id)
+        embeddings = embed_many(self.embed, [content for content, _ in items])
+        writes: List[RecentWrite] = []
+        if self.dedup is not None:
+            # Repeats within the batch are matched against its earlier, not yet stored, messages.
+            kept = []
+            for i, (content, _) in enumerate(items):
+                if not self._is_duplicate(user_id, content, embeddings[i], writes):
+                    kept.append(i)
+                    writes.append(self.dedup.entry(content, embeddings[i]))
+            items, embeddings = [items[i] for i in kept], embeddings[kept]
+            if not items:
+                return 0
+        contents = [content for content, _ in items]
+        metadata = [meta for _, meta in items]
+        if self.dedup is not None and self.dedup.mode == "merge":
+            # Repeats folded into a message of this batch are stamped on it directly.
+            metadata = [
+                {**(meta or {}), "repeats": write.repeats, "last_seen": write.last_seen} if write.repeats > 1 else meta
+                for meta, write in zip(metadata, writes)
+            ]
+        # Memori has no bulk write endpoint, so notes are still saved one by one.
+        for content, meta in items:
+            self.memori.save_note(user_id=user_id, content=content, metadata=meta)
+        self.milvus.upsert_many(user_id=user_id, contents=contents, embeddings=embeddings, metadata=metadata)
+        self._index_lexical(user_id, contents)
+        if self.dedup is not None:
+            self.dedup.remember(user_id, writes)
+        return len(items)
+
+    def retrieve_context(
+        self,
+        user_id: str,
+        query: str,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        top_k: Optional[int] = None,
+        min_score: Optional[float] = None,
+    ) -> MemoryContext:
+        """``top_k`` caps the hits; ``min_score`` overrides the service-wide relevance floor."""
+        started = time.perf_counter()
+        timings: Dict[str, float] = {}
+        k = top_k or self.top_k
+        memori_profile = self._timed(timings, "memori_profile", self.memori.query_profile, user_id)
+        memori_facts = self._timed(timings, "memori_facts", self.memori.query_recent_facts, user_id)
+        text = query or memori_facts or ""
+        candidates, tier = self._timed(timings, "milvus", self._search_similar, user_id, text, since, until, k)
+        lexical: List[SearchHit] = []
+        if self.lexical is not None:
+            lexical = self._timed(timings, "bm25", self._lexical_search, user_id, text, since, until, k)
+        return self._build_context(
+            memori_profile, memori_facts, candidates, lexical, tier, k, min_score, timings, started, "sequential"
+        )
+
+    def _index_lexical(self, user_id: str, contents: Sequence[str]) -> None:
+        """Add stored messages to BM25; users not loaded yet pick them up from the store instead."""
+        if self.lexical is None:
+            return
+        with self._lexical_lock:
+            if user_id in self._lexical_users:
+                self.lexical.add_many(user_id, contents)
+            elif user_id in self._lexical_loads:
+                self._lexical_backlog[user_id].extend(contents)
+
+    def _ensure_lexical_user(self, user_id: str) -> None:
+        """Load the user's postings from the store once; the query runs outside the shared lock."""
+        if self.lexical is None:
+            return
+        with self._lexical_lock:
+            if user_id in self._lexical_users:
+                self._lexical_users.move_to_end(user_id)
+                return
+            load = self._lexical_loads.get(user_id)
+            if load is None:
+                load = self._lexical_loads[user_id] = Future()
+                self._lexical_backlog[user_id] = []
+                leader = True
+            else:
+                leader = False
+        if not leader:
+            load.result()
+            return
+        try:
+            docs = self.milvus.user_documents(user_id, limit=self.bm25_max_docs)
+        except BaseException as exc:
+            with self._lexical_lock:
+                if self._lexical_loads.get(user_id) is load:
+                    del self._lexical_loads[user_id]
+                    del self._lexical_backlog[user_id]
+            load.set_exception(exc)
+            raise
+        with self._lexical_lock:
+            # A reset during the query already installed an empty index; keep that one.
+            if self._lexical_loads.get(user_id) is load:
+                del self._lexical_loads[user_id]
+                loaded = {content for content, _ in docs}
+                backlog = [content for content in self._lexical_backlog.pop(user_id) if content not in loaded]
+                self.lexical.replace_user(user_id, docs)
+                if backlog:
+                    self.lexical.add_many(user_id, backlog)
+                self._mark_lexical_loaded(user_id)
+        load.set_result(None)
+        logger.debug("Loaded %s messages into BM25 for user=%s", len(docs), user_id)
+
+    def _mark_lexical_loaded(self, user_id: str) -> None:
+        """Record ``user_id`` as most recently used and evict past the user cap (lock held)."""
+        self._lexical_users[user_id] = None
+        self._lexical_users.move_to_end(user_id)
+        while self.bm25_max_users and len(self._lexical_users) > self.bm25_max_users:
+            evicted, _ = self._lexical_users.popitem(last=False)
+            self.lexical.drop_user(evicted)
+
+    def _lexical_search(
+        self, user_id: str, text: str, since: Optional[datetime], until: Optional[datetime], top_k: int
+    ) -> List[SearchHit]:
+        if self.lexical is None:
+            return []
+        self._ensure_lexical_user(user_id)
+        since_ms = to_epoch_ms(since) if since is not None else None
+        until_ms = to_epoch_ms(until) if until is not None else None
+        return self.lexical.search(user_id, text, top_k=top_k, since_ms=since_ms, until_ms=until_ms)
+
+    def _search_similar(
+        self,
+        user_id: str,
+        text: str,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        top_k: Optional[int] = None,
+    ) -> Tuple[List[SearchHit], str]:
+        return self._tiered_search(user_id, self.embed(text), since, until, top_k or self.top_k)
+
+    def _tiered_search(
+        self,
+        user_id: str,
+        embedding: List[float],
+        since: Optional[datetime],
+        until: Optional[datetime],
+        top_k: int,
+    ) -> Tuple[List[SearchHit], str]:
+        """Return hits plus the tier that produced them (``bounded`` | ``recent`` | ``full``).
 
-        embedding = self.embed(query or memori_facts or "")
-        milvus_hits = self.milvus.search(user_id=user_id, embedding=embedding)
+        With MMR enabled, ``top_k * mmr_fetch`` candidates (with their vectors) are fetched.
+        """
+        diverse = self.mmr_lambda < 1.0
+        fetch = top_k * self.mmr_fetch if diverse else top_k
+        search = partial(self.milvus.search_hits, user_id, embedding, top_k=fetch, with_vectors=diverse)
+        if since is not None or until is not None:
+            return search(since=since, until=until), "bounded"
+        if self.recent_window:
+            # Floored to the minute so concurrent recent-tier searches share one filter (and batch).
+            recent = search(since=(utc_now() - self.recent_window).replace(second=0, microsecond=0))
+            # The best recent hit decides: a user with few recent rows, or one weak hit among strong
+            # ones, still gets a single search.
+            if recent and max(hit.score for hit in recent) >= self.recent_min_score:
+                return recent, "recent"
+        return search(), "full"
+
+    def _build_context(
+        self,
+        memori_profile: str,
+        memori_facts: str,
+        candidates: List[SearchHit],
+        lexical: List[SearchHit],
+        tier: str,
+        top_k: int,
+        min_score: Optional[float],
+        timings: Dict[str, float],
+        started: float,
+        mode: str,
+    ) -> MemoryContext:
+        memori_block = f"Profile:\n{memori_profile}\n\nRecent facts:\n{memori_facts}"
+        floor = self.min_score if min_score is None else min_score
+        diverse = self.mmr_lambda < 1.0
+        hits = select_hits(
+            candidates, len(candidates) if diverse else top_k, min_score=floor, relative_score=self.relative_score
+        )
+        if diverse:
+            hits = mmr_rerank(hits, top_k, self.mmr_lambda)
+        # BM25 scores are unbounded, so lexical hits only get the relative floor before fusion.
+        lexical = select_hits(lexical, top_k, relative_score=self.relative_score)
+        vector_scores = [round(hit.score, 4) for hit in hits]
+        if lexical:
+            hits = fuse_hits([hits, lexical], top_k, k=self.rrf_k)
+        timings["total"] = (time.perf_counter() - started) * 1000.0
         stats = {
             "memori": bool(memori_profile or memori_facts),
-            "milvus_hits": len(milvus_hits),
+            "milvus_hits": len(hits),
+            "milvus_candidates": len(candidates),
+            "lexical_hits": len(lexical),
+            "milvus_scores": vector_scores,  # cosine, before fusion
+            "bm25_scores": [round(hit.score, 4) for hit in lexical],
+            "fused_scores": [round(hit.score, 4) for hit in hits] if lexical else [],  # RRF
             "embedder": getattr(self.embed, "__name__", "unknown"),
+            "retrieval": mode,
+            "milvus_tier": tier,
+            "mmr": diverse,
+            "timings_ms": {name: round(value, 3) for name, value in timings.items()},
         }
         return MemoryContext(
             memori_context=memori_block,
-            milvus_chunks=milvus_hits,
+            milvus_chunks=[hit.content for hit in hits],
             stats=stats,
+            hits=hits,
+            memori_profile=memori_profile,
+            memori_facts=memori_facts,
         )
 
+    @staticmethod
+    def _timed(timings: Dict[str, float], name: str, fn: Callable[..., T], *args: Any) -> T:
+        started = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            timings[name] = (time.perf_counter() - started) * 1000.0
+
     def reset_user(self, user_id: str) -> None:
         self.memori.reset_user(user_id)
         self.milvus.drop_user(user_id)
+        if self.lexical is not None:
+            with self._lexical_lock:
+                self.lexical.drop_user(user_id)
+                self._lexical_loads.pop(user_id, None)
+                self._lexical_backlog.pop(user_id, None)
+                self._mark_lexical_loaded(user_id)  # the store is empty now, nothing to load
+        if self.dedup is not None:
+            self.dedup.forget(user_id)
+
+    async def arecord_user_message(
+        self, user_id: str, content: str, metadata: Optional[Dict[str, Any]] = None
+    ) -> bool:
+        if self.batcher is None:
+            return await self._offload(self.record_user_message, user_id, content, metadata)
+        if self._is_duplicate(user_id, content):
+            return False
+        embedding = await self.batcher.embed(content)
+        return await self._offload(self._store_message, user_id, content, metadata, embedding)
+
+    async def arecord_user_messages(self, user_id: str, items: Sequence[MessageItem]) -> int:
+        return await self._offload(self.record_user_messages, user_id, items)
+
+    async def aretrieve_context(
+        self,
+        user_id: str,
+        query: str,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        top_k: Optional[int] = None,
+        min_score: Optional[float] = None,
+    ) -> MemoryContext:
+        if not (self.concurrent_retrieval and query):
+            # Without a query the vector search is seeded from Memori facts, so it must wait for them.
+            return await self._offload(self.retrieve_context, user_id, query, since, until, top_k, min_score)
+
+        started = time.perf_counter()
+        timings: Dict[str, float] = {}
+        k = top_k or self.top_k
+        lookups = [
+            self._offload(self._timed, timings, "memori_profile", self.memori.query_profile, user_id),
+            self._offload(self._timed, timings, "memori_facts", self.memori.query_recent_facts, user_id),
+            self._asearch_similar(user_id, query, timings, since, until, k),
+        ]
+        if self.lexical is not None:
+            lookups.append(
+                self._offload(self._timed, timings, "bm25", self._lexical_search, user_id, query, since, until, k)
+            )
+        memori_profile, memori_facts, (candidates, tier), *rest = await asyncio.gather(*lookups)
+        lexical: List[SearchHit] = rest[0] if rest else []
+        return self._build_context(
+            memori_profile, memori_facts, candidates, lexical, tier, k, min_score, timings, started, "concurrent"
+        )
+
+    async def _asearch_similar(
+        self,
+        user_id: str,
+        text: str,
+        timings: Dict[str, float],
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        top_k: Optional[int] = None,
+    ) -> Tuple[List[SearchHit], str]:
+        started = time.perf_counter()
+        try:
+            if self.batcher is None:
+                return await self._offload(self._search_similar, user_id, text, since, until, top_k)
+            embedding = await self.batcher.embed(text)
+            return await self._offload(self._tiered_search, user_id, embedding, since, until, top_k or self.top_k)
+        finally:
+            timings["milvus"] = (time.perf_counter() - started) * 1000.0
+
+    async def areset_user(self, user_id: str) -> None:
+        await self._offload(self.reset_user, user_id)
+
+    async def _offload(self, fn: Callable[..., T], *args: Any) -> T:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, partial(fn, *args))
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
 
     def health_check(self) -> Dict[str, Any]:
-        return {
+        result: Dict[str, Any] = {
             "memori": True,  # would call a ping endpoint in a real client
+            "memori_cache": self.memori.cache_stats(),
             "milvus": self.milvus.ping(),
+            "milvus_search_batching": self.milvus.search_stats(),
+            "milvus_pool": self.milvus.pool_stats(),
+            "local_store": self.milvus.local_index_stats(),
             "embedder": getattr(self.embed, "__name__", "unknown"),
         }
+        embed_stats = getattr(self.embed, "stats", None)
+        if callable(embed_stats):
+            result["embedding_cache"] = embed_stats()
+        if self.batcher is not None:
+            result["embedding_batcher"] = self.batcher.stats()
+        if self.lexical is not None:
+            result["bm25_index"] = self.lexical.stats()
+        if self.dedup is not None:
+            result["write_dedup"] = self.dedup.stats()
+        return result
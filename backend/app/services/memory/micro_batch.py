@@ -0,0 +1,118 @@
+import asyncio
+import logging
+import time
+from concurrent.futures import Executor
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from app.services.memory.embedders import embed_many
+
+logger = logging.getLogger(__name__)
+
+_Pending = Tuple[str, "asyncio.Future[List[float]]", float]
+
+
+def _size_bucket(size: int) -> str:
+    bucket = 1
+    while bucket < size:
+        bucket *= 2
+    return f"<={bucket}"
+
+
+class MicroBatchEmbedder:
+    """Coalesce concurrent async embed calls into one batched ``embed_many`` call.
+
+    Calls arriving within ``window_ms`` of the first queued one (or until ``max_batch``
+    texts are waiting) share a single embedding request; each caller gets its own row.
+    """
+
+    def __init__(
+        self,
+        embedder: Callable[[str], List[float]],
+        window_ms: float = 3.0,
+        max_batch: int = 64,
+        executor: Optional[Executor] = None,
+    ) -> None:
+        self.embedder = embedder
+        self.window = max(0.0, window_ms) / 1000.0
+        self.max_batch = max(1, max_batch)
+        self._executor = executor
+        self._pending: List[_Pending] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._tasks: Set["asyncio.Task[None]"] = set()
+        self._counters: Dict[str, Any] = {
+            "batches": 0,
+            "items": 0,
+            "errors": 0,
+            "queue_wait_ms_total": 0.0,
+            "queue_wait_ms_max": 0.0,
+        }
+        self._batch_sizes: Dict[str, int] = {}
+
+    async def embed(self, text: str) -> List[float]:
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # State is loop-bound; a new loop (e.g. a fresh test client) starts with an empty queue.
+            self._loop = loop
+            self._pending = []
+            self._timer = None
+        future: "asyncio.Future[List[float]]" = loop.create_future()
+        self._pending.append((text, future, time.perf_counter()))
+        if len(self._pending) >= self.max_batch:
+            self._dispatch()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._dispatch)
+        return await future
+
+    def stats(self) -> Dict[str, Any]:
+        batches = self._counters["batches"]
+        return {
+            "batches": batches,
+            "items": self._counters["items"],
+            "errors": self._counters["errors"],
+            "avg_batch_size": round(self._counters["items"] / batches, 3) if batches else 0.0,
+            "batch_sizes": dict(self._batch_sizes),
+            "queue_wait_ms_avg": round(self._counters["queue_wait_ms_total"] / self._counters["items"], 3)
+            if self._counters["items"]
+            else 0.0,
+            "queue_wait_ms_max": round(self._counters["queue_wait_ms_max"], 3),
+        }
+
+    def _dispatch(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch and self._loop is not None:
+            task = self._loop.create_task(self._run(batch))
+            # Keep a strong reference until the batch completes.
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: List[_Pending]) -> None:
+        started = time.perf_counter()
+        waits = [(started - queued_at) * 1000.0 for _, _, queued_at in batch]
+        self._counters["batches"] += 1
+        self._counters["items"] += len(batch)
+        self._counters["queue_wait_ms_total"] += sum(waits)
+        self._counters["queue_wait_ms_max"] = max(self._counters["queue_wait_ms_max"], max(waits))
+        bucket = _size_bucket(len(batch))
+        self._batch_sizes[bucket] = self._batch_sizes.get(bucket, 0) + 1
+
+        texts = [text for text, _, _ in batch]
+        loop = asyncio.get_running_loop()
+        try:
+            matrix = await loop.run_in_executor(self._executor, embed_many, self.embedder, texts)
+        except Exception as exc:
+            self._counters["errors"] += 1
+            logger.warning("Batched embedding of %s texts failed: %s", len(texts), exc)
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+        for row, (_, future, _) in enumerate(batch):
+            if not future.done():
+                future.set_result(matrix[row].tolist())
+
+
+__all__ = ["MicroBatchEmbedder"]
@@ -1,8 +1,24 @@
 import logging
-from typing import Any, Dict, List, Optional, Sequence, Tuple
+import threading
+from datetime import datetime
+from typing import Any, Callable, Dict, Hashable, List, Optional, Sequence, Tuple, TypeVar, Union
+
+from app.services.memory.hits import SearchHit
+from app.services.memory.local_index import LocalVectorIndex, now_ms
+from app.services.memory.local_store import PersistentVectorStore
+from app.services.memory.milvus_pool import MilvusConnectionPool, is_connection_error
+from app.services.memory.search_batch import SearchCoalescer
+from app.utils.time import to_epoch_ms
 
 logger = logging.getLogger(__name__)
 
+# Buffered row layout; insert columns are picked from it by field name so legacy collections keep working.
+ROW_FIELDS = ("user_id", "content", "created_at", "metadata", "vector")
+Row = Tuple[str, str, int, Dict[str, Any], List[float]]
+MAX_QUERY_ROWS = 16384  # Milvus' limit on offset + limit for one query
+MAX_CONTENT_BYTES = 2048  # VARCHAR max_length of the content field
+T = TypeVar("T")
+
 try:
     from pymilvus import Collection, CollectionSchema, FieldSchema, DataType, MilvusException, connections
 except Exception:  # pragma: no cover - optional dependency
@@ -26,6 +42,24 @@ class MilvusClient:
         database: str,
         collection: str,
         use_tls: bool = False,
+        dim: int = 1536,
+        num_partitions: int = 64,
+        insert_batch_size: int = 256,
+        flush_interval: float = 1.0,
+        max_pending: int = 8192,
+        search_batch_window_ms: float = 0.0,
+        search_batch_max: int = 32,
+        pool_size: int = 4,
+        nlist: int = 1024,
+        nprobe: int = 10,
+        local_store_path: str = "",
+        local_nlist: int = 0,
+        local_nprobe: int = 8,
+        local_vector_dtype: str = "float32",
+        local_rerank: int = 4,
+        local_max_bytes: int = 0,
+        local_max_user_bytes: int = 0,
+        local_spill_path: str = "",
     ) -> None:
         self.host = host
         self.port = port
@@ -34,24 +68,69 @@ class MilvusClient:
         self.database = database
         self.collection = collection
         self.use_tls = use_tls
+        self.dim = dim
+        self.num_partitions = num_partitions
         self._collection_handle: Optional[Any] = None
-        self._local_store: List[Tuple[str, str, Dict[str, Any], List[float]]] = []
+        self._pool: Optional[MilvusConnectionPool] = None
+        self.pool_size = pool_size
+        self.nlist = nlist
+        # Built once instead of per query; schema-derived fields are cached on first use.
+        self.search_params: Dict[str, Any] = {"metric_type": "IP", "params": {"nprobe": nprobe}}
+        self._schema_dim: Optional[int] = None
+        self._schema_fields: Optional[List[str]] = None
+        self._loaded = False
+        # Fallback store when Milvus is unavailable; a path makes it persistent across restarts.
+        self._local_store: Union[LocalVectorIndex, PersistentVectorStore] = (
+            PersistentVectorStore(local_store_path, dim=dim, vector_dtype=local_vector_dtype, rerank=local_rerank)
+            if local_store_path
+            else LocalVectorIndex(
+                nlist=local_nlist,
+                nprobe=local_nprobe,
+                vector_dtype=local_vector_dtype,
+                max_bytes=local_max_bytes,
+                max_user_bytes=local_max_user_bytes,
+                spill=PersistentVectorStore(local_spill_path, dim=dim, rerank=local_rerank) if local_spill_path else None,
+            )
+        )
+        # Write-behind buffer: rows are inserted column-wise in batches instead of insert+flush per message.
+        self.insert_batch_size = max(1, insert_batch_size)
+        self.flush_interval = flush_interval
+        self.max_pending = max(self.insert_batch_size, max_pending)
+        self._pending: List[Row] = []
+        self._pending_lock = threading.Lock()
+        self._insert_lock = threading.Lock()
+        self.rejected_rows = 0
+        self._flusher: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        # Optional coalescing of concurrent searches into multi-vector requests.
+        self._search_batcher: Optional[SearchCoalescer] = None
+        if search_batch_window_ms > 0:
+            self._search_batcher = SearchCoalescer(
+                self._search_many, window_ms=search_batch_window_ms, max_batch=search_batch_max
+            )
 
     def connect(self) -> None:
         if connections is None:
             logger.warning("pymilvus not installed; using in-memory store only")
             return
+        pool = MilvusConnectionPool(
+            collection=self.collection,
+            connect_kwargs={
+                "host": self.host,
+                "port": str(self.port),
+                "user": self.user,
+                "password": self.password,
+                "db_name": self.database,
+                "secure": self.use_tls,
+            },
+            size=self.pool_size,
+        )
         try:
-            connections.connect(
-                alias="default",
-                host=self.host,
-                port=str(self.port),
-                user=self.user,
-                password=self.password,
-                secure=self.use_tls,
-            )
-            logger.info("Connected to Milvus at %s:%s", self.host, self.port)
+            pool.connect()
+            logger.info("Connected to Milvus at %s:%s (%s aliases)", self.host, self.port, len(pool.aliases))
+            self._pool = pool
             self._ensure_collection()
+            self._ensure_loaded()
         except MilvusException as exc:
             logger.error("Milvus connection failed: %s", exc)
             raise
@@ -59,67 +138,357 @@ class MilvusClient:
     def _ensure_collection(self) -> None:
         if Collection is None:
             return
+        using = self._pool.primary_alias if self._pool is not None else "default"
         try:
-            collection = Collection(self.collection)
-            self._collection_handle = collection
-            return
+            collection = Collection(self.collection, using=using)
         except MilvusException:
-            pass
-
-        logger.info("Creating Milvus collection %s", self.collection)
-        fields = [
-            FieldSchema(name="user_id", dtype=DataType.VARCHAR, max_length=128, is_primary=True, auto_id=False),
-            FieldSchema(name="content", dtype=DataType.VARCHAR, max_length=2048),
-            FieldSchema(name="vector", dtype=DataType.FLOAT_VECTOR, dim=1536),
-        ]
-        schema = CollectionSchema(fields=fields, description="Chat history")
-        collection = Collection(name=self.collection, schema=schema)
-        collection.create_index(
-            field_name="vector",
-            index_params={"index_type": "IVF_FLAT", "metric_type": "IP", "params": {"nlist": 1024}},
-        )
+            logger.info("Creating Milvus collection %s", self.collection)
+            schema = CollectionSchema(
+                fields=chat_history_fields(self.dim),
+                description="Chat history",
+            )
+            collection = Collection(
+                name=self.collection, schema=schema, num_partitions=self.num_partitions, using=using
+            )
+            create_chat_history_indexes(collection, nlist=self.nlist)
         self._collection_handle = collection
+        self._cache_schema()
+
+    def _cache_schema(self) -> None:
+        """Read the vector dim and insertable field names once instead of on every write."""
+        try:
+            fields = list(self._collection_handle.schema.fields)
+        except Exception:
+            self._schema_dim = None
+            self._schema_fields = list(ROW_FIELDS)
+            return
+        names = [f.name for f in fields if not getattr(f, "auto_id", False)]
+        self._schema_fields = [name for name in names if name in ROW_FIELDS] or list(ROW_FIELDS)
+        vector_field = next((f for f in fields if DataType is not None and f.dtype == DataType.FLOAT_VECTOR), None)
+        self._schema_dim = getattr(vector_field, "params", {}).get("dim") if vector_field else None
+
+    def _ensure_loaded(self) -> None:
+        """Load the collection once; it stays loaded server-side across reconnects."""
+        if self._loaded or self._collection_handle is None:
+            return
+        if self._pool is not None:
+            self._pool.ensure_loaded()
+        else:
+            self._collection_handle.load()
+        self._loaded = True
+
+    def _call(self, fn: Callable[[Any], T], retry: bool = True) -> T:
+        """Run ``fn`` on a pooled collection handle, or on the single handle when there is no pool.
+
+        ``retry`` allows one replay after a connection error; only idempotent calls may use it.
+        """
+        if self._pool is not None:
+            return self._pool.run(fn, retry=retry)
+        return fn(self._collection_handle)
 
     def upsert(self, user_id: str, content: str, embedding: List[float], metadata: Optional[Dict[str, Any]] = None) -> None:
         # Fallback when Milvus is unavailable or embedding doesn't match collection dim
-        expected_dim = None
-        if self._collection_handle is not None:
-            try:
-                vector_field = next((f for f in self._collection_handle.schema.fields if f.dtype == DataType.FLOAT_VECTOR), None)
-                expected_dim = getattr(vector_field, "params", {}).get("dim") if vector_field else None
-            except Exception:
-                expected_dim = None
-
-        if Collection is None or self._collection_handle is None or (expected_dim and len(embedding) != expected_dim):
-            self._local_store.append((user_id, content, metadata or {}, embedding))
+        if self._use_local_store(len(embedding)):
+            self._local_store.add(user_id, content, embedding, metadata)
             logger.debug("Stored message in local Milvus fallback store")
             return
-        self._collection_handle.insert([[user_id], [content], [embedding]])
-        self._collection_handle.flush()
+        self._enqueue([(user_id, fit_content(content), now_ms(), metadata or {}, list(embedding))])
+
+    def upsert_many(
+        self,
+        user_id: str,
+        contents: Sequence[str],
+        embeddings: Any,
+        metadata: Optional[Sequence[Optional[Dict[str, Any]]]] = None,
+    ) -> None:
+        """Write many rows for one user; Milvus receives them as column-wise bulk inserts."""
+        if not len(contents):
+            return
+        width = len(embeddings[0])
+        if self._use_local_store(width):
+            self._local_store.add_many(user_id, contents, embeddings, metadata)
+            logger.debug("Stored %s messages in local Milvus fallback store", len(contents))
+            return
+        vectors = embeddings.tolist() if hasattr(embeddings, "tolist") else [list(vec) for vec in embeddings]
+        metas = metadata or [None] * len(contents)
+        created_at = now_ms()
+        self._enqueue(
+            [
+                (user_id, fit_content(content), created_at, meta or {}, vector)
+                for content, meta, vector in zip(contents, metas, vectors)
+            ]
+        )
+
+    def refresh(self, user_id: str, content: str, metadata: Dict[str, Any], created_at: Optional[int] = None) -> bool:
+        """Bump an already-stored row's timestamp/metadata instead of inserting a duplicate.
 
-    def search(self, user_id: str, embedding: List[float], top_k: int = 5) -> List[str]:
+        Only rows still in the write buffer or in the in-memory fallback can be updated; rows
+        already in Milvus (or the append-only on-disk store) are left as they are.
+        """
+        stamp = created_at if created_at is not None else now_ms()
+        stored = fit_content(content)
+        with self._pending_lock:
+            for pos in range(len(self._pending) - 1, -1, -1):
+                row = self._pending[pos]
+                if row[0] == user_id and row[1] == stored:
+                    self._pending[pos] = (row[0], row[1], stamp, {**row[3], **metadata}, row[4])
+                    return True
+        if isinstance(self._local_store, LocalVectorIndex):
+            return self._local_store.refresh(user_id, content, stamp, metadata)
+        return False
+
+    def _use_local_store(self, dim: int) -> bool:
         if Collection is None or self._collection_handle is None:
-            # Return most recent messages for the user from fallback store
-            hits = [rec[1] for rec in self._local_store if rec[0] == user_id]
-            return hits[-top_k:]
-
-        self._collection_handle.load()
-        results = self._collection_handle.search(
-            data=[embedding],
-            anns_field="vector",
-            param={"metric_type": "IP", "params": {"nprobe": 10}},
-            limit=top_k,
-            expr=f'user_id == "{user_id}"',
-            output_fields=["content"],
+            return True
+        if self._schema_fields is None:
+            self._cache_schema()
+        return bool(self._schema_dim and dim != self._schema_dim)
+
+    def _enqueue(self, rows: List[Row]) -> None:
+        with self._pending_lock:
+            self._pending.extend(rows)
+            due = len(self._pending) >= self.insert_batch_size
+        self._ensure_flusher()
+        if due:
+            self._drain()
+
+    def flush(self) -> None:
+        """Insert all buffered rows and ask Milvus to seal them."""
+        self._drain()
+        if self._collection_handle is not None:
+            self._call(lambda collection: collection.flush())
+
+    def close(self) -> None:
+        self._stop.set()
+        if self._flusher is not None:
+            self._flusher.join(timeout=self.flush_interval + 5)
+            self._flusher = None
+        try:
+            self.flush()
+        except Exception as exc:  # pragma: no cover - shutdown best effort
+            logger.error("Milvus flush on close failed: %s", exc)
+        if self._pool is not None:
+            self._pool.close()
+            self._pool = None
+        if isinstance(self._local_store, PersistentVectorStore):
+            self._local_store.flush()
+        elif self._local_store.spill is not None:
+            self._local_store.spill.flush()
+
+    @property
+    def pending_count(self) -> int:
+        with self._pending_lock:
+            return len(self._pending)
+
+    def _ensure_flusher(self) -> None:
+        if self._flusher is not None or self.flush_interval <= 0:
+            return
+        with self._pending_lock:
+            if self._flusher is not None:
+                return
+            self._stop.clear()
+            self._flusher = threading.Thread(target=self._flush_loop, name="milvus-flusher", daemon=True)
+            self._flusher.start()
+
+    def _flush_loop(self) -> None:
+        while not self._stop.wait(self.flush_interval):
+            self._drain()
+
+    def _drain(self) -> int:
+        """Bulk-insert buffered rows.
+
+        After a connection error the unsent rows are re-queued (up to ``max_pending``). A chunk
+        the server rejects is split until the offending rows are found; those are dropped so
+        they cannot block the buffer for everyone else.
+        """
+        with self._insert_lock:
+            with self._pending_lock:
+                rows, self._pending = self._pending, []
+            if not rows:
+                return 0
+            positions = [ROW_FIELDS.index(name) for name in self._insert_fields()]
+            inserted = 0
+            for start in range(0, len(rows), self.insert_batch_size):
+                chunk = rows[start : start + self.insert_batch_size]
+                done, unsent, error = self._insert_chunk(chunk, positions)
+                inserted += done
+                if error is not None:
+                    unsent += rows[start + len(chunk) :]
+                    with self._pending_lock:
+                        self._pending = unsent + self._pending
+                        overflow = len(self._pending) - self.max_pending
+                        if overflow > 0:
+                            del self._pending[:overflow]
+                            logger.error("Milvus write buffer full; dropped %s oldest rows", overflow)
+                    logger.error("Milvus bulk insert failed (%s rows re-queued): %s", len(unsent), error)
+                    break
+            return inserted
+
+    def _insert_chunk(self, chunk: List[Row], positions: List[int]) -> Tuple[int, List[Row], Optional[Exception]]:
+        """Insert ``chunk``, bisecting it when Milvus rejects it.
+
+        Returns the number of rows inserted, the rows left unsent and the connection error that
+        stopped the insert, if any.
+        """
+        columns = [[row[pos] for row in chunk] for pos in positions]
+        try:
+            # Never replayed: an insert that hit a deadline may already be applied.
+            self._call(lambda collection: collection.insert(columns), retry=False)
+            return len(chunk), [], None
+        except Exception as exc:
+            if is_connection_error(exc):
+                return 0, list(chunk), exc
+            if len(chunk) == 1:
+                self.rejected_rows += 1
+                logger.error("Milvus rejected a row for user %s; dropping it: %s", chunk[0][0], exc)
+                return 0, [], None
+        mid = len(chunk) // 2
+        head, unsent, error = self._insert_chunk(chunk[:mid], positions)
+        if error is not None:
+            return head, unsent + chunk[mid:], error
+        tail, unsent, error = self._insert_chunk(chunk[mid:], positions)
+        return head + tail, unsent, error
+
+    def _insert_fields(self) -> List[str]:
+        """Non auto-id schema fields in order (legacy collections lack created_at/metadata)."""
+        if self._schema_fields is None:
+            self._cache_schema()
+        return self._schema_fields or list(ROW_FIELDS)
+
+    def search(
+        self,
+        user_id: str,
+        embedding: List[float],
+        top_k: int = 5,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+    ) -> List[str]:
+        return [hit.content for hit in self.search_hits(user_id, embedding, top_k, since, until)]
+
+    def search_hits(
+        self,
+        user_id: str,
+        embedding: List[float],
+        top_k: int = 5,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        with_vectors: bool = False,
+    ) -> List[SearchHit]:
+        """Top-k hits (id, inner-product score, content, created_at), optionally bounded by ``created_at``.
+
+        ``with_vectors`` also returns each hit's stored vector from Milvus; the local stores
+        always attach it since it is already in memory.
+        """
+        since_ms = to_epoch_ms(since) if since is not None else None
+        until_ms = to_epoch_ms(until) if until is not None else None
+        if Collection is None or self._collection_handle is None:
+            return self._local_store.search_hits(user_id, embedding, top_k, since_ms, until_ms)
+
+        expr = f'user_id == "{user_id}"'
+        if "created_at" in self._insert_fields():
+            # Scalar-indexed time bounds shrink the candidate set before the ANN scan.
+            if since_ms is not None:
+                expr += f" and created_at >= {since_ms}"
+            if until_ms is not None:
+                expr += f" and created_at <= {until_ms}"
+        key = (expr, top_k, with_vectors)
+        if self._search_batcher is not None:
+            return self._search_batcher.submit(key, embedding)
+        return self._search_many(key, [embedding])[0]
+
+    def _search_many(self, key: Hashable, embeddings: List[List[float]]) -> List[List[SearchHit]]:
+        """One Milvus request for many query vectors sharing the same filter and limit.
+
+        With ``user_id`` as partition key the equality filter is routed to the user's partition.
+        """
+        expr, top_k, with_vectors = key  # type: ignore[misc]
+        output_fields = [name for name in ("content", "created_at") if name in self._insert_fields()]
+        if with_vectors:
+            output_fields.append("vector")
+        self._ensure_loaded()
+        results = self._call(
+            lambda collection: collection.search(
+                data=embeddings,
+                anns_field="vector",
+                param=self.search_params,
+                limit=top_k,
+                expr=expr,
+                output_fields=output_fields,
+            )
         )
-        return [hit.entity.get("content") for hit in results[0]]
+        return [
+            [
+                SearchHit(
+                    id=hit.id,
+                    score=float(hit.distance),
+                    content=hit.entity.get("content"),
+                    created_at=hit.entity.get("created_at"),
+                    vector=hit.entity.get("vector") if with_vectors else None,
+                )
+                for hit in hits
+            ]
+            for hits in results
+        ]
+
+    def user_documents(self, user_id: str, limit: int = 0) -> List[Tuple[str, int]]:
+        """The user's newest stored messages as ``(content, created_at)``, oldest first.
+
+        Used to rebuild in-process indexes (e.g. BM25) after a restart. Buffered rows that are
+        not inserted yet are included. Milvus returns at most ``MAX_QUERY_ROWS`` rows per query
+        and does not order them by time, so for larger histories the rows are a sample.
+        """
+        if Collection is None or self._collection_handle is None:
+            return self._local_store.documents(user_id, limit)
+        with self._pending_lock:
+            pending = [(row[1], row[2]) for row in self._pending if row[0] == user_id]
+        fields = [name for name in ("content", "created_at") if name in self._insert_fields()]
+        expr = f'user_id == "{user_id}"'
+        self._ensure_loaded()
+        rows = self._call(
+            lambda collection: collection.query(
+                expr=expr, output_fields=fields, limit=min(limit or MAX_QUERY_ROWS, MAX_QUERY_ROWS)
+            )
+        )
+        docs = sorted(((row["content"], int(row.get("created_at") or 0)) for row in rows), key=lambda doc: doc[1])
+        docs += pending
+        return docs[-limit:] if limit else docs
+
+    def search_stats(self) -> Dict[str, int]:
+        return self._search_batcher.stats() if self._search_batcher is not None else {}
+
+    def local_index_stats(self) -> Dict[str, Any]:
+        stats: Dict[str, Any] = {
+            "rows": len(self._local_store),
+            "vector_dtype": self._local_store.codec.name,
+            "vector_bytes": self._local_store.nbytes,
+        }
+        if isinstance(self._local_store, LocalVectorIndex):
+            stats["budget"] = self._local_store.budget_stats()
+            if self._local_store.nlist > 0:
+                stats["ivf"] = self._local_store.ivf_stats()
+        return stats
+
+    def pool_stats(self) -> Dict[str, Any]:
+        if self._pool is None:
+            return {}
+        return {
+            "aliases": len(self._pool.aliases),
+            "loaded": self._loaded,
+            "reconnects": self._pool.reconnects,
+            "rejected_rows": self.rejected_rows,
+        }
 
     def drop_user(self, user_id: str) -> None:
         if Collection is None or self._collection_handle is None:
-            self._local_store = [rec for rec in self._local_store if rec[0] != user_id]
+            self._local_store.drop_user(user_id)
             return
-        expr = f'user_id == "{user_id}"'
-        self._collection_handle.delete(expr=expr)
+        # Holding the insert lock waits out any in-flight drain, including its re-queue of failed
+        # rows, so none of this user's rows can be inserted after the delete.
+        with self._insert_lock:
+            with self._pending_lock:
+                self._pending = [row for row in self._pending if row[0] != user_id]
+            expr = f'user_id == "{user_id}"'
+            self._call(lambda collection: collection.delete(expr=expr))
 
     def ping(self) -> bool:
         if Collection is None:
@@ -134,3 +503,33 @@ class MilvusClient:
         except Exception as exc:  # pragma: no cover - safety net for unexpected errors
             logger.error("Milvus ping unexpected failure: %s", exc)
             return False
+
+
+def fit_content(content: str) -> str:
+    """Cut ``content`` to the content field's byte limit on a UTF-8 character boundary."""
+    encoded = content.encode("utf-8")
+    if len(encoded) <= MAX_CONTENT_BYTES:
+        return content
+    logger.debug("Capping %s-byte message to %s bytes for Milvus", len(encoded), MAX_CONTENT_BYTES)
+    return encoded[:MAX_CONTENT_BYTES].decode("utf-8", errors="ignore")
+
+
+def chat_history_fields(dim: int) -> List[Any]:
+    """Schema with an auto-id primary key and ``user_id`` as partition key (many rows per user)."""
+    return [
+        FieldSchema(name="id", dtype=DataType.INT64, is_primary=True, auto_id=True),
+        FieldSchema(name="user_id", dtype=DataType.VARCHAR, max_length=128, is_partition_key=True),
+        FieldSchema(name="content", dtype=DataType.VARCHAR, max_length=MAX_CONTENT_BYTES),
+        FieldSchema(name="created_at", dtype=DataType.INT64),
+        FieldSchema(name="metadata", dtype=DataType.JSON),
+        FieldSchema(name="vector", dtype=DataType.FLOAT_VECTOR, dim=dim),
+    ]
+
+
+def create_chat_history_indexes(collection: Any, nlist: int = 1024) -> None:
+    collection.create_index(
+        field_name="vector",
+        index_params={"index_type": "IVF_FLAT", "metric_type": "IP", "params": {"nlist": nlist}},
+    )
+    collection.create_index(field_name="user_id", index_params={"index_type": "INVERTED"})
+    collection.create_index(field_name="created_at", index_params={"index_type": "STL_SORT"})
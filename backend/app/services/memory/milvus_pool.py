@@ -0,0 +1,119 @@
+import itertools
+import logging
+import threading
+from typing import Any, Callable, Dict, List, Optional, TypeVar
+
+try:
+    from pymilvus import Collection, MilvusException, connections
+except Exception:  # pragma: no cover - optional dependency
+    Collection = None  # type: ignore
+    MilvusException = Exception  # type: ignore
+    connections = None  # type: ignore
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+_CONNECTION_ERROR_HINTS = ("unavailable", "connect", "channel", "closed", "deadline", "not ready")
+
+
+def is_connection_error(exc: BaseException) -> bool:
+    """Heuristic for dropped gRPC channels (pymilvus wraps them in generic exceptions)."""
+    code = getattr(exc, "code", None)
+    code_name = getattr(code() if callable(code) else code, "name", "")
+    if code_name in {"UNAVAILABLE", "DEADLINE_EXCEEDED"}:
+        return True
+    message = str(exc).lower()
+    return any(hint in message for hint in _CONNECTION_ERROR_HINTS)
+
+
+class MilvusConnectionPool:
+    """Round-robin pool of Milvus connection aliases with one cached collection handle each.
+
+    pymilvus multiplexes every call on an alias over a single gRPC channel, so spreading
+    concurrent calls over a few aliases keeps them from serializing. A call that fails
+    with a connection error reconnects its alias and, if it is idempotent (``retry=True``),
+    is retried once.
+    """
+
+    def __init__(self, collection: str, connect_kwargs: Dict[str, Any], size: int = 4, alias_prefix: str = "memory") -> None:
+        self.collection = collection
+        self.connect_kwargs = connect_kwargs
+        self.aliases: List[str] = [f"{alias_prefix}-{i}" for i in range(max(1, size))]
+        self._handles: Dict[str, Any] = {}
+        self._cursor = itertools.count()
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._loaded = False
+        self.reconnects = 0
+
+    @property
+    def primary_alias(self) -> str:
+        return self.aliases[0]
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    def connect(self) -> None:
+        for alias in self.aliases:
+            connections.connect(alias=alias, **self.connect_kwargs)
+
+    def handle(self, alias: Optional[str] = None) -> Any:
+        alias = alias or self.aliases[next(self._cursor) % len(self.aliases)]
+        with self._lock:
+            handle = self._handles.get(alias)
+            if handle is None:
+                handle = Collection(self.collection, using=alias)
+                self._handles[alias] = handle
+        return handle
+
+    def ensure_loaded(self) -> None:
+        """Load the collection into query nodes once; later calls are no-ops."""
+        if self._loaded:
+            return
+        with self._load_lock:
+            if not self._loaded:
+                self.run(lambda collection: collection.load())
+                self._loaded = True
+
+    def run(self, fn: Callable[[Any], T], retry: bool = True) -> T:
+        """Call ``fn`` with a collection handle.
+
+        Pass ``retry=False`` for non-idempotent calls such as inserts: a deadline or dropped
+        channel does not tell whether the server applied the call, and with auto-id keys a
+        replay would duplicate rows. The alias is still reconnected for the next caller.
+        """
+        alias = self.aliases[next(self._cursor) % len(self.aliases)]
+        try:
+            return fn(self.handle(alias))
+        except Exception as exc:
+            if not is_connection_error(exc):
+                raise
+            logger.warning("Milvus alias %s dropped (%s); reconnecting", alias, exc)
+            self._reconnect(alias)
+            if not retry:
+                raise
+            return fn(self.handle(alias))
+
+    def close(self) -> None:
+        with self._lock:
+            self._handles.clear()
+        for alias in self.aliases:
+            try:
+                connections.disconnect(alias)
+            except Exception as exc:  # pragma: no cover - shutdown best effort
+                logger.debug("Milvus disconnect %s failed: %s", alias, exc)
+
+    def _reconnect(self, alias: str) -> None:
+        with self._lock:
+            self._handles.pop(alias, None)
+            self.reconnects += 1
+        try:
+            connections.disconnect(alias)
+        except Exception:  # pragma: no cover - channel already gone
+            pass
+        connections.connect(alias=alias, **self.connect_kwargs)
+
+
+__all__ = ["MilvusConnectionPool", "is_connection_error"]
@@ -0,0 +1,123 @@
+from typing import Optional, Tuple
+
+import numpy as np
+
+VECTOR_DTYPES = ("float32", "float16", "int8")
+SCORE_CHUNK = 4096  # rows up-cast to float32 at a time when scoring quantized codes
+
+
+class VectorCodec:
+    """Row-wise storage format for L2-normalized float32 vectors.
+
+    ``float16`` halves memory; ``int8`` is symmetric scalar quantization with one float32
+    scale per vector (``x ~= code * scale``, ``scale = max|x| / 127``), a 4x saving.
+    """
+
+    def __init__(self, dtype: str = "float32") -> None:
+        if dtype not in VECTOR_DTYPES:
+            raise ValueError(f"Unsupported vector dtype: {dtype} (expected one of {', '.join(VECTOR_DTYPES)})")
+        self.name = dtype
+        self.dtype = np.dtype(dtype)
+
+    @property
+    def exact(self) -> bool:
+        return self.name == "float32"
+
+    def bytes_per_vector(self, dim: int) -> int:
+        return dim * self.dtype.itemsize + (4 if self.name == "int8" else 0)
+
+    def encode(self, vectors: np.ndarray) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if self.name != "int8":
+            return vectors.astype(self.dtype), None
+        scales = np.abs(vectors).max(axis=1) / 127.0
+        scales[scales == 0.0] = 1.0
+        codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+        return codes, scales.astype(np.float32)
+
+    def decode(self, codes: np.ndarray, scales: Optional[np.ndarray]) -> np.ndarray:
+        vectors = codes.astype(np.float32)
+        if scales is not None:
+            vectors *= scales[:, None]
+        return vectors
+
+    def scores(self, codes: np.ndarray, scales: Optional[np.ndarray], query: np.ndarray) -> np.ndarray:
+        """Inner products of ``query`` with the encoded rows, without decoding them all at once."""
+        if self.exact:
+            return codes @ query
+        out = np.empty(len(codes), dtype=np.float32)
+        for start in range(0, len(codes), SCORE_CHUNK):
+            chunk = codes[start : start + SCORE_CHUNK].astype(np.float32)
+            out[start : start + len(chunk)] = chunk @ query
+        if scales is not None:
+            out *= scales
+        return out
+
+
+class QuantizedRows:
+    """Growable matrix of encoded rows (amortized doubling) plus per-row int8 scales."""
+
+    __slots__ = ("codec", "dim", "codes", "scales", "size")
+
+    def __init__(self, dim: int, codec: VectorCodec, capacity: int = 16) -> None:
+        self.codec = codec
+        self.dim = dim
+        self.codes = np.zeros((capacity, dim), dtype=codec.dtype)
+        self.scales: Optional[np.ndarray] = np.ones(capacity, dtype=np.float32) if codec.name == "int8" else None
+        self.size = 0
+
+    @property
+    def nbytes(self) -> int:
+        return self.size * self.codec.bytes_per_vector(self.dim)
+
+    @property
+    def allocated_bytes(self) -> int:
+        return self.codes.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+
+    def drop_front(self, count: int) -> None:
+        """Discard the first ``count`` rows and release the spare capacity."""
+        remaining = self.size - count
+        codes = np.zeros((max(remaining, 16), self.dim), dtype=self.codec.dtype)
+        codes[:remaining] = self.codes[count : self.size]
+        self.codes = codes
+        if self.scales is not None:
+            scales = np.ones(len(codes), dtype=np.float32)
+            scales[:remaining] = self.scales[count : self.size]
+            self.scales = scales
+        self.size = remaining
+
+    def extend(self, vectors: np.ndarray) -> None:
+        needed = self.size + len(vectors)
+        capacity = len(self.codes)
+        if needed > capacity:
+            while capacity < needed:
+                capacity *= 2
+            codes = np.zeros((capacity, self.dim), dtype=self.codec.dtype)
+            codes[: self.size] = self.codes[: self.size]
+            self.codes = codes
+            if self.scales is not None:
+                scales = np.ones(capacity, dtype=np.float32)
+                scales[: self.size] = self.scales[: self.size]
+                self.scales = scales
+        codes, scales = self.codec.encode(vectors)
+        self.codes[self.size : needed] = codes
+        if self.scales is not None:
+            self.scales[self.size : needed] = scales
+        self.size = needed
+
+    def scores(self, query: np.ndarray, positions: Optional[np.ndarray] = None) -> np.ndarray:
+        codes = self.codes[: self.size] if positions is None else self.codes[positions]
+        scales = None
+        if self.scales is not None:
+            scales = self.scales[: self.size] if positions is None else self.scales[positions]
+        return self.codec.scores(codes, scales, query)
+
+    def decode(self, positions: Optional[np.ndarray] = None) -> np.ndarray:
+        codes = self.codes[: self.size] if positions is None else self.codes[positions]
+        scales = None
+        if self.scales is not None:
+            scales = self.scales[: self.size] if positions is None else self.scales[positions]
+        return self.codec.decode(codes, scales)
+
+
+__all__ = ["QuantizedRows", "VECTOR_DTYPES", "VectorCodec"]
@@ -0,0 +1,48 @@
+from typing import List, Sequence
+
+import numpy as np
+
+from app.services.memory.hits import SearchHit
+
+
+def mmr_order(relevance: np.ndarray, vectors: np.ndarray, k: int, lambda_: float = 0.7) -> np.ndarray:
+    """Maximal marginal relevance: pick ``k`` rows maximizing ``λ·rel − (1−λ)·max sim to picked``.
+
+    ``vectors`` must be L2-normalized. The pairwise similarity matrix is computed once and the
+    running max-similarity is updated with one vector op per pick (O(n²·d + k·n) overall).
+    """
+    n = len(relevance)
+    k = min(k, n)
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    similarity = vectors @ vectors.T
+    redundancy = np.zeros(n, dtype=np.float32)
+    available = np.ones(n, dtype=bool)
+    picked = np.empty(k, dtype=np.int64)
+    for step in range(k):
+        objective = np.where(available, lambda_ * relevance - (1.0 - lambda_) * redundancy, -np.inf)
+        best = int(np.argmax(objective))
+        picked[step] = best
+        available[best] = False
+        redundancy = similarity[best] if step == 0 else np.maximum(redundancy, similarity[best])
+    return picked
+
+
+def mmr_rerank(hits: Sequence[SearchHit], top_k: int, lambda_: float = 0.7) -> List[SearchHit]:
+    """Diverse ``top_k`` of ``hits`` by MMR over their stored vectors.
+
+    Falls back to the first ``top_k`` hits (relevance order) when any hit lacks a vector or the
+    vectors differ in width, e.g. rows written under a different embedding dim.
+    """
+    if len(hits) <= top_k:
+        return list(hits)
+    if any(hit.vector is None for hit in hits) or len({len(hit.vector) for hit in hits}) != 1:
+        return list(hits[:top_k])
+    vectors = np.asarray([hit.vector for hit in hits], dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    vectors /= np.where(norms == 0.0, 1.0, norms)
+    relevance = np.array([hit.score for hit in hits], dtype=np.float32)
+    return [hits[i] for i in mmr_order(relevance, vectors, top_k, lambda_)]
+
+
+__all__ = ["mmr_order", "mmr_rerank"]
@@ -0,0 +1,104 @@
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class _Batch:
+    __slots__ = ("vectors", "full", "done", "results", "error")
+
+    def __init__(self) -> None:
+        self.vectors: List[Any] = []
+        self.full = threading.Event()
+        self.done = threading.Event()
+        self.results: List[Any] = []
+        self.error: Optional[BaseException] = None
+
+
+class SearchCoalescer:
+    """Gather concurrent searches that share a key into one multi-vector request.
+
+    The first caller for a key becomes the leader: it waits up to ``window_ms`` (or until
+    ``max_batch`` vectors joined), runs ``run_batch(key, vectors)`` once and hands every
+    follower its own slice of the results. The leader skips the wait when no other search is
+    in flight, so an idle service pays no window latency. Searches only share a batch when
+    their key (filter expression + limit) is identical, so per-user filters stay exact; in
+    practice that means concurrent searches of the same user.
+    """
+
+    def __init__(
+        self,
+        run_batch: Callable[[Hashable, List[Any]], List[Any]],
+        window_ms: float = 2.0,
+        max_batch: int = 32,
+    ) -> None:
+        self._run_batch = run_batch
+        self.window = max(0.0, window_ms) / 1000.0
+        self.max_batch = max(1, max_batch)
+        self._open: Dict[Hashable, _Batch] = {}
+        self._active = 0  # submits in progress, across keys
+        self._lock = threading.Lock()
+        self._counters: Dict[str, int] = {"requests": 0, "batches": 0, "coalesced": 0, "errors": 0, "unwaited": 0}
+
+    def submit(self, key: Hashable, vector: Any) -> Any:
+        with self._lock:
+            self._active += 1
+        try:
+            return self._submit(key, vector)
+        finally:
+            with self._lock:
+                self._active -= 1
+
+    def _submit(self, key: Hashable, vector: Any) -> Any:
+        with self._lock:
+            self._counters["requests"] += 1
+            batch = self._open.get(key)
+            leader = batch is None
+            if batch is None:
+                batch = _Batch()
+                self._open[key] = batch
+            index = len(batch.vectors)
+            batch.vectors.append(vector)
+            if len(batch.vectors) >= self.max_batch:
+                del self._open[key]
+                batch.full.set()
+            # Nothing else in flight means nobody can join: dispatch at once.
+            wait = leader and self._active > 1
+            if leader and not wait:
+                self._counters["unwaited"] += 1
+
+        if not leader:
+            batch.done.wait()
+        else:
+            if wait:
+                batch.full.wait(self.window)
+            with self._lock:
+                if self._open.get(key) is batch:
+                    del self._open[key]
+                self._counters["batches"] += 1
+                self._counters["coalesced"] += len(batch.vectors) - 1
+            started = time.perf_counter()
+            try:
+                batch.results = self._run_batch(key, batch.vectors)
+            except Exception as exc:
+                batch.error = exc
+                with self._lock:
+                    self._counters["errors"] += 1
+            finally:
+                batch.done.set()
+            logger.debug(
+                "Coalesced search of %s vectors took %.2f ms", len(batch.vectors), (time.perf_counter() - started) * 1000
+            )
+
+        if batch.error is not None:
+            raise batch.error
+        return batch.results[index]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._counters)
+
+
+__all__ = ["SearchCoalescer"]
@@ -3,21 +3,32 @@ from typing import Any, Dict, Optional
 
 import httpx
 
+from app.utils.http import HEALTH_TIMEOUT, HTTPPoolConfig, PooledAsyncClient
+
 logger = logging.getLogger(__name__)
 
 
 class StableDiffusionClient:
     """Client for local Stable Diffusion WebUI (txt2img)."""
 
-    def __init__(self, base_url: str, model: str | None = None) -> None:
+    def __init__(
+        self,
+        base_url: str,
+        model: str | None = None,
+        pool: Optional[HTTPPoolConfig] = None,
+        client: Optional[httpx.AsyncClient] = None,
+    ) -> None:
         self.base_url = base_url.rstrip("/")
         self.model = model or ""
+        self._http = PooledAsyncClient(pool or HTTPPoolConfig(timeout=60.0), client)
+
+    async def aclose(self) -> None:
+        await self._http.aclose()
 
     async def health(self) -> bool:
         try:
-            async with httpx.AsyncClient(timeout=5.0) as client:
-                resp = await client.get(f"{self.base_url}/sdapi/v1/sd-models")
-                resp.raise_for_status()
+            resp = await self._http.client.get(f"{self.base_url}/sdapi/v1/sd-models", timeout=HEALTH_TIMEOUT)
+            resp.raise_for_status()
             return True
         except Exception as exc:
             logger.warning("SD health check failed: %s", exc)
@@ -40,11 +51,10 @@ class StableDiffusionClient:
         }
         if self.model:
             payload["override_settings"] = {"sd_model_checkpoint": self.model}
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            resp = await client.post(f"{self.base_url}/sdapi/v1/txt2img", json=payload)
-            resp.raise_for_status()
-            data = resp.json()
-            images = data.get("images") or []
-            if not images:
-                raise RuntimeError("No image returned from Stable Diffusion")
-            return images[0]
+        resp = await self._http.client.post(f"{self.base_url}/sdapi/v1/txt2img", json=payload)
+        resp.raise_for_status()
+        data = resp.json()
+        images = data.get("images") or []
+        if not images:
+            raise RuntimeError("No image returned from Stable Diffusion")
+        return images[0]
@@ -28,16 +28,16 @@ class StubMemoryService(MemoryService):
     def __init__(self) -> None:
         self.calls: list[tuple[str, str]] = []
 
-    def retrieve_context(self, user_id: str, query: str) -> MemoryContext:  # type: ignore[override]
+    async def aretrieve_context(self, user_id: str, query: str) -> MemoryContext:  # type: ignore[override]
         self.calls.append((user_id, query))
         return MemoryContext(memori_context="PROFILE:demo", milvus_chunks=["h1", "h2"], stats={})
 
 
 class StubLLMRouter(LLMRouter):
     def __init__(self) -> None:
-        self.last_prompt: str | None = None
+        self.last_prompt: list[dict[str, str]] | None = None
 
-    async def generate(self, prompt: str, provider=None) -> str:  # type: ignore[override]
+    async def generate(self, prompt, provider=None) -> str:  # type: ignore[override]
         self.last_prompt = prompt
         return "[stub reply]"
 
@@ -82,13 +82,32 @@ def test_chat_integrates_memory_and_llm_prompt(client: TestClient):
     assert resp.status_code == 200
     # Memory service got the call with trimmed inputs
     assert stub_mem.calls == [("user-42", "Hi there")]
-    # LLM prompt should include memori context, milvus hits, and user message
+    # LLM messages should include memori context, milvus hits, and the user message last
     assert stub_llm.last_prompt is not None
-    assert "PROFILE:demo" in stub_llm.last_prompt
-    assert "- h1" in stub_llm.last_prompt and "- h2" in stub_llm.last_prompt
-    assert "User:\nHi there" in stub_llm.last_prompt
+    system = "\n".join(m["content"] for m in stub_llm.last_prompt if m["role"] == "system")
+    assert "PROFILE:demo" in system
+    assert "- h1" in system and "- h2" in system
+    assert stub_llm.last_prompt[-1] == {"role": "user", "content": "Hi there"}
     # Response body still follows contract
     data = resp.json()
     assert data["memori_context"] == "PROFILE:demo"
     assert data["milvus_chunks"] == ["h1", "h2"]
     assert data["reply"] == "[stub reply]"
+
+
+def test_chat_rejects_a_message_larger_than_the_prompt_budget(client: TestClient):
+    from app.services.llm.prompts import PromptBudget
+    from app.services.llm.tokens import TokenCounter
+
+    stub_llm = StubLLMRouter()
+    chain = ChatChain(
+        memory_service=StubMemoryService(),
+        llm_router=stub_llm,
+        prompt_budget=PromptBudget(user=20),
+        token_counter=TokenCounter(heuristic=True),
+    )
+    app.dependency_overrides[deps.get_chat_chain] = lambda: chain
+
+    resp = client.post("/api/v1/chat", json={"user_id": "u1", "message": "word " * 50})
+    assert resp.status_code == 413
+    assert stub_llm.last_prompt is None
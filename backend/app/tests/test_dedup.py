@@ -0,0 +1,46 @@
+import numpy as np
+
+from app.services.memory.dedup import WriteDeduplicator, normalize_text, simhash64
+
+
+def test_normalize_and_simhash_ignore_case_and_punctuation():
+    assert normalize_text("  Good NIGHT!!  ") == "good night"
+    assert simhash64("Good night!") == simhash64("good   night")
+    long = "remind me to water the tomato plants on the balcony every morning before work"
+    near = long + " please"
+    assert bin(simhash64(long) ^ simhash64(near)).count("1") <= 12
+    assert bin(simhash64(long) ^ simhash64("quarterly tax filing deadline is next friday")).count("1") > 12
+
+
+def test_deduplicator_matches_exact_then_near_duplicates_and_counts_repeats():
+    dedup = WriteDeduplicator("skip", window=2, max_hamming=64, cosine_threshold=0.95)
+    assert dedup.check("u1", "hello there", [1.0, 0.0]) is None
+    assert dedup.check("u1", "hello there") is None  # check never records
+    dedup.remember("u1", [dedup.entry("hello there", [1.0, 0.0])])
+
+    match = dedup.check("u1", "Hello, there!")
+    assert match is not None and match.reason == "exact" and match.original.repeats == 2
+    match = dedup.check("u1", "there hello", [0.99, 0.05])
+    assert match is not None and match.reason == "near" and match.original.content == "hello there"
+    assert dedup.check("u1", "hi", [0.99, 0.05]) is None  # different words are never near-duplicates
+    assert dedup.check("u2", "hello there", [1.0, 0.0]) is None  # per-user windows
+
+    dedup.remember("u1", [dedup.entry("second", [0.0, 1.0]), dedup.entry("third", [0.7, -0.7])])
+    assert dedup.check("u1", "hello there") is None  # fell out of the window
+    assert dedup.stats()["exact"] == 1 and dedup.stats()["near"] == 1
+
+
+def test_deduplicator_keeps_corrected_facts():
+    dedup = WriteDeduplicator("merge")
+    first = "remind me to call mom tomorrow at 9 about the birthday dinner plans"
+    dedup.remember("u1", [dedup.entry(first, [1.0, 0.0])])
+    # Even with identical embeddings, a changed word keeps the corrected message.
+    assert dedup.check("u1", first.replace("at 9", "at 10"), [1.0, 0.0]) is None
+    pending = [dedup.entry("new fact", [0.0, 1.0])]
+    assert dedup.check("u1", "New fact.", pending=pending).original is pending[0]
+
+
+def test_deduplicator_with_zero_vectors_never_matches_on_cosine():
+    dedup = WriteDeduplicator(window=4, max_hamming=64, cosine_threshold=0.0)
+    dedup.remember("u1", [dedup.entry("a b", np.zeros(3))])
+    assert dedup.check("u1", "b a", np.zeros(3)) is None
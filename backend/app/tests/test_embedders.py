@@ -0,0 +1,126 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import httpx
+import numpy as np
+import pytest
+
+from app.services.memory.embedders import HashingEmbedder, OllamaEmbedder, OpenAIEmbedder, build_embedder
+from app.services.memory.memory_service import build_default_embedder
+
+EMBEDDERS_PATH = Path(__file__).resolve().parents[1] / "services" / "memory" / "embedders.py"
+
+
+def test_hashing_embedder_has_fixed_dim_and_unit_norm():
+    embed = HashingEmbedder(dim=256)
+    matrix = embed.embed_many(["I love hiking in the mountains", "", "你好世界"])
+    assert matrix.shape == (3, 256)
+    assert np.allclose(np.linalg.norm(matrix[[0, 2]], axis=1), 1.0)
+    assert not matrix[1].any()
+    assert len(build_default_embedder("m", dim=64)("hello")) == 64
+
+
+def test_hashing_embedder_scores_related_text_higher():
+    embed = HashingEmbedder(dim=1024)
+    query, related, unrelated = embed.embed_many(
+        ["my dog Bruno likes the park", "Bruno the dog went to the park", "quarterly tax filing deadline"]
+    )
+    assert query @ related > query @ unrelated
+
+
+def test_hashing_embedder_is_stable_across_processes():
+    # Load the module by path so the subprocess does not boot the whole app package.
+    script = (
+        "import importlib.util, sys;"
+        f"spec = importlib.util.spec_from_file_location('embedders', {str(EMBEDDERS_PATH)!r});"
+        "mod = importlib.util.module_from_spec(spec); spec.loader.exec_module(mod);"
+        "print(mod.HashingEmbedder(dim=32)('same text across workers')[:4])"
+    )
+    outputs = set()
+    for seed in ("1", "2"):
+        env = {**os.environ, "PYTHONHASHSEED": seed}
+        result = subprocess.run([sys.executable, "-c", script], env=env, capture_output=True, text=True, check=True)
+        outputs.add(result.stdout.strip())
+    assert len(outputs) == 1
+
+
+def _mock_client(handler) -> httpx.Client:
+    return httpx.Client(transport=httpx.MockTransport(handler))
+
+
+def test_openai_embedder_batches_and_truncates():
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        body = json.loads(request.content)
+        requests.append(body)
+        assert request.headers["Authorization"] == "Bearer sk-test"
+        data = [{"index": i, "embedding": [float(i + 1), 1.0, 0.0, 5.0]} for i in range(len(body["input"]))]
+        return httpx.Response(200, json={"data": list(reversed(data))})
+
+    embed = OpenAIEmbedder(
+        api_key="sk-test",
+        model="text-embedding-3-large",
+        base_url="http://stand-in/v1",
+        dim=2,
+        batch_size=2,
+        client=_mock_client(handler),
+    )
+    matrix = embed.embed_many(["a", "b", "c"])
+
+    assert [len(body["input"]) for body in requests] == [2, 1]
+    assert requests[0]["dimensions"] == 2
+    assert matrix.shape == (3, 2)
+    assert np.allclose(matrix[1], np.array([2.0, 1.0]) / np.sqrt(5.0))
+
+
+def test_ollama_embedder_retries_transient_errors():
+    attempts = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        attempts.append(request.url.path)
+        if len(attempts) == 1:
+            return httpx.Response(503)
+        body = json.loads(request.content)
+        return httpx.Response(200, json={"embeddings": [[1.0, 0.0]] * len(body["input"])})
+
+    embed = OllamaEmbedder(model="nomic-embed-text", base_url="http://stand-in", backoff=0, client=_mock_client(handler))
+    assert embed("hello") == [1.0, 0.0]
+    assert attempts == ["/api/embed", "/api/embed"]
+
+
+def test_build_embedder_falls_back_to_hashing_without_key():
+    embed = build_embedder("openai", model="text-embedding-3-large", dim=16, openai_api_key="")
+    assert isinstance(embed, HashingEmbedder)
+    assert len(embed("offline")) == 16
+
+
+def test_ollama_embedder_rejects_malformed_responses():
+    responses = iter([{"embeddings": [[1.0, 0.0]]}, {"embeddings": [[1.0], [1.0, 0.0]]}, {"embeddings": [[1.0]] * 2}])
+    client = _mock_client(lambda _: httpx.Response(200, json=next(responses)))
+    embed = OllamaEmbedder(model="nomic-embed-text", base_url="http://stand-in", dim=2, client=client)
+    for _ in range(3):  # missing row, mixed widths, narrower than dim
+        with pytest.raises(ValueError):
+            embed.embed_many(["a", "b"])
+
+
+def test_build_embedder_uses_the_ollama_model_setting():
+    embed = build_embedder("ollama", model="text-embedding-3-large", dim=16, ollama_model="nomic-embed-text")
+    assert isinstance(embed, OllamaEmbedder) and embed.model == "nomic-embed-text"
+    embed.close()
+
+
+def test_embedding_cache_key_names_the_embedder_actually_built(monkeypatch):
+    from app.api.v1 import deps
+
+    monkeypatch.setattr(deps.settings, "embedding_provider", "openai")
+    monkeypatch.setattr(deps.settings, "openai_api_key", "")
+    monkeypatch.setattr(deps.settings, "embedding_cache_path", "")
+    deps.get_embedder.cache_clear()
+    try:
+        assert deps.get_embedder().model_name.startswith("hashing_embedder_")
+    finally:
+        deps.get_embedder.cache_clear()
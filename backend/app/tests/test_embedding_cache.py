@@ -0,0 +1,67 @@
+from app.services.memory.embedding_cache import CachedEmbedder, SQLiteEmbeddingStore, embedding_key
+
+
+class CountingEmbedder:
+    __name__ = "counting"
+
+    def __init__(self) -> None:
+        self.calls: list[str] = []
+
+    def __call__(self, text: str) -> list[float]:
+        self.calls.append(text)
+        return [float(len(text)), 1.0]
+
+
+def test_cached_embedder_lru_hits_and_evicts():
+    inner = CountingEmbedder()
+    embed = CachedEmbedder(inner, model_name="m", maxsize=2)
+
+    assert embed("hi") == [2.0, 1.0]
+    assert embed("hi") == [2.0, 1.0]
+    embed("hello")
+    embed("good night")  # evicts "hi"
+    embed("hi")
+
+    assert inner.calls == ["hi", "hello", "good night", "hi"]
+    assert embed.stats()["hits"] == 1
+    assert embed.__name__ == "cached_counting"
+
+
+def test_disk_tier_survives_restart(tmp_path):
+    path = str(tmp_path / "embeddings.db")
+    first = CachedEmbedder(CountingEmbedder(), model_name="m", disk=SQLiteEmbeddingStore(path))
+    first("hello")
+    first.close()
+
+    inner = CountingEmbedder()
+    second = CachedEmbedder(inner, model_name="m", disk=SQLiteEmbeddingStore(path))
+    assert second("hello") == [5.0, 1.0]
+    assert inner.calls == []
+    assert second.stats()["disk_hits"] == 1
+    second.close()
+
+
+def test_embedding_key_depends_on_model():
+    assert embedding_key("a", "text") == embedding_key("a", "text")
+    assert embedding_key("a", "text") != embedding_key("b", "text")
+
+
+def test_embed_many_only_embeds_misses():
+    inner = CountingEmbedder()
+    embed = CachedEmbedder(inner, model_name="m")
+    embed("hi")
+
+    matrix = embed.embed_many(["hi", "hello", "hi"])
+    assert matrix.tolist() == [[2.0, 1.0], [5.0, 1.0], [2.0, 1.0]]
+    assert inner.calls == ["hi", "hello"]
+
+
+def test_embed_many_writes_misses_to_disk_in_one_transaction(tmp_path):
+    disk = SQLiteEmbeddingStore(str(tmp_path / "emb.db"))
+    commits = []
+    disk._conn.set_trace_callback(lambda sql: commits.append(sql) if sql.strip().upper() == "COMMIT" else None)
+    embed = CachedEmbedder(CountingEmbedder(), model_name="m", disk=disk)
+
+    embed.embed_many([f"text {i}" for i in range(50)])
+    assert len(commits) == 1
+    assert disk.get(embedding_key("m", "text 49")).tolist() == [7.0, 1.0]
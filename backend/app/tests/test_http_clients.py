@@ -0,0 +1,59 @@
+import asyncio
+import json
+
+import httpx
+
+from app.api.v1 import deps
+from app.services.llm.ollama_client import OllamaClient
+from app.services.vision.sd_client import StableDiffusionClient
+from app.utils.http import HTTPPoolConfig, PooledAsyncClient
+
+
+def test_ollama_reuses_one_client_and_sends_messages_to_chat_endpoint():
+    seen = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        seen.append((request.url.path, json.loads(request.content)))
+        if request.url.path == "/api/chat":
+            return httpx.Response(200, json={"message": {"role": "assistant", "content": "hi"}})
+        return httpx.Response(200, json={"response": "plain"})
+
+    async def run():
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        ollama = OllamaClient("http://ollama", "llama3", client=client)
+        replies = [
+            await ollama.generate([{"role": "user", "content": "hello"}]),
+            await ollama.generate("hello"),
+        ]
+        assert ollama._http.client is client
+        await ollama.aclose()
+        assert client.is_closed
+        return replies
+
+    assert asyncio.run(run()) == ["hi", "plain"]
+    assert [path for path, _ in seen] == ["/api/chat", "/api/generate"]
+    assert seen[0][1]["messages"] == [{"role": "user", "content": "hello"}]
+
+
+def test_pooled_client_applies_limits_and_rebuilds_after_close():
+    pool = PooledAsyncClient(HTTPPoolConfig(timeout=7.0, connect_timeout=2.0, max_connections=3))
+
+    async def run():
+        first = pool.client
+        assert pool.client is first and first.timeout.read == 7.0 and first.timeout.connect == 2.0
+        await pool.aclose()
+        second = pool.client
+        await pool.aclose()
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert first is not second and first.is_closed and second.is_closed
+
+
+def test_image_clients_are_shared_across_requests():
+    deps.get_sd_client.cache_clear()
+    deps.get_gemini_client.cache_clear()
+    assert deps.get_sd_client() is deps.get_sd_client()
+    assert deps.get_gemini_client() is deps.get_gemini_client()
+    assert isinstance(deps.get_sd_client(), StableDiffusionClient)
+    asyncio.run(deps.aclose_resources())
@@ -0,0 +1,41 @@
+from app.services.memory.hits import SearchHit, fuse_hits
+from app.services.memory.lexical import BM25Index, tokenize
+
+
+def test_tokenize_drops_stopwords_and_case():
+    assert tokenize("What did I tell you about Lisbon?") == ["tell", "about", "lisbon"]
+
+
+def test_bm25_ranks_rare_terms_and_supports_incremental_deletes():
+    index = BM25Index()
+    index.add("u1", "my sister Ana lives in Lisbon", created_at=1_000)
+    doc = index.add("u1", "we talked about work again", created_at=2_000)
+    index.add("u1", "work was busy, more work tomorrow", created_at=3_000)
+    index.add("u2", "Lisbon trip", created_at=1_000)
+
+    [hit] = index.search("u1", "where does Ana live?", top_k=3)
+    assert hit.content == "my sister Ana lives in Lisbon" and hit.source == "bm25"
+    assert [h.content for h in index.search("u1", "work", top_k=2)][0] == "work was busy, more work tomorrow"
+    assert [h.content for h in index.search("u1", "work", since_ms=2_500)] == ["work was busy, more work tomorrow"]
+
+    assert index.remove("u1", doc)
+    assert len(index.search("u1", "talked")) == 0
+    assert index.stats()["docs"] == 3
+    index.drop_user("u1")
+    assert index.search("u1", "Lisbon") == [] and len(index.search("u2", "Lisbon")) == 1
+
+
+def test_bm25_per_user_cap_evicts_oldest():
+    index = BM25Index(max_docs_per_user=2)
+    index.add_many("u1", ["alpha", "beta", "gamma"])
+    assert index.search("u1", "alpha") == []
+    assert index.stats() == {"users": 1, "docs": 2, "terms": 2, "postings": 2}
+
+
+def test_fuse_hits_rewards_agreement_between_retrievers():
+    vector = [SearchHit(1, 0.9, "a"), SearchHit(2, 0.8, "b"), SearchHit(3, 0.7, "c")]
+    lexical = [SearchHit(7, 5.0, "c", source="bm25"), SearchHit(8, 4.0, "d", source="bm25")]
+
+    fused = fuse_hits([vector, lexical], top_k=3)
+    assert [hit.content for hit in fused] == ["c", "a", "b"]
+    assert fused[0].source == "hybrid" and fused[0].score == 0.7  # vector hit object is kept
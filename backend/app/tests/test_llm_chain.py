@@ -1,7 +1,20 @@
 import asyncio
+import json
+import os
+
+import pytest
 
 from app.services.chains.chat_chain import ChatChain
+from app.services.llm.prompts import (
+    SYSTEM_PROMPT,
+    PromptBudget,
+    PromptTooLongError,
+    assemble_chat_prompt,
+    build_chat_prompt,
+    build_messages,
+)
 from app.services.llm.router import LLMRouter
+from app.services.llm.tokens import TokenCounter
 from app.services.memory.memory_service import MemoryContext, MemoryService
 
 
@@ -9,7 +22,7 @@ class DummyMemory(MemoryService):
     def __init__(self) -> None:
         pass
 
-    def retrieve_context(self, user_id: str, query: str) -> MemoryContext:  # type: ignore[override]
+    async def aretrieve_context(self, user_id: str, query: str) -> MemoryContext:  # type: ignore[override]
         return MemoryContext(memori_context="memo", milvus_chunks=["a"], stats={})
 
 
@@ -26,3 +39,87 @@ def test_chat_chain_runs():
     result = asyncio.run(chain.run(user_id="u1", message="hello"))
     assert result.reply
     assert result.milvus_chunks == ["a"]
+
+
+def test_prompt_budget_drops_lowest_ranked_chunks_and_reports_tokens():
+    counter = TokenCounter(heuristic=True)
+    chunks = [f"memory number {i} " + "detail " * 20 for i in range(10)]
+    budget = PromptBudget(total=400, system=50, memori=40, milvus=120, user=50)
+
+    prompt = assemble_chat_prompt("system", "profile " * 200, chunks, "hello", budget=budget, counter=counter)
+
+    assert prompt.truncated == ["memori"] and prompt.tokens["memori"] <= 40
+    assert prompt.milvus_chunks == chunks[: len(prompt.milvus_chunks)] and prompt.dropped_chunks > 0
+    assert prompt.tokens["milvus"] <= 120 and prompt.tokens["total"] <= 400
+    assert prompt.tokens["total"] == counter.count(prompt.text) and prompt.tokenizer == "heuristic"
+
+    ranked = assemble_chat_prompt("s", "", ["weak", "strong"], "q", budget, counter, chunk_scores=[0.1, 0.9])
+    assert ranked.milvus_chunks == ["weak", "strong"]  # both fit; original order kept
+    tight = PromptBudget(total=400, milvus=counter.count("- strong\n"))
+    assert assemble_chat_prompt("s", "", ["weak", "strong"], "q", tight, counter, [0.1, 0.9]).milvus_chunks == ["strong"]
+
+
+def test_prompt_budget_never_truncates_the_user_message():
+    counter = TokenCounter(heuristic=True)
+    message = "please keep every word of this question " * 10
+    budget = PromptBudget(total=counter.count(message) + 60, system=50, memori=40, milvus=120, user=1000)
+
+    prompt = assemble_chat_prompt("system " * 30, "profile " * 30, ["chunk"] * 5, message, budget, counter)
+    assert prompt.messages[-1]["content"] == message and prompt.tokens["user"] == counter.count(message)
+    assert "user" not in prompt.truncated and prompt.tokens["total"] <= budget.total
+    with pytest.raises(PromptTooLongError):
+        assemble_chat_prompt("s", "", [], message, PromptBudget(user=10), counter)
+    with pytest.raises(PromptTooLongError):
+        assemble_chat_prompt("s", "", [], message, PromptBudget(total=20), counter)
+
+
+def test_heuristic_truncate_stays_within_budget():
+    counter = TokenCounter(heuristic=True)
+    text = "one two three, four five six seven eight nine ten"
+    cut = counter.truncate(text, 5)
+    assert text.startswith(cut) and 0 < counter.count(cut) <= 5
+    assert build_chat_prompt("s", "m", ["a"], "u") == build_chat_prompt("s", "m", ["a"], "u", budget=PromptBudget())
+
+
+def test_heuristic_counts_cjk_as_a_token_per_character():
+    counter = TokenCounter(heuristic=True)
+    text = "我们明天去公园散步" * 40
+    assert counter.count(text) == 360  # a real tokenizer needs about one per character, not len/4
+    assert counter.count("hello 世界") == 2 + 2
+    cut = counter.truncate(text, 50)
+    assert text.startswith(cut) and counter.count(cut) == 50
+
+
+def test_consecutive_turns_share_a_byte_identical_message_prefix():
+    profile = "Profile:\nname=Ana; likes=hiking"
+    turns = [
+        ("Recent facts:\nasked about boots", ["bought boots in May"], "which trail next?"),
+        ("Recent facts:\nasked about trails", ["hiked the alps", "knee was sore"], "and after that?"),
+    ]
+    payloads = []
+    for recent, chunks, message in turns:
+        prompt = assemble_chat_prompt(SYSTEM_PROMPT, profile, chunks, message, recent_context=recent)
+        assert [m["role"] for m in prompt.messages] == ["system", "system", "system", "user"]
+        payloads.append(json.dumps({"model": "m", "messages": prompt.messages}).encode("utf-8"))
+
+    stable = json.dumps({"model": "m", "messages": build_messages(SYSTEM_PROMPT, profile, [], "")[:2]})[:-2]
+    assert payloads[0].startswith(stable.encode("utf-8")) and payloads[1].startswith(stable.encode("utf-8"))
+    assert len(os.path.commonprefix(payloads)) >= len(stable)
+
+
+def test_chain_sends_profile_before_volatile_context():
+    class SplitMemory(DummyMemory):
+        async def aretrieve_context(self, user_id: str, query: str) -> MemoryContext:  # type: ignore[override]
+            return MemoryContext(
+                memori_context="", milvus_chunks=["a"], stats={}, memori_profile="p", memori_facts="f"
+            )
+
+    class CapturingRouter(DummyRouter):
+        async def generate(self, prompt, provider=None) -> str:  # type: ignore[override]
+            self.messages = prompt
+            return "ok"
+
+    router = CapturingRouter()
+    asyncio.run(ChatChain(memory_service=SplitMemory(), llm_router=router).run(user_id="u1", message="hello"))
+    assert router.messages[1]["content"].endswith("Profile:\np")
+    assert router.messages[2]["content"].startswith("Recent facts:\nf")
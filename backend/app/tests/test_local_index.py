@@ -0,0 +1,143 @@
+import threading
+
+import numpy as np
+
+from app.services.memory.local_index import INITIAL_CAPACITY, LocalVectorIndex
+
+
+def test_local_index_ranks_by_cosine():
+    index = LocalVectorIndex()
+    index.add("u1", "cats", [1.0, 0.0, 0.0])
+    index.add("u1", "dogs", [0.0, 1.0, 0.0])
+    index.add("u1", "mostly cats", [0.9, 0.1, 0.0])
+    index.add("u2", "other user", [1.0, 0.0, 0.0])
+
+    assert index.search("u1", [1.0, 0.0, 0.0], top_k=2) == ["cats", "mostly cats"]
+    assert index.search("u2", [0.0, 1.0, 0.0], top_k=5) == ["other user"]
+    assert index.search("missing", [1.0, 0.0, 0.0]) == []
+
+
+def test_local_index_grows_and_drops_users():
+    index = LocalVectorIndex()
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(INITIAL_CAPACITY * 3, 8)).astype(np.float32)
+    for i, vec in enumerate(vectors):
+        index.add("u1", f"msg-{i}", vec.tolist())
+
+    assert index.count("u1") == len(vectors)
+    assert index.search("u1", vectors[37].tolist(), top_k=1) == ["msg-37"]
+
+    index.drop_user("u1")
+    assert index.count("u1") == 0
+    assert len(index) == 0
+
+
+def test_local_index_zero_query_returns_recent_rows():
+    index = LocalVectorIndex()
+    for i in range(4):
+        index.add("u1", f"msg-{i}", [float(i + 1), 1.0])
+    assert index.search("u1", [0.0, 0.0], top_k=2) == ["msg-2", "msg-3"]
+
+
+def test_local_index_time_bounds():
+    index = LocalVectorIndex()
+    index.add("u1", "old", [1.0, 0.0], created_at=1_000)
+    index.add("u1", "middle", [1.0, 0.1], created_at=2_000)
+    index.add("u1", "new", [0.0, 1.0], created_at=3_000)
+
+    assert index.search("u1", [1.0, 0.0], top_k=3, since_ms=2_000) == ["middle", "new"]
+    assert index.search("u1", [1.0, 0.0], top_k=3, until_ms=2_000) == ["old", "middle"]
+    assert index.search("u1", [1.0, 0.0], top_k=3, since_ms=5_000) == []
+    [hit] = index.search_hits("u1", [1.0, 0.0], top_k=1)
+    assert (hit.id, hit.content, hit.created_at) == (1, "old", 1_000)
+    assert abs(hit.score - 1.0) < 1e-6
+
+
+def test_ivf_index_trains_and_matches_exact_top_hit():
+    rng = np.random.default_rng(0)
+    centers = rng.standard_normal((8, 16)).astype(np.float32)
+    vectors = centers[rng.integers(0, 8, 400)] + 0.1 * rng.standard_normal((400, 16)).astype(np.float32)
+    exact = LocalVectorIndex()
+    ivf = LocalVectorIndex(nlist=8, nprobe=2, ivf_min_rows=200)
+    contents = [f"msg-{i}" for i in range(400)]
+
+    exact.add_many("u1", contents[:150], vectors[:150])
+    ivf.add_many("u1", contents[:150], vectors[:150])
+    assert ivf.ivf_stats()["trained_users"] == 0  # below ivf_min_rows: exact search
+    for content, vector in zip(contents[150:], vectors[150:]):
+        exact.add("u1", content, vector)
+        ivf.add("u1", content, vector)
+
+    stats = ivf.ivf_stats()
+    assert stats["trained_users"] == 1 and stats["retrains"] >= 2  # trained at 200 rows, retrained at 400
+    for query in vectors[::40]:
+        assert ivf.search("u1", query, top_k=1) == exact.search("u1", query, top_k=1)
+
+
+def test_ivf_search_falls_back_to_exact_for_narrow_time_bounds():
+    index = LocalVectorIndex(nlist=4, nprobe=1, ivf_min_rows=8)
+    for i in range(16):
+        index.add("u1", f"msg-{i}", [1.0, float(i % 4)], created_at=1_000 + i)
+
+    assert index.search("u1", [0.0, 1.0], top_k=1, since_ms=1_015) == ["msg-15"]
+
+
+def test_per_user_cap_evicts_oldest_rows():
+    probe = LocalVectorIndex()
+    probe.add("u1", "x" * 10, [1.0] * 8)
+    index = LocalVectorIndex(max_user_bytes=probe.resident_bytes + 2_000)
+    for i in range(200):
+        index.add("u1", f"msg-{i:03d}", np.eye(8)[i % 8])
+
+    stats = index.budget_stats()
+    assert stats["resident_bytes"] <= index.max_user_bytes
+    assert stats["evicted_rows"] == stats["dropped_rows"] > 0
+    assert index.count("u1") == 200 - stats["evicted_rows"]
+    kept = index.search("u1", np.eye(8)[7], top_k=200)
+    assert "msg-199" in kept and "msg-007" not in kept  # oldest rows go first
+
+
+def test_global_budget_spills_least_recently_used_users(tmp_path):
+    from app.services.memory.local_store import PersistentVectorStore
+
+    spill = PersistentVectorStore(str(tmp_path), dim=4)
+    index = LocalVectorIndex(max_bytes=2_500, spill=spill)
+    for user in ("u1", "u2", "u3"):
+        index.add_many(user, [f"{user}-{i}" for i in range(8)], np.eye(4)[np.arange(8) % 4], created_at=1_000)
+        index.search("u1", [1.0, 0.0, 0.0, 0.0])  # keep u1 hot
+
+    stats = index.budget_stats()
+    assert stats["resident_bytes"] <= 2_500
+    assert stats["evicted_users"] == 1 and stats["spilled_rows"] == stats["evicted_rows"] > 0
+    assert index.count("u2") == 0 and spill.count("u2") == 8  # u2 was least recently used
+    assert index.search("u2", [0.0, 1.0, 0.0, 0.0], top_k=2) == ["u2-1", "u2-5"]  # still searchable from disk
+
+    index.drop_user("u2")
+    assert spill.count("u2") == 0
+    spill.close()
+
+
+def test_search_is_safe_while_the_user_budget_evicts_rows():
+    index = LocalVectorIndex(nlist=4, ivf_min_rows=32, max_user_bytes=60_000)
+    rng = np.random.default_rng(7)
+    index.add_many("u1", [f"seed {i}" for i in range(64)], rng.normal(size=(64, 32)))
+    query = rng.normal(size=32)
+    errors = []
+    done = threading.Event()
+
+    def reader():
+        while not done.is_set():
+            try:
+                index.search_hits("u1", query, top_k=5)
+            except Exception as exc:  # pragma: no cover - the failure being guarded against
+                errors.append(exc)
+
+    readers = [threading.Thread(target=reader) for _ in range(3)]
+    for thread in readers:
+        thread.start()
+    for i in range(300):
+        index.add_many("u1", [f"row {i}-{j}" for j in range(4)], rng.normal(size=(4, 32)))
+    done.set()
+    for thread in readers:
+        thread.join()
+    assert errors == []
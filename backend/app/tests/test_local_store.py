@@ -0,0 +1,92 @@
+import os
+
+import numpy as np
+
+from app.services.memory.local_store import RECORD_DTYPE, PersistentVectorStore
+from app.services.memory.milvus_client import MilvusClient
+
+
+def test_persistent_store_survives_reopen(tmp_path):
+    store = PersistentVectorStore(str(tmp_path), dim=3, initial_rows=2)
+    store.add("u1", "cats", [1.0, 0.0, 0.0], {"k": "v"}, created_at=1_000)
+    store.add_many("u1", ["dogs", "mostly cats"], np.array([[0.0, 1.0, 0.0], [0.9, 0.1, 0.0]]), created_at=2_000)
+    store.add("u2", "other user", [1.0, 0.0, 0.0])
+    store.close()
+
+    reopened = PersistentVectorStore(str(tmp_path), dim=3)
+    assert len(reopened) == 4
+    assert reopened.search("u1", [1.0, 0.0, 0.0], top_k=2) == ["cats", "mostly cats"]
+    assert reopened.search("u1", [1.0, 0.0, 0.0], top_k=3, since_ms=2_000) == ["mostly cats", "dogs"]
+    [hit] = reopened.search_hits("u1", [1.0, 0.0, 0.0], top_k=1)
+    assert (hit.id, hit.content, hit.created_at) == (0, "cats", 1_000)
+    assert reopened.search("u2", [1.0, 0.0, 0.0]) == ["other user"]
+
+    reopened.add("u1", "birds", [0.0, 0.0, 1.0])
+    assert reopened.search("u1", [0.0, 0.0, 1.0], top_k=1) == ["birds"]
+    reopened.close()
+
+
+def test_persistent_store_drop_user_erases_content(tmp_path):
+    store = PersistentVectorStore(str(tmp_path), dim=2)
+    store.add("u1", "secret diary entry", [1.0, 0.0])
+    store.add("u2", "keep me", [1.0, 0.0])
+    store.drop_user("u1")
+    store.close()
+
+    assert b"secret diary entry" not in (tmp_path / "content.log").read_bytes()
+    reopened = PersistentVectorStore(str(tmp_path), dim=2)
+    assert reopened.search("u1", [1.0, 0.0]) == []
+    assert reopened.search("u2", [1.0, 0.0]) == ["keep me"]
+    reopened.close()
+
+
+def test_persistent_store_ignores_torn_record(tmp_path):
+    store = PersistentVectorStore(str(tmp_path), dim=2)
+    store.add("u1", "committed", [1.0, 0.0])
+    store.close()
+    with open(tmp_path / "records.bin", "ab") as handle:
+        handle.write(b"\x00" * (RECORD_DTYPE.itemsize // 2))
+
+    reopened = PersistentVectorStore(str(tmp_path), dim=2)
+    assert len(reopened) == 1
+    assert os.path.getsize(tmp_path / "records.bin") == RECORD_DTYPE.itemsize
+    reopened.add("u1", "after restart", [0.0, 1.0])
+    assert reopened.search("u1", [0.0, 1.0], top_k=1) == ["after restart"]
+    reopened.close()
+
+
+def test_milvus_client_fallback_persists_with_path(tmp_path):
+    def client() -> MilvusClient:
+        return MilvusClient(
+            host="localhost",
+            port=19530,
+            user="root",
+            password="Milvus",
+            database="default",
+            collection="chat_history",
+            dim=2,
+            local_store_path=str(tmp_path),
+        )
+
+    first = client()
+    first.upsert("u1", "remember this", [0.6, 0.8])
+    first.close()
+
+    assert client().search("u1", [0.6, 0.8], top_k=1) == ["remember this"]
+
+
+def test_persistent_store_quantized_search_reranks_in_float32(tmp_path):
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((50, 16)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    store = PersistentVectorStore(str(tmp_path), dim=16, vector_dtype="int8", rerank=4)
+    store.add_many("u1", [f"msg-{i}" for i in range(40)], vectors[:40], created_at=1_000)
+    assert store.nbytes == 0  # quantized copy is built on first search
+
+    [hit] = store.search_hits("u1", vectors[3], top_k=1)
+    assert hit.content == "msg-3" and abs(hit.score - 1.0) < 1e-5  # exact float32 score after re-rank
+    assert store.nbytes == 40 * (16 + 4)
+
+    store.add_many("u1", [f"msg-{i}" for i in range(40, 50)], vectors[40:], created_at=2_000)
+    assert store.search("u1", vectors[45], top_k=1, since_ms=2_000) == ["msg-45"]
+    store.close()
@@ -1,6 +1,9 @@
+import threading
+import time
 import types
 
 import app.services.memory.memori_client as mc
+from app.services.memory.cache import TTLCache
 
 
 class FakeMemori:
@@ -60,3 +63,74 @@ def test_memori_client_uses_sdk(monkeypatch):
 
     client.reset_user("u1")
     assert client._client.resets == ["u1"]  # type: ignore[union-attr]
+
+
+def test_memori_queries_are_cached_and_invalidated(monkeypatch):
+    monkeypatch.setattr(mc, "Memori", FakeMemori)
+    client = mc.MemoriClient(project_id="p3", api_key="key", endpoint="http://local")
+    sdk = client._client
+
+    assert "Ada" in client.query_profile("u1")
+    assert "Ada" in client.query_profile("u1")
+    client.query_recent_facts("u1")
+    client.query_recent_facts("u1")
+    assert len(sdk.queries) == 2  # type: ignore[union-attr]
+
+    client.save_note("u1", "new fact")
+    client.query_profile("u1")
+    assert len(sdk.queries) == 3  # type: ignore[union-attr]
+
+    client.reset_user("u1")
+    client.query_recent_facts("u1")
+    assert len(sdk.queries) == 4  # type: ignore[union-attr]
+
+    stats = client.cache_stats()
+    assert stats["hits"] == 2
+    assert stats["misses"] == 4
+
+
+def test_ttl_cache_serves_stale_while_revalidating():
+    now = [0.0]
+    refreshed = threading.Event()
+    cache = TTLCache(maxsize=2, ttl=10.0, stale_ttl=30.0, clock=lambda: now[0])
+    values = iter(["v1", "v2"])
+
+    def loader():
+        value = next(values)
+        if value == "v2":
+            refreshed.set()
+        return value
+
+    assert cache.get_or_load("k", loader) == "v1"
+    now[0] = 15.0
+    assert cache.get_or_load("k", loader) == "v1"  # stale value returned immediately
+    assert refreshed.wait(1.0)
+    for _ in range(100):
+        if cache.stats()["refreshes"]:
+            break
+        time.sleep(0.01)
+    assert cache.get_or_load("k", loader) == "v2"
+
+    now[0] = 100.0
+    cache.get_or_load("a", lambda: 1)
+    cache.get_or_load("b", lambda: 2)
+    assert cache.stats()["evictions"] == 1
+    cache.close()
+    assert cache._executor is None
+
+
+def test_ttl_cache_invalidation_only_discards_loads_of_that_key():
+    cache = TTLCache(maxsize=8, ttl=10.0)
+
+    def load_racing_invalidation(key, invalidated):
+        def loader():
+            cache.invalidate(invalidated)  # a write lands while this load is in flight
+            return "loaded"
+
+        return cache.get_or_load(key, loader)
+
+    load_racing_invalidation(("u1", "profile"), ("u2", "profile"))
+    load_racing_invalidation(("u3", "profile"), ("u3", "profile"))
+    assert cache.stats()["size"] == 1  # u1 was stored, u3's now-stale load was dropped
+    cache.clear()
+    assert cache.get_or_load(("u3", "profile"), lambda: "fresh") == "fresh" and cache.stats()["size"] == 1
@@ -14,7 +14,7 @@ class StubMemoryService(MemoryService):
         pass
 
     def health_check(self) -> dict:  # type: ignore[override]
-        return {"memori": True, "milvus": False, "embedder": "stubbed"}
+        return {"memori": True, "milvus": False, "embedder": "stubbed", "write_dedup": {"mode": "skip"}}
 
 
 @pytest.fixture(autouse=True)
@@ -28,4 +28,4 @@ def test_memory_health_endpoint():
     client = TestClient(app)
     resp = client.get("/api/v1/memory/health")
     assert resp.status_code == 200
-    assert resp.json() == {"memori": True, "milvus": False, "embedder": "stubbed"}
+    assert resp.json() == {"memori": True, "milvus": False, "embedder": "stubbed", "write_dedup": {"mode": "skip"}}
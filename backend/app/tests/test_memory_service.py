@@ -1,8 +1,19 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+import numpy as np
 import pytest
 
+import app.services.memory.memory_service as ms
+from app.services.memory.embedders import embed_many
+from app.services.memory.hits import SearchHit, select_hits
 from app.services.memory.memori_client import MemoriClient
 from app.services.memory.memory_service import MemoryService, build_default_embedder
 from app.services.memory.milvus_client import MilvusClient
+from app.utils.time import to_epoch_ms, utc_now
 
 
 def test_memory_service_records_and_retrieves():
@@ -28,3 +39,367 @@ def test_memory_service_records_and_retrieves():
 def test_placeholder_embedder_is_deterministic(model: str):
     embed = build_default_embedder(model)
     assert embed("same text") == embed("same text")
+
+
+def test_async_surface_offloads_to_executor():
+    memori = MemoriClient(project_id="demo", api_key="", endpoint="http://localhost")
+    milvus = MilvusClient(
+        host="localhost",
+        port=19530,
+        user="root",
+        password="Milvus",
+        database="default",
+        collection="chat_history",
+    )
+    service = MemoryService(memori_client=memori, milvus_client=milvus, max_workers=2)
+    threads: list[str] = []
+
+    def tracking(fn):
+        def wrapper(*args, **kwargs):
+            threads.append(threading.current_thread().name)
+            return fn(*args, **kwargs)
+
+        return wrapper
+
+    # The branches the concurrent retrieval path actually runs, plus the write and reset paths.
+    memori.query_profile = tracking(memori.query_profile)  # type: ignore[method-assign]
+    memori.query_recent_facts = tracking(memori.query_recent_facts)  # type: ignore[method-assign]
+    for name in ("_search_similar", "_tiered_search", "record_user_message", "reset_user"):
+        setattr(service, name, tracking(getattr(service, name)))
+
+    async def scenario():
+        await service.arecord_user_message("u1", "hello async world")
+        context = await service.aretrieve_context("u1", "hello")
+        await service.areset_user("u1")
+        return context, await service.aretrieve_context("u1", "hello")
+
+    context, after_reset = asyncio.run(scenario())
+    service.close()
+
+    assert context.milvus_chunks == ["hello async world"]
+    assert context.stats["retrieval"] == "concurrent"
+    assert after_reset.milvus_chunks == []
+    assert len(threads) >= 2 * 3 + 2
+    assert all(name.startswith("memory-io") for name in threads)
+
+
+class SlowMemori(MemoriClient):
+    def __init__(self, delay: float) -> None:
+        self.delay = delay
+
+    def query_profile(self, user_id: str) -> str:
+        time.sleep(self.delay)
+        return "profile"
+
+    def query_recent_facts(self, user_id: str) -> str:
+        time.sleep(self.delay)
+        return "facts"
+
+
+@pytest.mark.parametrize("concurrent", [True, False])
+def test_retrieval_fan_out_records_branch_timings(concurrent: bool):
+    milvus = MilvusClient(
+        host="localhost",
+        port=19530,
+        user="root",
+        password="Milvus",
+        database="default",
+        collection="chat_history",
+    )
+    service = MemoryService(
+        memori_client=SlowMemori(delay=0.05),
+        milvus_client=milvus,
+        concurrent_retrieval=concurrent,
+    )
+
+    context = asyncio.run(service.aretrieve_context("u1", "hello"))
+    service.close()
+
+    timings = context.stats["timings_ms"]
+    assert set(timings) == {"memori_profile", "memori_facts", "milvus", "total"}
+    assert context.stats["retrieval"] == ("concurrent" if concurrent else "sequential")
+    if concurrent:
+        assert timings["total"] < timings["memori_profile"] + timings["memori_facts"]
+    else:
+        assert timings["total"] >= timings["memori_profile"] + timings["memori_facts"]
+
+
+def test_record_user_messages_embeds_once_and_writes_in_bulk():
+    calls: list[list[str]] = []
+
+    def embed(text: str) -> list[float]:
+        return [1.0, float(len(text))]
+
+    def embed_batch(texts):
+        calls.append(list(texts))
+        return np.array([embed(text) for text in texts], dtype=np.float32)
+
+    embed.embed_many = embed_batch  # type: ignore[attr-defined]
+    memori = MemoriClient(project_id="demo", api_key="", endpoint="http://localhost")
+    milvus = MilvusClient(
+        host="localhost",
+        port=19530,
+        user="root",
+        password="Milvus",
+        database="default",
+        collection="chat_history",
+    )
+    service = MemoryService(memori_client=memori, milvus_client=milvus, embedder=embed)
+
+    count = service.record_user_messages("u1", [("hi", None), ("see you tomorrow", {"k": 1}), ("bye", None)])
+    service.close()
+
+    assert count == 3
+    assert calls == [["hi", "see you tomorrow", "bye"]]
+    assert milvus._local_store.count("u1") == 3
+
+
+def test_embed_many_falls_back_to_single_calls():
+    matrix = embed_many(lambda text: [float(len(text))] * len(text), ["ab", "abc"])
+    assert matrix.shape == (2, 3)
+    assert matrix[0].tolist() == [2.0, 2.0, 0.0]
+
+
+def test_two_tier_retrieval_widens_only_on_weak_recent_hits():
+    memori = MemoriClient(project_id="demo", api_key="", endpoint="http://localhost")
+    milvus = MilvusClient(
+        host="localhost",
+        port=19530,
+        user="root",
+        password="Milvus",
+        database="default",
+        collection="chat_history",
+    )
+    service = MemoryService(
+        memori_client=memori,
+        milvus_client=milvus,
+        top_k=1,
+        recent_window=timedelta(days=1),
+        recent_min_score=0.5,
+    )
+    old = to_epoch_ms(utc_now() - timedelta(days=30))
+    older = "my sister Lena lives in Berlin"
+    milvus._local_store.add("u1", older, service.embed(older), created_at=old)
+    service.record_user_message("u1", "what should we cook tonight")
+
+    strong = service.retrieve_context("u1", "cook tonight")
+    sparse = service.retrieve_context("u1", "cook tonight", top_k=3)  # fewer recent rows than top_k
+    weak = service.retrieve_context("u1", "where does Lena live")
+    bounded = service.retrieve_context("u1", "Lena", until=utc_now() - timedelta(days=7))
+    service.close()
+
+    assert strong.stats["milvus_tier"] == "recent"
+    assert strong.milvus_chunks == ["what should we cook tonight"]
+    assert sparse.stats["milvus_tier"] == "recent"
+    assert weak.stats["milvus_tier"] == "full"
+    assert weak.milvus_chunks == ["my sister Lena lives in Berlin"]
+    assert bounded.stats["milvus_tier"] == "bounded"
+    assert bounded.milvus_chunks == ["my sister Lena lives in Berlin"]
+
+
+def test_recent_tier_bound_is_floored_to_the_minute(monkeypatch):
+    memori = MemoriClient(project_id="demo", api_key="", endpoint="http://localhost")
+    milvus = MilvusClient(
+        host="localhost", port=19530, user="root", password="Milvus", database="default", collection="chat_history"
+    )
+    service = MemoryService(memori_client=memori, milvus_client=milvus, recent_window=timedelta(hours=1))
+    bounds = []
+    search_hits = milvus.search_hits
+
+    def tracking_search(user_id, embedding, top_k=5, since=None, until=None, with_vectors=False):
+        bounds.append(since)
+        return search_hits(user_id, embedding, top_k, since, until, with_vectors)
+
+    milvus.search_hits = tracking_search  # type: ignore[method-assign]
+    start = utc_now().replace(second=5, microsecond=123)
+    for offset in (0, 40):
+        monkeypatch.setattr(ms, "utc_now", lambda: start + timedelta(seconds=offset))
+        service.retrieve_context("u1", "hello")
+    service.close()
+
+    recent = [since for since in bounds if since is not None]
+    assert recent == [start.replace(second=0, microsecond=0) - timedelta(hours=1)] * 2
+
+
+def test_select_hits_applies_absolute_and_relative_floors():
+    hits = [SearchHit(id=i, score=score, content=str(score)) for i, score in enumerate([0.9, 0.5, 0.3, 0.1])]
+
+    assert [hit.score for hit in select_hits(hits, top_k=3)] == [0.9, 0.5, 0.3]
+    assert [hit.score for hit in select_hits(hits, top_k=4, min_score=0.25)] == [0.9, 0.5, 0.3]
+    assert [hit.score for hit in select_hits(hits, top_k=4, relative_score=0.5)] == [0.9, 0.5]
+    assert select_hits(hits, top_k=4, min_score=0.95) == []
+
+
+def test_retrieve_context_drops_weak_hits_from_prompt():
+    memori = MemoriClient(project_id="demo", api_key="", endpoint="http://localhost")
+    milvus = MilvusClient(
+        host="localhost",
+        port=19530,
+        user="root",
+        password="Milvus",
+        database="default",
+        collection="chat_history",
+    )
+    service = MemoryService(memori_client=memori, milvus_client=milvus, top_k=3, min_score=0.2)
+    service.record_user_message("u1", "we adopted a cat named Miso")
+    service.record_user_message("u1", "quarterly tax filing deadline")
+
+    context = service.retrieve_context("u1", "tell me about our cat Miso")
+    loose = service.retrieve_context("u1", "tell me about our cat Miso", min_score=-1.0)
+    capped = service.retrieve_context("u1", "tell me about our cat Miso", top_k=1, min_score=-1.0)
+    service.close()
+
+    assert context.milvus_chunks == ["we adopted a cat named Miso"]
+    assert context.hits[0].score >= 0.2 and context.hits[0].created_at is not None
+    assert context.stats["milvus_candidates"] == 2
+    assert len(loose.milvus_chunks) == 2
+    assert capped.milvus_chunks == ["we adopted a cat named Miso"]
+
+
+def test_write_dedup_merges_repeats_into_the_stored_row():
+    memori = MemoriClient(project_id="demo", api_key="", endpoint="http://localhost")
+    milvus = MilvusClient(
+        host="localhost", port=19530, user="root", password="Milvus", database="default", collection="chat_history"
+    )
+    calls = []
+
+    def embed(text):
+        calls.append(text)
+        return build_default_embedder("test")(text)
+
+    service = MemoryService(memori_client=memori, milvus_client=milvus, embedder=embed, dedup_mode="merge")
+
+    assert service.record_user_message("u1", "we adopted a cat named Miso")
+    assert not service.record_user_message("u1", "We adopted a cat named Miso!")
+    assert calls == ["we adopted a cat named Miso"]  # exact repeats are caught before embedding
+    assert service.record_user_messages("u1", [("we adopted a cat named miso", None), ("new fact", None)]) == 1
+    assert milvus._local_store.count("u1") == 2
+
+    [hit] = milvus.search_hits("u1", embed("cat named Miso"), top_k=1)
+    rows = milvus._local_store._users["u1"]
+    assert hit.content == "we adopted a cat named Miso" and rows.metadata[0]["repeats"] == 3
+    assert service.health_check()["write_dedup"]["exact"] == 2
+
+
+def test_write_dedup_does_not_suppress_the_retry_of_a_failed_write(monkeypatch):
+    memori = MemoriClient(project_id="demo", api_key="", endpoint="http://localhost")
+    milvus = MilvusClient(
+        host="localhost", port=19530, user="root", password="Milvus", database="default", collection="chat_history"
+    )
+    service = MemoryService(memori_client=memori, milvus_client=milvus, dedup_mode="skip")
+    original = milvus.upsert
+
+    def failing_upsert(**kwargs):
+        monkeypatch.setattr(milvus, "upsert", original)
+        raise RuntimeError("milvus unavailable")
+
+    monkeypatch.setattr(milvus, "upsert", failing_upsert)
+    with pytest.raises(RuntimeError):
+        service.record_user_message("u1", "dinner at 7")
+    assert service.record_user_message("u1", "dinner at 7")
+    assert service.record_user_message("u1", "dinner at 8")  # a corrected fact is kept
+    assert not service.record_user_message("u1", "Dinner at 8!")
+    assert milvus._local_store.count("u1") == 2
+
+
+def test_hybrid_retrieval_fuses_exact_term_matches():
+    memori = MemoriClient(project_id="demo", api_key="", endpoint="http://localhost")
+    milvus = MilvusClient(
+        host="localhost", port=19530, user="root", password="Milvus", database="default", collection="chat_history"
+    )
+    service = MemoryService(memori_client=memori, milvus_client=milvus, top_k=2, hybrid_search=True)
+    service.record_user_messages(
+        "u1",
+        [("my dentist appointment is on 2024-05-14", None), ("dinner plans with friends", None), ("movie night", None)],
+    )
+
+    context = service.retrieve_context("u1", "what happened on 2024-05-14?")
+    assert context.milvus_chunks[0] == "my dentist appointment is on 2024-05-14"
+    assert context.stats["lexical_hits"] == 1 and "bm25" in context.stats["timings_ms"]
+
+    service.reset_user("u1")
+    assert service.lexical.search("u1", "dentist") == []
+
+
+def test_bm25_index_is_rebuilt_from_the_store_after_a_restart(tmp_path):
+    def open_service():
+        memori = MemoriClient(project_id="demo", api_key="", endpoint="http://localhost")
+        milvus = MilvusClient(
+            host="localhost",
+            port=19530,
+            user="root",
+            password="Milvus",
+            database="default",
+            collection="chat_history",
+            local_store_path=str(tmp_path),
+        )
+        return MemoryService(memori_client=memori, milvus_client=milvus, top_k=2, hybrid_search=True), milvus
+
+    service, milvus = open_service()
+    service.record_user_messages("u1", [("my passport number is X1234567", None), ("dinner plans", None)])
+    milvus.close()
+
+    service, _ = open_service()  # a fresh process: the BM25 index starts empty
+    context = asyncio.run(service.aretrieve_context("u1", "X1234567"))
+    assert context.milvus_chunks[0] == "my passport number is X1234567"
+    assert context.stats["bm25_scores"] and "bm25" in context.stats["timings_ms"]
+    service.record_user_message("u1", "renewed passport X7654321")
+    assert service.lexical.search("u1", "X7654321")[0].content == "renewed passport X7654321"
+
+
+def test_bm25_rebuild_does_not_block_other_users_and_is_lru_capped():
+    memori = MemoriClient(project_id="demo", api_key="", endpoint="http://localhost")
+    milvus = MilvusClient(
+        host="localhost", port=19530, user="root", password="Milvus", database="default", collection="chat_history"
+    )
+    service = MemoryService(memori_client=memori, milvus_client=milvus, hybrid_search=True, bm25_max_users=2)
+    for user in ("u1", "u2", "u3"):
+        service.record_user_message(user, f"{user} likes sailing")
+    started, release = threading.Event(), threading.Event()
+    documents = milvus.user_documents
+
+    def slow_documents(user_id, limit=0):
+        docs = documents(user_id, limit)  # snapshot taken before the write below
+        if user_id == "u1":
+            started.set()
+            release.wait(5)
+        return docs
+
+    milvus.user_documents = slow_documents  # type: ignore[method-assign]
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        rebuilds = [pool.submit(service._lexical_search, "u1", "sailing", None, None, 5) for _ in range(2)]
+        assert started.wait(5)
+        service.record_user_message("u2", "u2 also likes rowing")  # not stalled by u1's rebuild
+        assert service._lexical_search("u2", "rowing", None, None, 5)[0].content == "u2 also likes rowing"
+        service.record_user_message("u1", "u1 bought a kayak")  # lands while u1 is loading
+        release.set()
+        assert all(len(rebuild.result(5)) == 1 for rebuild in rebuilds)
+
+    assert service._lexical_search("u1", "kayak", None, None, 5)[0].content == "u1 bought a kayak"
+    assert service.lexical.stats()["users"] == 2
+    service._lexical_search("u3", "sailing", None, None, 5)
+    assert list(service._lexical_users) == ["u1", "u3"]  # u2 was least recently searched
+    assert service.lexical.search("u2", "rowing") == []
+
+
+def test_mmr_keeps_near_duplicate_messages_out_of_the_prompt():
+    memori = MemoriClient(project_id="demo", api_key="", endpoint="http://localhost")
+    milvus = MilvusClient(
+        host="localhost", port=19530, user="root", password="Milvus", database="default", collection="chat_history"
+    )
+    vectors = {
+        "I love hiking in the alps": [1.0, 0.0, 0.0],
+        "i love hiking in the alps!!": [0.99, 0.1, 0.0],
+        "hiking boots need new laces": [0.7, 0.0, 0.7],
+        "what do I love": [1.0, 0.05, 0.2],
+    }
+    service = MemoryService(
+        memori_client=memori, milvus_client=milvus, embedder=vectors.__getitem__, top_k=2, relative_score=0.0
+    )
+    service.record_user_messages("u1", [(text, None) for text in list(vectors)[:3]])
+    assert service.retrieve_context("u1", "what do I love").milvus_chunks[1] == "i love hiking in the alps!!"
+
+    service.mmr_lambda = 0.5
+    context = service.retrieve_context("u1", "what do I love")
+    assert context.milvus_chunks == ["I love hiking in the alps", "hiking boots need new laces"]
+    assert context.stats["mmr"] and context.stats["milvus_candidates"] == 3
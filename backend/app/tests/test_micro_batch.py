@@ -0,0 +1,81 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from app.services.memory.memori_client import MemoriClient
+from app.services.memory.memory_service import MemoryService
+from app.services.memory.micro_batch import MicroBatchEmbedder
+from app.services.memory.milvus_client import MilvusClient
+
+
+class BatchCounter:
+    def __init__(self, fail: bool = False) -> None:
+        self.batches: list[list[str]] = []
+        self.fail = fail
+
+    def __call__(self, text: str) -> list[float]:
+        return self.embed_many([text])[0].tolist()
+
+    def embed_many(self, texts):
+        self.batches.append(list(texts))
+        if self.fail:
+            raise RuntimeError("provider down")
+        return np.array([[float(len(text)), 1.0] for text in texts], dtype=np.float32)
+
+
+def test_concurrent_calls_share_one_batch():
+    inner = BatchCounter()
+    batcher = MicroBatchEmbedder(inner, window_ms=20, max_batch=64)
+
+    async def scenario():
+        return await asyncio.gather(*(batcher.embed("x" * n) for n in range(1, 6)))
+
+    results = asyncio.run(scenario())
+    assert results == [[float(n), 1.0] for n in range(1, 6)]
+    assert len(inner.batches) == 1
+    stats = batcher.stats()
+    assert stats["batches"] == 1 and stats["items"] == 5
+    assert stats["batch_sizes"] == {"<=8": 1}
+
+
+def test_max_batch_dispatches_early_and_errors_propagate():
+    inner = BatchCounter()
+    batcher = MicroBatchEmbedder(inner, window_ms=1000, max_batch=2)
+
+    async def scenario():
+        return await asyncio.wait_for(asyncio.gather(batcher.embed("a"), batcher.embed("bb")), timeout=0.5)
+
+    assert asyncio.run(scenario()) == [[1.0, 1.0], [2.0, 1.0]]
+
+    failing = MicroBatchEmbedder(BatchCounter(fail=True), window_ms=1)
+    with pytest.raises(RuntimeError):
+        asyncio.run(failing.embed("boom"))
+    assert failing.stats()["errors"] == 1
+
+
+def test_memory_service_routes_concurrent_queries_through_batcher():
+    memori = MemoriClient(project_id="demo", api_key="", endpoint="http://localhost")
+    milvus = MilvusClient(
+        host="localhost",
+        port=19530,
+        user="root",
+        password="Milvus",
+        database="default",
+        collection="chat_history",
+    )
+    service = MemoryService(memori_client=memori, milvus_client=milvus, embed_batch_window_ms=20)
+
+    async def scenario():
+        await service.arecord_user_message("u1", "we adopted a cat named Miso")
+        return await asyncio.gather(
+            service.aretrieve_context("u1", "what is my cat called"),
+            service.aretrieve_context("u1", "tell me about Miso"),
+        )
+
+    first, second = asyncio.run(scenario())
+    service.close()
+
+    assert first.milvus_chunks == second.milvus_chunks == ["we adopted a cat named Miso"]
+    assert service.batcher is not None
+    assert service.batcher.stats()["batches"] == 2  # one write, one coalesced pair of queries
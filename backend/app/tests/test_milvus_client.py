@@ -1,4 +1,14 @@
+import threading
+import time
+import types
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import app.services.memory.milvus_client as mc
+import app.services.memory.milvus_pool as mp
 from app.services.memory.milvus_client import MilvusClient
+from app.services.memory.milvus_pool import MilvusConnectionPool
 
 
 def test_milvus_client_fallback_store():
@@ -17,7 +27,341 @@ def test_milvus_client_fallback_store():
     client.upsert("u2", "other user", [0.5])
 
     hits = client.search("u1", [0.2], top_k=1)
-    assert hits == ["later message"]  # most recent
+    assert hits == ["later message"]  # closest by cosine once padded to the user's dim
 
     client.drop_user("u1")
     assert client.search("u1", [0.1]) == []
+
+
+class FakeCollection:
+    def __init__(self, fail_times: int = 0) -> None:
+        self.inserts = []
+        self.flushes = 0
+        self.deletes = []
+        self.fail_times = fail_times
+
+    def insert(self, columns) -> None:
+        if self.fail_times:
+            self.fail_times -= 1
+            raise RuntimeError("milvus unavailable")
+        self.inserts.append(columns)
+
+    def flush(self) -> None:
+        self.flushes += 1
+
+    def delete(self, expr: str) -> None:
+        self.deletes.append(expr)
+
+
+def _core(inserts):
+    """Drop the created_at/metadata columns so assertions focus on user_id, content and vector."""
+    return [[columns[0], columns[1], columns[4]] for columns in inserts]
+
+
+def _buffered_client(monkeypatch, collection: FakeCollection, **kwargs) -> MilvusClient:
+    monkeypatch.setattr(mc, "Collection", object)
+    client = MilvusClient(
+        host="localhost",
+        port=19530,
+        user="root",
+        password="Milvus",
+        database="default",
+        collection="chat_history",
+        **kwargs,
+    )
+    client._collection_handle = collection
+    return client
+
+
+def test_upsert_buffers_and_bulk_inserts(monkeypatch):
+    collection = FakeCollection()
+    client = _buffered_client(monkeypatch, collection, insert_batch_size=3, flush_interval=0)
+
+    client.upsert("u1", "a", [0.1])
+    client.upsert("u1", "b", [0.2])
+    assert collection.inserts == [] and client.pending_count == 2
+
+    client.upsert("u2", "c", [0.3])
+    assert _core(collection.inserts) == [[["u1", "u1", "u2"], ["a", "b", "c"], [[0.1], [0.2], [0.3]]]]
+    assert collection.inserts[0][3] == [{}, {}, {}]
+    assert all(isinstance(ts, int) for ts in collection.inserts[0][2])
+    assert collection.flushes == 0
+
+    client.upsert("u1", "d", [0.4])
+    client.close()
+    assert _core(collection.inserts)[-1] == [["u1"], ["d"], [[0.4]]]
+    assert collection.flushes == 1
+    assert client.pending_count == 0
+
+
+def test_failed_bulk_insert_is_requeued(monkeypatch):
+    collection = FakeCollection(fail_times=1)
+    client = _buffered_client(monkeypatch, collection, insert_batch_size=2, flush_interval=0)
+
+    client.upsert("u1", "a", [0.1])
+    client.upsert("u1", "b", [0.2])
+    assert client.pending_count == 2
+
+    client.drop_user("u1")
+    assert client.pending_count == 0
+
+    client.upsert("u2", "c", [0.3])
+    client.flush()
+    assert _core(collection.inserts) == [[["u2"], ["c"], [[0.3]]]]
+    assert collection.deletes == ['user_id == "u1"']
+
+
+def test_drop_user_waits_for_an_in_flight_insert(monkeypatch):
+    collection = FakeCollection()
+    client = _buffered_client(monkeypatch, collection, insert_batch_size=8, flush_interval=0)
+    started, release, events = threading.Event(), threading.Event(), []
+    insert = collection.insert
+
+    def slow_insert(columns):
+        started.set()
+        release.wait(5)
+        insert(columns)
+        events.append("insert")
+
+    collection.insert = slow_insert
+    collection.delete = lambda expr: events.append("delete")
+    client.upsert("u1", "a", [0.1])
+    drain = threading.Thread(target=client.flush)
+    drain.start()
+    assert started.wait(5)
+    dropper = threading.Thread(target=client.drop_user, args=("u1",))
+    dropper.start()
+    dropper.join(0.1)
+    assert dropper.is_alive()  # blocked until the in-flight rows are in Milvus
+    release.set()
+    drain.join(5)
+    dropper.join(5)
+    assert events == ["insert", "delete"]
+
+
+class LimitedCollection(FakeCollection):
+    """Rejects any insert holding content longer than the schema allows, like Milvus does."""
+
+    def insert(self, columns) -> None:
+        if any(len(content.encode("utf-8")) > mc.MAX_CONTENT_BYTES for content in columns[1]):
+            raise RuntimeError("length of varchar field content exceeds max length")
+        super().insert(columns)
+
+
+def test_rejected_rows_are_dropped_without_blocking_the_buffer(monkeypatch):
+    collection = LimitedCollection()
+    client = _buffered_client(monkeypatch, collection, insert_batch_size=64, flush_interval=0)
+
+    client._enqueue([("u1", "x" * 5000, 0, {}, [0.1])])  # bypasses the cap in upsert
+    for i in range(50):
+        client.upsert(f"u{i % 3}", f"m{i}", [0.2])
+    client.flush()
+    assert sum(len(columns[1]) for columns in collection.inserts) == 50
+    assert client.pending_count == 0 and client.rejected_rows == 1
+
+
+def test_oversized_content_is_capped(monkeypatch):
+    collection = LimitedCollection()
+    client = _buffered_client(monkeypatch, collection, insert_batch_size=2, flush_interval=0)
+
+    client.upsert("u1", "é" * 3000, [0.1])
+    client.upsert_many("u1", ["y" * 3000], [[0.2]])
+    stored = collection.inserts[0][1]
+    assert [len(content.encode("utf-8")) for content in stored] == [2048, 2048]
+    assert stored[0] == "é" * 1024
+    assert client.rejected_rows == 0
+
+
+def test_upsert_many_inserts_column_wise(monkeypatch):
+    collection = FakeCollection()
+    client = _buffered_client(monkeypatch, collection, insert_batch_size=2, flush_interval=0)
+
+    client.upsert_many("u1", ["a", "b", "c"], [[0.1], [0.2], [0.3]])
+    client.flush()
+    assert _core(collection.inserts) == [
+        [["u1", "u1"], ["a", "b"], [[0.1], [0.2]]],
+        [["u1"], ["c"], [[0.3]]],
+    ]
+
+
+class FakeHit:
+    def __init__(self, content: str, distance: float = 1.0, id: int = 0, created_at: int = 0) -> None:
+        self.id = id
+        self.entity = {"content": content, "created_at": created_at}
+        self.distance = distance
+
+
+class SearchableCollection(FakeCollection):
+    def __init__(self) -> None:
+        super().__init__()
+        self.searches = []
+        self.loads = 0
+
+    def load(self) -> None:
+        self.loads += 1
+
+    def search(self, data, anns_field, param, limit, expr, output_fields):
+        self.searches.append((len(data), expr))
+        return [[FakeHit(f"{expr}:{vec[0]}")] for vec in data]
+
+
+def test_user_documents_reads_stored_and_buffered_rows(monkeypatch):
+    collection = FakeCollection()
+    queries = []
+
+    def query(expr, output_fields, limit):
+        queries.append((expr, limit))
+        return [{"content": "newer", "created_at": 20}, {"content": "older", "created_at": 10}]
+
+    collection.query = query
+    collection.load = lambda: None
+    client = _buffered_client(monkeypatch, collection, insert_batch_size=8, flush_interval=0)
+    client.upsert("u1", "buffered", [0.1])
+    client.upsert("u2", "other user", [0.1])
+
+    assert [doc[0] for doc in client.user_documents("u1", limit=2)] == ["newer", "buffered"]
+    assert queries == [('user_id == "u1"', 2)]
+
+
+def test_legacy_schema_inserts_only_known_columns(monkeypatch):
+    collection = FakeCollection()
+    collection.schema = types.SimpleNamespace(
+        fields=[types.SimpleNamespace(name=name, auto_id=False) for name in ("user_id", "content", "vector")]
+    )
+    client = _buffered_client(monkeypatch, collection, insert_batch_size=1, flush_interval=0)
+
+    client.upsert("u1", "a", [0.1], {"k": "v"})
+    assert collection.inserts == [[["u1"], ["a"], [[0.1]]]]
+
+
+def test_concurrent_searches_are_coalesced_per_filter(monkeypatch):
+    collection = SearchableCollection()
+    client = _buffered_client(monkeypatch, collection, search_batch_window_ms=50, search_batch_max=8)
+
+    release = threading.Event()
+    search = collection.search
+
+    def search_holding_u0(data, anns_field, param, limit, expr, output_fields):
+        if expr == 'user_id == "u0"':
+            release.wait(5)  # keeps one search in flight, so the leaders below wait for followers
+        return search(data, anns_field, param, limit, expr, output_fields)
+
+    collection.search = search_holding_u0
+    jobs = [("u1", 1.0), ("u1", 2.0), ("u1", 3.0), ("u2", 4.0)]
+    with ThreadPoolExecutor(max_workers=len(jobs) + 1) as pool:
+        held = pool.submit(client.search, "u0", [0.0], top_k=1)
+        while client.search_stats().get("batches", 0) < 1:
+            time.sleep(0.001)
+        results = list(pool.map(lambda job: client.search(job[0], [job[1]], top_k=1), jobs))
+        release.set()
+        held.result()
+
+    assert results == [[f'user_id == "{user}":{value}'] for user, value in jobs]
+    assert sorted(collection.searches)[-2:] == [(1, 'user_id == "u2"'), (3, 'user_id == "u1"')]
+    assert client.search_stats()["coalesced"] == 2
+
+
+def test_lone_search_is_not_delayed_by_the_batch_window(monkeypatch):
+    collection = SearchableCollection()
+    client = _buffered_client(monkeypatch, collection, search_batch_window_ms=2000, search_batch_max=8)
+
+    started = time.perf_counter()
+    assert client.search("u1", [1.0], top_k=1) == ['user_id == "u1":1.0']
+    assert time.perf_counter() - started < 1.0
+    assert client.search_stats()["unwaited"] == 1
+
+
+class SchemaCountingCollection(SearchableCollection):
+    def __init__(self) -> None:
+        super().__init__()
+        self.schema_reads = 0
+
+    @property
+    def schema(self):
+        self.schema_reads += 1
+        return types.SimpleNamespace(
+            fields=[types.SimpleNamespace(name=name, auto_id=False) for name in ("user_id", "content", "vector")]
+        )
+
+
+def test_collection_is_loaded_once_and_schema_read_once(monkeypatch):
+    collection = SchemaCountingCollection()
+    client = _buffered_client(monkeypatch, collection, insert_batch_size=1, flush_interval=0)
+    for value in (1.0, 2.0, 3.0):
+        client.upsert("u1", "a", [value])
+        client.search("u1", [value], top_k=1)
+
+    assert collection.loads == 1
+    assert collection.schema_reads == 1
+    assert len(collection.inserts) == 3
+
+
+class FakeConnections:
+    def __init__(self) -> None:
+        self.connected = []
+        self.disconnected = []
+
+    def connect(self, alias, **kwargs) -> None:
+        self.connected.append(alias)
+
+    def disconnect(self, alias) -> None:
+        self.disconnected.append(alias)
+
+
+def test_pool_spreads_calls_and_reconnects_dropped_alias(monkeypatch):
+    fake_connections = FakeConnections()
+    monkeypatch.setattr(mp, "connections", fake_connections)
+    monkeypatch.setattr(mp, "Collection", lambda name, using: types.SimpleNamespace(name=name, using=using))
+    pool = MilvusConnectionPool("chat_history", {"host": "localhost"}, size=2)
+    pool.connect()
+    assert fake_connections.connected == ["memory-0", "memory-1"]
+
+    assert [pool.run(lambda handle: handle.using) for _ in range(4)] == ["memory-0", "memory-1"] * 2
+
+    attempts = []
+
+    def flaky(handle):
+        attempts.append(handle)
+        if len(attempts) == 1:
+            raise RuntimeError("<MilvusException: (code=2, message=Fail connecting to server)>")
+        return handle.using
+
+    assert pool.run(flaky) == "memory-0"
+    assert pool.reconnects == 1
+    assert fake_connections.disconnected == ["memory-0"]
+    assert attempts[0] is not attempts[1]  # a fresh handle is bound to the new channel
+
+    def bad_expr(handle):
+        raise ValueError("bad expr")
+
+    with pytest.raises(ValueError):
+        pool.run(bad_expr)
+    assert pool.reconnects == 1  # only connection errors trigger a reconnect
+
+    inserts = []
+
+    def dropped_insert(handle):
+        inserts.append(handle)
+        raise RuntimeError("DEADLINE_EXCEEDED")
+
+    with pytest.raises(RuntimeError):
+        pool.run(dropped_insert, retry=False)
+    assert len(inserts) == 1 and pool.reconnects == 2  # reconnected, but never replayed
+
+
+def test_search_hits_carry_id_score_and_timestamp(monkeypatch):
+    class ScoredCollection(SearchableCollection):
+        def search(self, data, anns_field, param, limit, expr, output_fields):
+            self.output_fields = output_fields
+            return [[FakeHit("close", 0.9, id=7, created_at=1_000), FakeHit("far", 0.2, id=8, created_at=2_000)]]
+
+    collection = ScoredCollection()
+    client = _buffered_client(monkeypatch, collection)
+
+    hits = client.search_hits("u1", [0.1], top_k=2)
+    assert [(hit.id, hit.score, hit.content, hit.created_at) for hit in hits] == [
+        (7, 0.9, "close", 1_000),
+        (8, 0.2, "far", 2_000),
+    ]
+    assert collection.output_fields == ["content", "created_at"]
+    assert client.search("u1", [0.1], top_k=2) == ["close", "far"]
@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+
+from app.services.memory.local_index import LocalVectorIndex
+from app.services.memory.quantization import QuantizedRows, VectorCodec
+
+
+def _unit_rows(count: int, dim: int, seed: int = 0) -> np.ndarray:
+    vectors = np.random.default_rng(seed).standard_normal((count, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+@pytest.mark.parametrize("dtype, bytes_per_vector, tolerance", [("float16", 768, 2e-3), ("int8", 388, 2e-2)])
+def test_codec_scores_stay_close_to_float32(dtype, bytes_per_vector, tolerance):
+    vectors = _unit_rows(300, 384)
+    query = vectors[7]
+    rows = QuantizedRows(384, VectorCodec(dtype), capacity=4)
+    rows.extend(vectors[:100])
+    rows.extend(vectors[100:])
+
+    assert rows.nbytes == 300 * bytes_per_vector
+    np.testing.assert_allclose(rows.scores(query), vectors @ query, atol=tolerance)
+    np.testing.assert_allclose(rows.decode(np.array([7])), vectors[7:8], atol=tolerance)
+    assert int(np.argmax(rows.scores(query))) == 7
+
+
+def test_codec_rejects_unknown_dtype():
+    with pytest.raises(ValueError):
+        VectorCodec("bfloat16")
+
+
+def test_quantized_local_index_keeps_ranking():
+    vectors = _unit_rows(64, 32, seed=1)
+    exact = LocalVectorIndex()
+    compact = LocalVectorIndex(vector_dtype="int8")
+    contents = [f"msg-{i}" for i in range(64)]
+    exact.add_many("u1", contents, vectors)
+    compact.add_many("u1", contents, vectors)
+
+    assert compact.nbytes * 3 < exact.nbytes
+    for query in vectors[::8]:
+        assert compact.search("u1", query, top_k=1) == exact.search("u1", query, top_k=1)
@@ -0,0 +1,18 @@
+import numpy as np
+
+from app.services.memory.hits import SearchHit
+from app.services.memory.rerank import mmr_order, mmr_rerank
+
+
+def test_mmr_skips_near_duplicates_of_already_picked_rows():
+    vectors = np.array([[1.0, 0.0, 0.0], [0.999, 0.045, 0.0], [0.6, 0.0, 0.8]], dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    relevance = np.array([0.95, 0.94, 0.6], dtype=np.float32)
+
+    assert mmr_order(relevance, vectors, 2, lambda_=0.5).tolist() == [0, 2]
+    assert mmr_order(relevance, vectors, 2, lambda_=1.0).tolist() == [0, 1]  # pure relevance
+
+
+def test_mmr_rerank_falls_back_to_relevance_order_without_vectors():
+    hits = [SearchHit(i, 1.0 - i / 10, f"m{i}") for i in range(4)]
+    assert [hit.content for hit in mmr_rerank(hits, 2)] == ["m0", "m1"]
@@ -0,0 +1,51 @@
+from dataclasses import dataclass
+from typing import Optional
+
+import httpx
+
+HEALTH_TIMEOUT = 5.0  # seconds for upstream health probes, shorter than request timeouts
+
+
+@dataclass(frozen=True)
+class HTTPPoolConfig:
+    """Connection-pool and timeout settings for one long-lived upstream client."""
+
+    timeout: float = 30.0  # read/write/pool timeout in seconds
+    connect_timeout: float = 5.0
+    max_connections: int = 20
+    max_keepalive_connections: int = 10
+    keepalive_expiry: float = 30.0  # seconds an idle keep-alive connection is kept open
+
+
+class PooledAsyncClient:
+    """Lazily built, shared ``httpx.AsyncClient`` for one upstream.
+
+    The client (and its keep-alive pool) is created on first use and reused for every call;
+    ``aclose`` releases the sockets and the next call transparently builds a new pool.
+    """
+
+    def __init__(self, config: Optional[HTTPPoolConfig] = None, client: Optional[httpx.AsyncClient] = None) -> None:
+        self.config = config or HTTPPoolConfig()
+        self._client = client
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            config = self.config
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(config.timeout, connect=config.connect_timeout),
+                limits=httpx.Limits(
+                    max_connections=config.max_connections,
+                    max_keepalive_connections=config.max_keepalive_connections,
+                    keepalive_expiry=config.keepalive_expiry,
+                ),
+            )
+        return self._client
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+__all__ = ["HEALTH_TIMEOUT", "HTTPPoolConfig", "PooledAsyncClient"]
@@ -7,3 +7,10 @@ def utc_now() -> datetime:
 
 def to_iso(dt: datetime) -> str:
     return dt.astimezone(timezone.utc).isoformat()
+
+
+def to_epoch_ms(dt: datetime) -> int:
+    """Epoch milliseconds; naive datetimes are treated as UTC."""
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return int(dt.timestamp() * 1000)
@@ -0,0 +1,79 @@
+"""Index-size and query-latency report for the in-process BM25 memory index.
+
+Usage:
+    python infra/scripts/bench_bm25.py [--docs 20000 100000] [--vocab 50000] [--words 12] [--queries 500]
+
+For each corpus size one user's index is built from synthetic Zipf-distributed messages.
+The two measurements are reported separately:
+  * size: docs, distinct terms, postings, traced Python heap bytes and append throughput;
+  * latency: mean/p95 of ``search`` for 1-3 term queries, plus per-message delete time.
+"""
+
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "backend"))
+from app.services.memory.lexical import BM25Index  # noqa: E402
+
+
+def corpus(rng: np.random.Generator, docs: int, vocab: int, words: int) -> list:
+    ranks = np.minimum(rng.zipf(1.2, size=(docs, words)), vocab)
+    return [" ".join(f"w{rank}" for rank in row) for row in ranks]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, nargs="+", default=[20_000, 100_000])
+    parser.add_argument("--vocab", type=int, default=50_000)
+    parser.add_argument("--words", type=int, default=12, help="words per message")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--top-k", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print("[size]")
+    print(f"{'docs':>9} {'terms':>9} {'postings':>10} {'heap MB':>9} {'B/doc':>7} {'appends/s':>10}")
+    built = []
+    for docs in args.docs:
+        messages = corpus(rng, docs, args.vocab, args.words)
+        tracemalloc.start()
+        started = time.perf_counter()
+        index = BM25Index()
+        for message in messages:
+            index.add("bench", message, created_at=0)
+        elapsed = time.perf_counter() - started
+        heap = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        stats = index.stats()
+        print(
+            f"{docs:>9} {stats['terms']:>9} {stats['postings']:>10} {heap / 2**20:>9.1f} "
+            f"{heap / docs:>7.0f} {docs / elapsed:>10.0f}"
+        )
+        built.append((docs, index, messages))
+
+    print("[latency]")
+    print(f"{'docs':>9} {'mean ms':>9} {'p95 ms':>9} {'delete us':>10}")
+    for docs, index, messages in built:
+        sampled = rng.choice(messages, args.queries)
+        queries = [" ".join(rng.choice(message.split(), size=rng.integers(1, 4))) for message in sampled]
+        latencies = []
+        for query in queries:
+            started = time.perf_counter()
+            index.search("bench", query, top_k=args.top_k)
+            latencies.append((time.perf_counter() - started) * 1000.0)
+        doc_ids = list(index._users["bench"].docs)[: min(1000, docs)]
+        started = time.perf_counter()
+        for doc_id in doc_ids:
+            index.remove("bench", doc_id)
+        delete_us = (time.perf_counter() - started) * 1e6 / len(doc_ids)
+        latencies = np.array(latencies)
+        print(f"{docs:>9} {latencies.mean():>9.3f} {np.percentile(latencies, 95):>9.3f} {delete_us:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
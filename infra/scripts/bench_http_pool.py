@@ -0,0 +1,62 @@
+"""Per-request latency with a new httpx.AsyncClient per call vs one pooled keep-alive client.
+
+Usage:
+    python infra/scripts/bench_http_pool.py [--url http://localhost:11434/api/tags] [--requests 200] [--concurrency 1]
+
+Point ``--url`` at a cheap endpoint of the upstream (Ollama ``/api/tags``, SD WebUI
+``/sdapi/v1/sd-models``) so the numbers reflect connection cost rather than generation time.
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+import httpx
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "backend"))
+from app.utils.http import HTTPPoolConfig, PooledAsyncClient  # noqa: E402
+
+
+async def fresh_get(url: str) -> float:
+    started = time.perf_counter()
+    async with httpx.AsyncClient(timeout=30.0) as client:
+        (await client.get(url)).raise_for_status()
+    return (time.perf_counter() - started) * 1000.0
+
+
+async def pooled_get(pool: PooledAsyncClient, url: str) -> float:
+    started = time.perf_counter()
+    (await pool.client.get(url)).raise_for_status()
+    return (time.perf_counter() - started) * 1000.0
+
+
+async def run(label: str, call, requests: int, concurrency: int) -> None:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one() -> float:
+        async with semaphore:
+            return await call()
+
+    latencies = np.array(await asyncio.gather(*(one() for _ in range(requests))))
+    print(f"{label:>8} {latencies.mean():>9.2f} {np.percentile(latencies, 50):>9.2f} {np.percentile(latencies, 95):>9.2f}")
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:11434/api/tags")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=1)
+    args = parser.parse_args()
+
+    pool = PooledAsyncClient(HTTPPoolConfig())
+    print(f"{'client':>8} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9}")
+    await run("fresh", lambda: fresh_get(args.url), args.requests, args.concurrency)
+    await run("pooled", lambda: pooled_get(pool, args.url), args.requests, args.concurrency)
+    await pool.aclose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
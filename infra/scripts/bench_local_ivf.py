@@ -0,0 +1,76 @@
+"""Recall-vs-latency report for the in-memory IVF index against exact search.
+
+Usage:
+    python infra/scripts/bench_local_ivf.py [--rows 200000] [--dim 384] [--nlist 256] [--nprobe 1 4 8 16 32]
+
+Synthetic clustered vectors are loaded for one user into an exact LocalVectorIndex and an
+IVF one (same rows). For each ``nprobe`` the script reports recall@k against exact search and
+mean/p95 query latency.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "backend"))
+from app.services.memory.local_index import LocalVectorIndex  # noqa: E402
+
+
+def clustered(rng: np.random.Generator, centers: np.ndarray, rows: int, noise: float = 0.35) -> np.ndarray:
+    labels = rng.integers(0, len(centers), rows)
+    return centers[labels] + noise * rng.standard_normal((rows, centers.shape[1])).astype(np.float32)
+
+
+def timed_search(index: LocalVectorIndex, queries: np.ndarray, top_k: int):
+    ids, latencies = [], []
+    for query in queries:
+        started = time.perf_counter()
+        hits = index.search_hits("bench", query, top_k=top_k)
+        latencies.append((time.perf_counter() - started) * 1000.0)
+        ids.append({hit.id for hit in hits})
+    return ids, np.array(latencies)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--clusters", type=int, default=500)
+    parser.add_argument("--noise", type=float, default=1.0, help="per-dimension noise around cluster centers")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--nlist", type=int, default=256)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 8, 16, 32])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    centers = rng.standard_normal((args.clusters, args.dim)).astype(np.float32)
+    data = clustered(rng, centers, args.rows, args.noise)
+    queries = clustered(rng, centers, args.queries, args.noise)
+
+    exact = LocalVectorIndex()
+    ivf = LocalVectorIndex(nlist=args.nlist)
+    contents = [""] * args.rows
+    exact.add_many("bench", contents, data, created_at=0)
+    started = time.perf_counter()
+    ivf.add_many("bench", contents, data, created_at=0)
+    print(f"[ivf] rows={args.rows} dim={args.dim} nlist={args.nlist} train={time.perf_counter() - started:.2f}s")
+
+    truth, exact_ms = timed_search(exact, queries, args.top_k)
+    print(f"{'nprobe':>8} {'recall@' + str(args.top_k):>10} {'mean ms':>9} {'p95 ms':>9} {'speedup':>8}")
+    print(f"{'exact':>8} {1.0:>10.3f} {exact_ms.mean():>9.3f} {np.percentile(exact_ms, 95):>9.3f} {1.0:>8.1f}")
+    for nprobe in args.nprobe:
+        ivf.nprobe = nprobe
+        found, ivf_ms = timed_search(ivf, queries, args.top_k)
+        recall = np.mean([len(a & b) / max(len(b), 1) for a, b in zip(found, truth)])
+        print(
+            f"{nprobe:>8} {recall:>10.3f} {ivf_ms.mean():>9.3f} {np.percentile(ivf_ms, 95):>9.3f} "
+            f"{exact_ms.mean() / ivf_ms.mean():>8.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -2,17 +2,13 @@ import os
 import sys
 
 try:
-    from pymilvus import (
-        Collection,
-        CollectionSchema,
-        DataType,
-        FieldSchema,
-        connections,
-        utility,
-    )
+    from pymilvus import Collection, CollectionSchema, connections, utility
 except Exception as exc:  # pragma: no cover - helper script
     raise SystemExit(f"pymilvus is required to run this script: {exc}")
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "backend"))
+from app.services.memory.milvus_client import chat_history_fields, create_chat_history_indexes  # noqa: E402
+
 
 def health_check(alias: str) -> None:
     try:
@@ -22,25 +18,17 @@ def health_check(alias: str) -> None:
         raise SystemExit(f"[milvus] health check failed: {exc}")
 
 
-def ensure_collection(name: str, dim: int) -> None:
+def ensure_collection(name: str, dim: int, num_partitions: int = 64, nlist: int = 1024) -> None:
     if utility.has_collection(name):
         print(f"[milvus] collection {name} already exists")
         return
 
-    fields = [
-        FieldSchema(name="user_id", dtype=DataType.VARCHAR, max_length=128, is_primary=True, auto_id=False),
-        FieldSchema(name="content", dtype=DataType.VARCHAR, max_length=2048),
-        FieldSchema(name="vector", dtype=DataType.FLOAT_VECTOR, dim=dim),
-    ]
-    schema = CollectionSchema(fields=fields, description="Chat history memory store")
-
-    collection = Collection(name=name, schema=schema)
-    collection.create_index(
-        field_name="vector",
-        index_params={"index_type": "IVF_FLAT", "metric_type": "IP", "params": {"nlist": 1024}},
-    )
+    # Same schema and indexes the app creates: auto-id primary key + user_id partition key.
+    schema = CollectionSchema(fields=chat_history_fields(dim), description="Chat history memory store")
+    collection = Collection(name=name, schema=schema, num_partitions=num_partitions)
+    create_chat_history_indexes(collection, nlist=nlist)
     collection.load()
-    print(f"[milvus] created and loaded collection: {name} (dim={dim})")
+    print(f"[milvus] created and loaded collection: {name} (dim={dim}, partitions={num_partitions}, nlist={nlist})")
 
 
 def main() -> None:
@@ -48,11 +36,13 @@ def main() -> None:
     port = os.getenv("MILVUS_PORT", "19530")
     collection_name = os.getenv("MILVUS_COLLECTION", "chat_history")
     dim = int(os.getenv("EMBEDDING_DIM", "1536"))
+    num_partitions = int(os.getenv("MILVUS_NUM_PARTITIONS", "64"))
+    nlist = int(os.getenv("MILVUS_NLIST", "1024"))
 
     print(f"[milvus] connecting to {host}:{port}")
     connections.connect(alias="default", host=host, port=port)
     health_check(alias="default")
-    ensure_collection(collection_name, dim=dim)
+    ensure_collection(collection_name, dim=dim, num_partitions=num_partitions, nlist=nlist)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,130 @@
+"""Copy a legacy chat_history collection (user_id primary key) into the partition-key schema.
+
+Usage:
+    python infra/scripts/migrate_milvus_partition_key.py [--target chat_history_v2] [--resume] [--swap]
+
+Rows are streamed with a query iterator and re-inserted in column-wise batches. Legacy rows
+have no timestamps, so ``created_at`` is set to the migration time. With ``--swap`` the old
+collection is renamed to ``<source>_legacy`` and the new one takes the source name.
+
+The target uses auto-id keys, so copying a row twice duplicates it. A non-empty target is
+refused unless ``--resume`` is given; it skips users already copied (the legacy schema has
+one row per user), so a run that failed part-way can be finished safely.
+"""
+
+import argparse
+import os
+import sys
+import time
+from typing import Set
+
+try:
+    from pymilvus import Collection, connections, utility
+except Exception as exc:  # pragma: no cover - helper script
+    raise SystemExit(f"pymilvus is required to run this script: {exc}")
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from init_milvus import ensure_collection, health_check  # noqa: E402
+
+
+def migrated_users(target: Collection, source_name: str, batch_size: int) -> Set[str]:
+    """User ids already copied from ``source_name`` into ``target``."""
+    iterator = target.query_iterator(
+        batch_size=batch_size,
+        expr=f'metadata["migrated_from"] == "{source_name}"',
+        output_fields=["user_id"],
+    )
+    users: Set[str] = set()
+    try:
+        while True:
+            batch = iterator.next()
+            if not batch:
+                break
+            users.update(row["user_id"] for row in batch)
+    finally:
+        iterator.close()
+    return users
+
+
+def copy_rows(source: Collection, target: Collection, batch_size: int, skip: Set[str]) -> int:
+    source.load()
+    iterator = source.query_iterator(
+        batch_size=batch_size,
+        expr='user_id != ""',
+        output_fields=["user_id", "content", "vector"],
+    )
+    created_at = int(time.time() * 1000)
+    copied = 0
+    try:
+        while True:
+            batch = iterator.next()
+            if not batch:
+                break
+            batch = [row for row in batch if row["user_id"] not in skip]
+            if not batch:
+                continue
+            target.insert(
+                [
+                    [row["user_id"] for row in batch],
+                    [row["content"] for row in batch],
+                    [created_at] * len(batch),
+                    [{"migrated_from": source.name} for _ in batch],
+                    [row["vector"] for row in batch],
+                ]
+            )
+            copied += len(batch)
+            print(f"[milvus] copied {copied} rows")
+    finally:
+        iterator.close()
+    target.flush()
+    return copied
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--source", default=os.getenv("MILVUS_COLLECTION", "chat_history"))
+    parser.add_argument("--target", default=None, help="defaults to <source>_v2")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--resume", action="store_true", help="continue into a non-empty target, skipping copied users")
+    parser.add_argument("--swap", action="store_true", help="rename collections so the app picks up the new one")
+    args = parser.parse_args()
+
+    host = os.getenv("MILVUS_HOST", "localhost")
+    port = os.getenv("MILVUS_PORT", "19530")
+    dim = int(os.getenv("EMBEDDING_DIM", "1536"))
+    num_partitions = int(os.getenv("MILVUS_NUM_PARTITIONS", "64"))
+    target_name = args.target or f"{args.source}_v2"
+
+    print(f"[milvus] connecting to {host}:{port}")
+    connections.connect(alias="default", host=host, port=port)
+    health_check(alias="default")
+    if not utility.has_collection(args.source):
+        raise SystemExit(f"[milvus] source collection {args.source} does not exist")
+
+    source = Collection(args.source)
+    if any(field.name == "created_at" for field in source.schema.fields):
+        raise SystemExit(f"[milvus] {args.source} already uses the partition-key schema")
+
+    ensure_collection(target_name, dim=dim, num_partitions=num_partitions)
+    target = Collection(target_name)
+    target.load()
+    skip: Set[str] = set()
+    if target.query(expr='user_id != ""', output_fields=["user_id"], limit=1):
+        if not args.resume:
+            raise SystemExit(
+                f"[milvus] target {target_name} is not empty; rerun with --resume to skip users already copied"
+            )
+        skip = migrated_users(target, args.source, batch_size=args.batch_size)
+        print(f"[milvus] resuming: {len(skip)} users already in {target_name}")
+    copied = copy_rows(source, target, batch_size=args.batch_size, skip=skip)
+    print(f"[milvus] migrated {copied} rows from {args.source} to {target_name}")
+
+    if args.swap:
+        backup = f"{args.source}_legacy"
+        utility.rename_collection(args.source, backup)
+        utility.rename_collection(target_name, args.source)
+        print(f"[milvus] renamed {args.source} -> {backup}, {target_name} -> {args.source}")
+
+
+if __name__ == "__main__":
+    main()